@@ -0,0 +1,243 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+import Scripts.utils as utils
+from Scripts.workers import Worker
+
+
+class Pyramid:
+    """An image and smaller copies of it, at 1/2 and 1/4 the size. The smaller ones are saved in the cache
+    folder under the hash of the file, so they're only made the first time an image is seen."""
+    __slots__ = "stat", "sizes", "paths", "images"
+
+    def __init__(self, stat: tuple, sizes: list, paths: list):
+        # The file's modified time and size, to tell when it's changed
+        self.stat = stat
+        self.sizes = sizes
+        self.paths = paths
+        # Decoded when they're first needed
+        self.images = [None] * len(sizes)
+
+    def level(self, size: tuple[int, int]) -> int:
+        """Returns the smallest level that's still at least the size."""
+        width, height = size
+        for index in range(len(self.sizes) - 1, 0, -1):
+            if self.sizes[index][0] >= width and self.sizes[index][1] >= height:
+                return index
+        return 0
+
+
+class BackgroundImages:
+    """Resizes the background images on the image worker. Each image has a pyramid of smaller copies cached on
+    disk, resizes start from the smallest one that's big enough. The last images used are kept decoded in memory,
+    so resizing over and over while the window is dragged doesn't read the file every time."""
+    _cache_path = os.path.join(os.getcwd(), "Core", "Cache", "Images")
+    # 1, 1/2 and 1/4 the size
+    _levels = 3
+    _quality = 90
+    # How many images are kept decoded
+    _kept = 2
+    _thumbnail_size = (160, 90)
+    __slots__ = "worker", "prefetch_worker", "_lock", "_pyramids", "_hashes"
+
+    def __init__(self, root=None):
+        self.worker = Worker("ImageWorker", root=root)
+        # Makes the cached copies of the other images and adds new ones, kept apart so it never holds up a resize
+        self.prefetch_worker = Worker("ImagePrefetchWorker", root=root)
+        # The pyramids are used from the Tk thread and the worker
+        self._lock = threading.Lock()
+        # image path: Pyramid, most recently used last
+        self._pyramids = OrderedDict()
+        # image path: (stat, hash of the file)
+        self._hashes = {}
+
+    @staticmethod
+    def _stat(image_path: str) -> tuple:
+        stat = os.stat(image_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _file_hash(self, image_path: str, stat: tuple) -> str:
+        saved = self._hashes.get(image_path)
+        if saved is not None and saved[0] == stat:
+            return saved[1]
+        file_hash = hashlib.sha1()
+        with open(image_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                file_hash.update(chunk)
+        self._hashes[image_path] = (stat, file_hash.hexdigest())
+        return self._hashes[image_path][1]
+
+    @staticmethod
+    def decode(image_path: str, size: tuple[int, int]) -> Image.Image:
+        """Decodes the image at the size. JPEGs are decoded straight at a smaller scale with draft mode, so the
+        full size image is never decoded for a smaller one."""
+        with Image.open(image_path) as image:
+            image.draft("RGB", size)
+            image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        return image
+
+    def _levels_of(self, image_path: str, stat: tuple) -> tuple[list, list]:
+        """Returns the sizes of the image's levels and the files they're kept in, the first being the image."""
+        with Image.open(image_path) as image:
+            width, height = image.size
+        sizes = [(max(width >> index, 1), max(height >> index, 1)) for index in range(self._levels)]
+        file_hash = self._file_hash(image_path, stat)
+        paths = [image_path] + [os.path.join(self._cache_path, f"{file_hash}-{1 << index}.jpg")
+                                for index in range(1, self._levels)]
+        return sizes, paths
+
+    def _pyramid(self, image_path: str) -> Pyramid:
+        """Returns the image's pyramid, making the smaller copies the first time the image is seen."""
+        stat = self._stat(image_path)
+        pyramid = self._pyramids.get(image_path)
+        if pyramid is not None and pyramid.stat == stat:
+            self._pyramids.move_to_end(image_path)
+            return pyramid
+        pyramid = Pyramid(stat, *self._levels_of(image_path, stat))
+        sizes, paths = pyramid.sizes, pyramid.paths
+        for index in range(1, self._levels):
+            if not os.path.isfile(paths[index]):
+                pyramid.images[index] = self.decode(image_path, sizes[index])
+                self._save_level(pyramid.images[index], paths[index])
+        self._pyramids[image_path] = pyramid
+        while len(self._pyramids) > self._kept:
+            self._pyramids.popitem(last=False)
+        return pyramid
+
+    def _save_level(self, image: Image.Image, path: str) -> None:
+        try:
+            utils.check_folder_and_create(self._cache_path)
+            with utils.atomic_write(path, 'wb') as file:
+                image.save(file, format="JPEG", quality=self._quality)
+        except OSError:
+            # Still works without the cache, the level is just made again next time
+            pass
+
+    def source(self, image_path: str, size: tuple[int, int]) -> Image.Image:
+        """Returns the smallest decoded level of the image that's at least the size."""
+        with self._lock:
+            pyramid = self._pyramid(image_path)
+            index = pyramid.level(size)
+            if pyramid.images[index] is None:
+                try:
+                    pyramid.images[index] = self.decode(pyramid.paths[index], pyramid.sizes[index])
+                except OSError:
+                    # The cached copy is broken, it gets made again
+                    pyramid.images[index] = self.decode(image_path, pyramid.sizes[index])
+                    self._save_level(pyramid.images[index], pyramid.paths[index])
+            return pyramid.images[index]
+
+    def resize(self, image_path: str, size: tuple[int, int], resample=Image.LANCZOS) -> Image.Image:
+        size = (max(size[0], 1), max(size[1], 1))
+        return self.source(image_path, size).resize(size, resample)
+
+    def submit_resize(self, image_path: str, size: tuple[int, int], resample, callback) -> None:
+        """Resizes on the worker, callback((image_path, size, image)) is called on the Tk thread after. A resize
+        that hasn't started yet is replaced by this one."""
+        self.worker.submit("resize", self._resized, image_path, size, resample, callback=callback)
+
+    def prefetch(self, image_paths: list[str]) -> None:
+        """Makes the cached copies of the images that don't have them yet, on the prefetch worker."""
+        self.prefetch_worker.submit("prefetch", self._prefetch, list(image_paths))
+
+    def prune_cache(self, image_paths: list[str]) -> None:
+        """Deletes the cached copies of the images that aren't in image_paths anymore, on the prefetch worker."""
+        self.prefetch_worker.submit("prune", self._prune_cache, list(image_paths))
+
+    def _prune_cache(self, image_paths: list[str]) -> None:
+        used = set()
+        with self._lock:
+            for image_path in image_paths:
+                try:
+                    used.add(self._file_hash(image_path, self._stat(image_path)))
+                except OSError:
+                    continue
+            for image_path in set(self._hashes) - set(image_paths):
+                del self._hashes[image_path]
+                self._pyramids.pop(image_path, None)
+        try:
+            filenames = os.listdir(self._cache_path)
+        except FileNotFoundError:
+            return
+        for filename in filenames:
+            # {hash}-2.jpg, {hash}-4.jpg and {hash}-thumb.jpg, files still being written are left alone
+            if filename.endswith(".jpg") and filename.split("-", 1)[0] not in used:
+                try:
+                    os.remove(os.path.join(self._cache_path, filename))
+                except OSError:
+                    pass
+
+    def _prefetch(self, image_paths: list[str]) -> None:
+        for image_path in image_paths:
+            try:
+                with self._lock:
+                    sizes, paths = self._levels_of(image_path, self._stat(image_path))
+                for index in range(1, self._levels):
+                    if not os.path.isfile(paths[index]):
+                        self._save_level(self.decode(image_path, sizes[index]), paths[index])
+            except OSError:
+                # Missing or not an image, it's dealt with if it's ever picked
+                continue
+
+    @staticmethod
+    def cover_size(size: tuple[int, int], screen: tuple[int, int]) -> tuple[int, int]:
+        """Returns the size scaled down, keeping its shape, to the smallest that still covers the screen. Sizes that
+        are already smaller are kept."""
+        scale = min(1.0, max(screen[0] / size[0], screen[1] / size[1]))
+        return max(round(size[0] * scale), 1), max(round(size[1] * scale), 1)
+
+    def import_image(self, filepath: str, new_path: str, screen: tuple[int, int], progress) -> str:
+        """Runs on the prefetch worker. Scales a picked image down to cover the screen, saves it as a jpeg to new_path
+        and makes its thumbnail and cached copies, so a huge image doesn't slow down every resize after.
+        progress(fraction, text) is called from the worker as it goes. Returns what went wrong, empty if it worked."""
+        try:
+            progress(0.0, "Reading the image...")
+            with Image.open(filepath) as image:
+                size = self.cover_size(image.size, screen)
+            progress(0.2, "Scaling the image down...")
+            image = self.decode(filepath, size)
+            progress(0.6, "Saving the image...")
+            with utils.atomic_write(new_path, 'wb') as file:
+                image.save(file, format="JPEG", quality=self._quality, optimize=True)
+            progress(0.8, "Making the thumbnail...")
+            self.thumbnail(new_path)
+            progress(1.0, "Image added.")
+        except Exception as e:
+            # Anything raised would skip the callback, and the settings page would wait for the image forever
+            return f"The image couldn't be added: {e}"
+        return ""
+
+    def thumbnail(self, image_path: str) -> Image.Image:
+        """Returns a small copy of the image, cached with its pyramid."""
+        with self._lock:
+            file_hash = self._file_hash(image_path, self._stat(image_path))
+        path = os.path.join(self._cache_path, f"{file_hash}-thumb.jpg")
+        try:
+            with Image.open(path) as image:
+                return image.convert("RGB")
+        except OSError:
+            pass
+        thumbnail = self.source(image_path, self._thumbnail_size).copy()
+        thumbnail.thumbnail(self._thumbnail_size, Image.LANCZOS)
+        self._save_level(thumbnail, path)
+        return thumbnail
+
+    def submit_thumbnail(self, image_path: str, callback) -> None:
+        """Makes the thumbnail on the worker, callback((image_path, image)) is called on the Tk thread after. The
+        image is None if it couldn't be read."""
+        self.worker.submit("thumbnail", self._thumbnailed, image_path, callback=callback)
+
+    def _thumbnailed(self, image_path: str) -> tuple[str, Image.Image | None]:
+        try:
+            return image_path, self.thumbnail(image_path)
+        except OSError:
+            return image_path, None
+
+    def _resized(self, image_path: str, size: tuple[int, int], resample) -> tuple[str, tuple[int, int], Image.Image]:
+        return image_path, size, self.resize(image_path, size, resample)
@@ -0,0 +1,191 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import hashlib
+import json
+import os
+import time
+import Scripts.utils as utils
+
+
+class BackupStore:
+    """Saves backups as a small manifest listing, for each category, its definitions by the hash of their content.
+    The definitions are saved once in the objects folder (objects/ab/abcdef...), shared by every backup that has the
+    same definition, so backing up data that barely changed only writes the manifest.
+    Old backups saved by the store are removed following the retention rules, and objects no backup uses anymore
+    get deleted.
+    Each backup has an .index file next to it with how many categories and definitions it has, so the restore view
+    can list and preview backups without decoding them, and saving a backup only writes its own."""
+    _objects_folder = "objects"
+    _index_extension = ".index"
+    _backup_extension = ".json"
+    _delta_extension = ".delta"
+    # Retention rules, always keeps the newest backups, then the newest backup of each of the last hours/days/weeks
+    _keep_last = 10
+    _keep_periods = (("%Y-%m-%d %H", 24),
+                     ("%Y-%m-%d", 7),
+                     ("%Y-%W", 8))
+    __slots__ = "folder", "objects_folder", "data_passes"
+
+    def __init__(self, folder: str, data_passes: int):
+        # CWD/Back Ups/Username
+        self.folder = folder
+        # CWD/Back Ups/Username/objects
+        self.objects_folder = os.path.join(folder, self._objects_folder)
+        self.data_passes = data_passes
+
+    @staticmethod
+    def is_manifest(header: dict) -> bool:
+        return header.get("store", False)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_folder, digest[:2], digest)
+
+    def save(self, filepath: str, data: dict) -> None:
+        """Saves a backup of the data. Only definitions that aren't in the objects folder yet get written. The
+        objects the backup uses are listed in its header too, so collect_garbage doesn't have to decode it."""
+        manifest = {}
+        for category, definitions in data.items():
+            entries = []
+            for definition, values in definitions.items():
+                entry = json.dumps([definition, values], separators=(",", ":")).encode()
+                digest = hashlib.sha256(entry).hexdigest()
+                path = self._object_path(digest)
+                if not os.path.isfile(path):
+                    utils.check_folder_and_create(os.path.dirname(path))
+                    with utils.atomic_write(path, 'wb') as file:
+                        file.write(utils.encode_bytes(entry, self.data_passes))
+                entries.append(digest)
+            manifest[category] = entries
+        objects = sorted({digest for entries in manifest.values() for digest in entries})
+        utils.dump_encoded(filepath, manifest, self.data_passes, header={"store": True, "objects": objects})
+
+    def load(self, manifest: dict) -> tuple[dict, bool]:
+        """Puts the data of a backup back together from its manifest. Returns False if an object is missing or
+        can't be decoded."""
+        data = {}
+        try:
+            for category, entries in manifest.items():
+                definitions = data[category] = {}
+                for digest in entries:
+                    with open(self._object_path(digest), 'rb') as file:
+                        definition, values = json.loads(utils.decode_bytes(file.read(), self.data_passes))
+                    definitions[definition] = values
+        except (OSError, ValueError):
+            return {}, False
+        return data, True
+
+    def backups(self) -> list:
+        """Returns the paths of all the backups, newest first."""
+        paths = [os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith(self._backup_extension)]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def _header(self, path: str) -> dict | None:
+        """Returns the header of a backup, None if it's gone or broken. Other errors are raised, so a backup that
+        can't be opened right now never has its objects deleted."""
+        try:
+            return utils.read_header(path, self.data_passes)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _manifests(self) -> list:
+        """Returns (path, header) of the backups this store saved, newest first. Only their headers are read."""
+        manifests = []
+        for path in self.backups():
+            header = self._header(path)
+            if header is not None and self.is_manifest(header):
+                manifests.append((path, header))
+        return manifests
+
+    def prune(self, keep: set = frozenset()) -> list:
+        """Removes the backups the retention rules don't keep. Only backups this store saved are counted and
+        removed, auto backups and backups from before the store are left alone. Backups in keep are never removed.
+        Returns the removed paths."""
+        backups = [path for path, _ in self._manifests()]
+        kept = set(backups[:self._keep_last]) | set(keep)
+        for time_format, amount in self._keep_periods:
+            periods = set()
+            for path in backups:
+                period = time.strftime(time_format, time.localtime(os.path.getmtime(path)))
+                if period not in periods:
+                    periods.add(period)
+                    kept.add(path)
+                    if len(periods) >= amount:
+                        break
+        removed = [path for path in backups if path not in kept]
+        for path in removed:
+            for filepath in (path, path + self._index_extension):
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def collect_garbage(self) -> int:
+        """Deletes the objects that aren't used by any backup. Returns the amount deleted. The objects each backup
+        uses come from its header, other backups are skipped."""
+        if not os.path.isdir(self.objects_folder):
+            return 0
+        used = set()
+        for _, header in self._manifests():
+            used.update(header.get("objects", ()))
+        deleted = 0
+        for prefix in os.listdir(self.objects_folder):
+            folder = os.path.join(self.objects_folder, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for digest in os.listdir(folder):
+                if digest not in used:
+                    os.remove(os.path.join(folder, digest))
+                    deleted += 1
+        return deleted
+
+    def save_and_clean(self, filepath: str, data: dict, summary: dict, keep: set = frozenset()) -> None:
+        """Saves a backup, then applies the retention rules and collects the garbage. Runs on the save worker."""
+        self.save(filepath, data)
+        self.prune(keep | {filepath})
+        self.collect_garbage()
+        self.index_backup(filepath, summary)
+
+    def read_details(self, filepath: str) -> dict:
+        """Returns the details of a backup from its .index file, empty if it doesn't have one."""
+        try:
+            details, _ = utils.read_encoded(filepath + self._index_extension, self.data_passes)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return details if isinstance(details, dict) else {}
+
+    def index_backup(self, filepath: str, summary: dict, rehash: bool = True) -> None:
+        """Writes the backup's .index file, summary being category: amount of definitions. Without rehash the hash
+        from the last time is kept, for auto backups that only had changes appended."""
+        details = self.read_details(filepath)
+        filename = os.path.basename(filepath)
+        size = os.path.getsize(filepath)
+        if os.path.isfile(filepath + self._delta_extension):
+            size += os.path.getsize(filepath + self._delta_extension)
+        if rehash or "hash" not in details:
+            digest = hashlib.sha256()
+            with open(filepath, 'rb') as file:
+                for chunk in iter(lambda: file.read(64 * 1024), b""):
+                    digest.update(chunk)
+            details["hash"] = digest.hexdigest()
+        details.update({"time": os.path.getmtime(filepath),
+                        "kind": "auto" if "-auto-" in filename else "manual",
+                        "categories": len(summary),
+                        "entries": sum(summary.values()),
+                        "size": size,
+                        "summary": summary})
+        utils.dump_encoded(filepath + self._index_extension, details, self.data_passes)
+
+    def entries(self) -> dict:
+        """Returns the details of every backup, newest first. Backups without an .index file only have their time,
+        kind and size."""
+        entries = {}
+        for path in self.backups():
+            filename = os.path.basename(path)
+            try:
+                entries[filename] = self.read_details(path) or {"time": os.path.getmtime(path),
+                                                                "kind": "auto" if "-auto-" in filename else "manual",
+                                                                "size": os.path.getsize(path)}
+            except FileNotFoundError:
+                continue
+        return entries
@@ -11,17 +11,29 @@ except ImportError:  # Python 3
 import time
 import os
 import Scripts.utils as utils
-from CustomTkWidgets.custom_treeview import TreeView
+from Scripts.backup_store import BackupStore
+from Scripts.change_set import apply_operations, copy_data
+from Scripts.ordered_map import OrderedMap
 from Scripts.settings import *
 
 
 class BackUpSystem:
+    """Manual backups are saved in the user's BackupStore, which only writes the definitions that changed since the
+    other backups and removes old backups. Auto backup saves all the data the first time, then only appends the
+    changes made since the last run to a .delta file next to it, and skips the runs where nothing changed. Once
+    enough changes have built up, all the data is saved again and the .delta file starts over."""
     _current_directory = os.getcwd()
     _directory = "Back Ups"
     _main_directory = os.path.join(_current_directory, _directory)
     _passes = 2
+    _delta_extension = ".delta"
+    _rebase_records = 50
+    _restore_columns = {"date": "Date", "type": "Type", "categories": "Categories", "entries": "Definitions",
+                        "size": "Size"}
     __slots__ = "root", "data_handler", "alert_system", "backup_data", "active", "after_id", "save_path", "flag", \
-                "data_passes", "tree_view", "top_window", "data_passes"
+                "data_passes", "tree_view", "top_window", "data_passes", "generation", "_base_size", \
+                "_delta_size", "_delta_records", "_waiting_deltas", "filter_var", "preview", "_backup_entries", \
+                "_sort_column", "_sort_reverse"
 
     def __init__(self, root, data_handler, alert_system):
         self.root = root
@@ -38,6 +50,20 @@ class BackUpSystem:
         self.tree_view = None
         self.top_window = None
         self.data_passes = None
+        self.filter_var = None
+        self.preview = None
+        # The restore view's backups from the index, and how they're sorted
+        self._backup_entries = {}
+        self._sort_column = "date"
+        self._sort_reverse = True
+
+        # The data handler's generation at the last auto backup
+        self.generation = None
+        self._base_size = 0
+        self._delta_size = 0
+        self._delta_records = 0
+        # Keys of the deltas submitted to the save worker that haven't been written yet
+        self._waiting_deltas = set()
         utils.check_folder_and_create(self._main_directory)
 
     def cancel_auto(self) -> None:
@@ -49,6 +75,7 @@ class BackUpSystem:
             self.after_id = ""
             self.active = False
             self.flag = False
+            self.data_handler.stop_backup_operations()
         else:
             if self.alert_system:
                 self.alert_system.show_alert(("Auto backup has not been started.", "red"))
@@ -80,8 +107,11 @@ class BackUpSystem:
         if self.active:
             # id to keep track of which function call the auto back-up is on (string)
             self.after_id = self.root.after(time_frame, lambda: self.auto_backup(user, time_frame))
-            # Tries to back up the user with the current data
-            self.backup_user(user, data, self.data_passes, auto=True)
+            if not self.flag:
+                # Tries to back up the user with the current data
+                self.backup_user(user, data, self.data_passes, auto=True)
+            else:
+                self._backup_changes(data)
 
     def backup_user(self, user: str, data: dict, data_passes, auto: bool = False) -> None:
         """Back's up the current user with the data associated with user."""
@@ -89,45 +119,133 @@ class BackUpSystem:
         if data == {}:
             self.alert_system.show_alert(("No data to backup.", "red"))
             return
-        if not auto:
-            user_directory = os.path.join(self._main_directory, user)
-            utils.check_folder_and_create(user_directory)
-            self.save_path = os.path.join(user_directory, (utils.get_current_time() + f"-manual-{user}.json"))
-
+        summary = self._summarize(data)
+        # The backup is written on the save worker, so it gets a copy of the data
+        data = copy_data(data)
         # If auto backup has started, but it's the first time, create a new backup
         if auto and not self.flag:
-            self._create_backup(data, data_passes)
+            self._update_backup(data, data_passes, summary)
             self.flag = True
-        # After the first the backup is created for auto backup, overwrite the existing one
-        elif auto and self.flag:
-            self._update_backup(data, data_passes)
         # If calling the manual backup, then create a new backup everytime
         else:
-            self._create_backup(data, data_passes)
+            user_directory = os.path.join(self._main_directory, user)
+            utils.check_folder_and_create(user_directory)
+            save_path = os.path.join(user_directory, (utils.get_current_time() + f"-manual-{user}.json"))
+            self._create_backup(save_path, data, data_passes, summary)
+
+    @staticmethod
+    def _summarize(data: dict) -> dict:
+        """Returns category: amount of definitions for the backup index, without loading the categories."""
+        return {category: data.count(category) for category in data.keys()}
 
+    def _backup_complete(self, result=None) -> None:
         if self.alert_system:
             self.alert_system.show_alert(("Backup complete.", "white"))
 
-    def _create_backup(self, data: dict, data_passes) -> None:
+    def _create_backup(self, save_path: str, data: dict, data_passes, summary: dict) -> None:
         """Creates a new backup for the current user."""
-        encoded_data = utils.encode_string(data, data_passes)
-        utils.dump_json(self.save_path, encoded_data)
+        store = BackupStore(os.path.dirname(save_path), data_passes)
+        # The auto backup that is running is never removed
+        keep = {self.save_path} if self.active else set()
+        self.data_handler.save_worker.submit(save_path, store.save_and_clean, save_path, data, summary, keep,
+                                             callback=self._backup_complete)
+
+    def _update_backup(self, data: dict, data_passes, summary: dict) -> None:
+        """Saves all the data to the auto backup, the changes made after are saved to its .delta file.
+        The positions of the definitions are saved too, since the changes are saved with them."""
+        # Changes are kept track of from here on
+        self.data_handler.take_backup_operations()
+        # The data has the changes of the deltas that haven't been written yet, written after the base they'd
+        # be appended to the new .delta file
+        for key in self._waiting_deltas:
+            self.data_handler.save_worker.cancel(key)
+        self._waiting_deltas = set()
+        self.generation = self.data_handler.generation
+        header = {"generation": self.generation,
+                  "positions": {c: [definitions.position(d) for d in definitions] for c, definitions in data.items()}}
+        self._delta_size = 0
+        self._delta_records = 0
+        self.data_handler.save_worker.submit(self.save_path, self._write_base, self.save_path, data, data_passes,
+                                             header, summary, callback=self._base_complete)
+
+    def _write_base(self, save_path: str, data: dict, data_passes, header: dict, summary: dict) -> int:
+        """Runs on the save worker. Returns the size of the file, to know when it's time to save all the data
+        again."""
+        utils.dump_encoded(save_path, data, data_passes, header=header)
+        utils.truncate_file(save_path + self._delta_extension)
+        BackupStore(os.path.dirname(save_path), data_passes).index_backup(save_path, summary)
+        return os.path.getsize(save_path)
 
-    def _update_backup(self, data: dict, data_passes) -> None:
-        """Updates the backed up data for the current user."""
-        encoded_data = utils.encode_string(data, data_passes)
-        utils.dump_json(self.save_path, encoded_data)
+    def _write_delta(self, save_path: str, record: list, data_passes, summary: dict) -> int:
+        """Runs on the save worker. Returns the size of the record."""
+        size = utils.append_record(save_path + self._delta_extension, record, data_passes)
+        BackupStore(os.path.dirname(save_path), data_passes).index_backup(save_path, summary, rehash=False)
+        return size
+
+    def _base_complete(self, size: int) -> None:
+        self._base_size = size
+        self._backup_complete()
+
+    def _backup_changes(self, data: dict) -> None:
+        """Appends the changes made since the last auto backup to the .delta file, does nothing if there weren't
+        any. Clearing or restoring all the data, or when the changes add up to half the size of the backup,
+        saves all the data again instead."""
+        operations = self.data_handler.take_backup_operations()
+        if self.data_handler.generation == self.generation or not operations:
+            return
+        if (any(operation[0] == "reset" for operation in operations) or self._delta_records >= self._rebase_records
+                or self._delta_size * 2 >= self._base_size > 0):
+            self._update_backup(copy_data(data), self.data_passes, self._summarize(data))
+            return
+        self.generation = self.data_handler.generation
+        self._delta_records += 1
+        # Every delta has to be written, so each gets its own key instead of replacing one that is still waiting
+        key = (self.save_path, self.generation)
+        self._waiting_deltas.add(key)
+        self.data_handler.save_worker.submit(key, self._write_delta, self.save_path, [self.generation, operations],
+                                             self.data_passes, self._summarize(data),
+                                             callback=lambda size: self._delta_complete(key, size))
+
+    def _delta_complete(self, key: tuple, size: int) -> None:
+        self._waiting_deltas.discard(key)
+        self._delta_size += size
+        self._backup_complete()
+
+    def load_backup(self, filepath: str) -> tuple[dict, bool]:
+        """Reads a backup, an auto backup gets the changes from its .delta file applied."""
+        try:
+            raw_data, header = utils.read_encoded(filepath, self.data_passes)
+            check = isinstance(raw_data, dict)
+            # Backups saved with the old multi-pass encoding
+            if isinstance(raw_data, str):
+                raw_data, check = utils.decode_string(raw_data, self.data_passes, json_object=True)
+        except (ValueError, FileNotFoundError):
+            return {}, False
+        if not check:
+            return raw_data, check
+        if BackupStore.is_manifest(header):
+            return BackupStore(os.path.dirname(filepath), self.data_passes).load(raw_data)
+        records = utils.read_records(filepath + self._delta_extension, self.data_passes)
+        if not records:
+            return raw_data, check
+        positions = header.get("positions", {})
+        data = OrderedMap()
+        for category, definitions in raw_data.items():
+            category_positions = positions.get(category, [])
+            if len(category_positions) == len(definitions):
+                data[category] = OrderedMap.from_positions(definitions.items(), category_positions)
+            else:
+                data[category] = OrderedMap(definitions)
+        for generation, operations in records:
+            if generation > header.get("generation", 0):
+                apply_operations(data, operations)
+        return data, check
 
     def restore_user(self, data_passes, top_level):
         """Restores the current user's saved backup if there is one. Returns Data."""
-        if self.active:
-            self.cancel_auto()
-        self.data_passes = data_passes
-        path = os.path.join(os.getcwd(), "Back Ups", self.data_handler.current_user)
-        filepaths = os.listdir(path)
-        self.create_restore_view(filepaths, top_level)
+        self.create_restore_view(data_passes, top_level)
 
-    def create_restore_page(self, filepaths, top_level):
+    def create_restore_page(self, top_level):
         # Top Frame
         top_frame = ttk.Frame(self.top_window, relief='ridge', borderwidth=2)
         top_frame.pack(side='top', fill='x', anchor='nw', padx=4, pady=4)
@@ -140,40 +258,55 @@ class BackUpSystem:
         left_main_frame.pack(side='left', anchor='w', expand=True, fill='both', pady=4, padx=4)
         # Right Frame
         right_main_frame = tk.Frame(bottom_frame)
-        right_main_frame.pack(side='right', anchor='e', expand=True, fill='both', padx=4, pady=4)
+        right_main_frame.pack(side='right', anchor='e', fill='both', padx=4, pady=4)
 
         ttk.Label(right_main_frame, text="Functions:", font=DEFAULT_FONT_BOLD, style="H.TLabel").pack(side='top',
                                                                                                       pady=4,
                                                                                                       padx=4)
 
         ttk.Label(top_frame, text="Saves Available", font=DEFAULT_FONT_BOLD, style='H.TLabel').pack(pady=5)
+        ttk.Label(top_frame, text="Filter:", font=DEFAULT_FONT).pack(side='left', padx=4, pady=4)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self._fill_restore_list())
+        ttk.Entry(top_frame, textvariable=self.filter_var, font=DEFAULT_FONT).pack(side='left', expand=True,
+                                                                                  fill='x', padx=4, pady=4)
 
-        self.tree_view = TreeView(left_main_frame)
+        self.tree_view = ttk.Treeview(left_main_frame, columns=tuple(self._restore_columns), show="headings",
+                                      selectmode="browse")
+        for column, heading in self._restore_columns.items():
+            self.tree_view.heading(column, text=heading, command=lambda c=column: self._sort_restore_list(c))
+            self.tree_view.column(column, width=150 if column == "date" else 80, anchor='w')
+        scroll_bar = ttk.Scrollbar(left_main_frame, orient='vertical', command=self.tree_view.yview)
+        self.tree_view.configure(yscrollcommand=scroll_bar.set)
+        scroll_bar.pack(side='right', fill='y')
         self.tree_view.pack(side='top', anchor='nw', expand=True, fill='both')
-        self.tree_view.add_elements("Files", filepaths)
-        self.tree_view.see(self.tree_view.children_of_parents[0])
+        self.tree_view.bind("<<TreeviewSelect>>", lambda event: self._show_preview())
+        self._fill_restore_list()
 
         ttk.Button(right_main_frame, style="Accent.TButton", text="Load", width=18,
-                   command=lambda: self.load_restored_data(self.tree_view.item_selected, top_level)).pack(side='top',
-                                                                                                          pady=4,
-                                                                                                          padx=4)
+                   command=lambda: self.load_restored_data(self._selected_backup(), top_level)).pack(side='top',
+                                                                                                     pady=4,
+                                                                                                     padx=4)
         ttk.Button(right_main_frame, style="Accent.TButton", text="Cancel", width=18,
                    command=lambda: self.cancel_loading()).pack(side='top', pady=4, padx=4)
 
+        ttk.Label(right_main_frame, text="Preview:", font=DEFAULT_FONT_BOLD, style="H.TLabel").pack(side='top',
+                                                                                                    pady=4,
+                                                                                                    padx=4)
+        self.preview = tk.Listbox(right_main_frame, font=DEFAULT_FONT, width=28, activestyle='none')
+        self.preview.pack(side='top', expand=True, fill='both', padx=4, pady=4)
+
     def create_restore_view(self, data_passes, top_level):
         if self.active:
             self.cancel_auto()
         self.data_passes = data_passes
-        path = os.path.join(os.getcwd(), "Back Ups", self.data_handler.current_user)
-        filepaths = os.listdir(path)
-        # Reversing the filepaths
-        start = len(filepaths) - 1
-        filepaths = [filepaths[i] for i in range(start, -1, -1)]
+        # Only the index is read here, the backups are decoded when one is loaded
+        self._backup_entries = self._backup_store().entries()
         if self.top_window is None:
             self.top_window = tk.Toplevel(self.root)
             utils.set_window(self.top_window, 700, 500, "Restore User", parent=self.root, resize=True,
                              offset=(-280, -150))
-            self.create_restore_page(filepaths, top_level)
+            self.create_restore_page(top_level)
             self.top_window.focus_set()
         else:
             try:
@@ -182,9 +315,107 @@ class BackUpSystem:
                 self.top_window = tk.Toplevel(self.root)
                 utils.set_window(self.top_window, 700, 500, "Restore User", parent=self.root, resize=True,
                                  offset=(-280, -150))
-                self.create_restore_page(filepaths, top_level)
+                self.create_restore_page(top_level)
                 self.top_window.focus_set()
 
+    def _backup_store(self) -> BackupStore:
+        path = os.path.join(self._main_directory, self.data_handler.current_user)
+        return BackupStore(path, self.data_passes)
+
+    def _selected_backup(self) -> str | None:
+        selected = self.tree_view.selection()
+        return selected[0] if selected else None
+
+    def _fill_restore_list(self) -> None:
+        """Shows the backups matching the filter, by their file name or the name of a category in them, sorted by
+        the chosen column."""
+        text = self.filter_var.get().strip().lower()
+        rows = []
+        for filename, details in self._backup_entries.items():
+            if text and text not in filename.lower() and \
+                    not any(text in category.lower() for category in details.get("summary", ())):
+                continue
+            rows.append((filename, details))
+        column = self._sort_column
+        if column == "date":
+            rows.sort(key=lambda row: row[1]["time"], reverse=self._sort_reverse)
+        elif column == "type":
+            rows.sort(key=lambda row: row[1]["kind"], reverse=self._sort_reverse)
+        else:
+            rows.sort(key=lambda row: row[1].get(column, -1), reverse=self._sort_reverse)
+        selected = self._selected_backup()
+        self.tree_view.delete(*self.tree_view.get_children())
+        for filename, details in rows:
+            self.tree_view.insert("", "end", iid=filename,
+                                  values=(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(details["time"])),
+                                          details["kind"].capitalize(),
+                                          details.get("categories", "?"),
+                                          details.get("entries", "?"),
+                                          self._format_size(details["size"])))
+        if selected is not None and self.tree_view.exists(selected):
+            self.tree_view.selection_set(selected)
+
+    def _sort_restore_list(self, column: str) -> None:
+        """Sorts by the column, clicking the same column again flips the order."""
+        if column == self._sort_column:
+            self._sort_reverse = not self._sort_reverse
+        else:
+            self._sort_column = column
+            self._sort_reverse = column != "type"
+        self._fill_restore_list()
+
+    @staticmethod
+    def _format_size(size: int) -> str:
+        for unit in ("B", "KB", "MB"):
+            if size < 1024:
+                return f"{size:.0f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
+
+    def _show_preview(self) -> None:
+        """Shows the categories of the selected backup from the index. Backups that aren't in the index yet are read
+        on the save worker and added to it."""
+        filename = self._selected_backup()
+        if filename is None:
+            return
+        details = self._backup_entries[filename]
+        self.preview.delete(0, 'end')
+        if "summary" not in details:
+            self.preview.insert('end', "Reading backup...")
+            filepath = os.path.join(self._backup_store().folder, filename)
+            self.data_handler.save_worker.submit(("index", filepath), self._index_backup, filepath,
+                                                 callback=self._backup_indexed)
+            return
+        if details.get("unreadable"):
+            self.preview.insert('end', "Can't read this backup.")
+            return
+        self.preview.insert('end', f"{details['categories']} categories, {details['entries']} definitions")
+        for category, amount in details["summary"].items():
+            self.preview.insert('end', f"{category} ({amount})")
+
+    def _index_backup(self, filepath: str) -> tuple[str, bool]:
+        """Runs on the save worker. Reads a backup that isn't in the index and adds it."""
+        data, check = self.load_backup(filepath)
+        if check:
+            self._backup_store().index_backup(filepath, {category: len(definitions)
+                                                         for category, definitions in data.items()})
+        return os.path.basename(filepath), check
+
+    def _backup_indexed(self, result: tuple[str, bool]) -> None:
+        filename, check = result
+        try:
+            if not self.top_window.winfo_exists():
+                return
+        except (AttributeError, tk.TclError):
+            return
+        self._backup_entries = self._backup_store().entries()
+        if not check and filename in self._backup_entries:
+            self._backup_entries[filename]["summary"] = {}
+            self._backup_entries[filename]["unreadable"] = True
+        self._fill_restore_list()
+        if self._selected_backup() == filename:
+            self._show_preview()
+
     def cancel_loading(self):
         self.top_window.destroy()
 
@@ -192,8 +423,7 @@ class BackUpSystem:
         if filepath is None:
             return
         filepath = os.path.join(os.getcwd(), "Back Ups", self.data_handler.current_user, filepath)
-        read_data = utils.read_json(filepath, data={})
-        raw_data, check = utils.decode_string(read_data, self.data_passes, json_object=True)
+        raw_data, check = self.load_backup(filepath)
 
         if not check:
             tk.messagebox.showinfo("Error", "Can't restore that data.", parent=top_level)
@@ -0,0 +1,156 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+from Scripts.ordered_map import OrderedMap
+
+
+def copy_definitions(definitions: dict) -> OrderedMap:
+    """Returns a copy of a category's definitions, keeping their positions."""
+    if isinstance(definitions, OrderedMap):
+        return definitions.copy(list)
+    return OrderedMap((d, list(v)) for d, v in definitions.items())
+
+
+def copy_data(data: dict) -> dict:
+    """Returns a copy of a user's data that can be handed to another thread."""
+    return {c: copy_definitions(definitions) for c, definitions in data.items()}
+
+
+def apply_operations(data: OrderedMap, operations: list) -> None:
+    """Applies the operations collected from a ChangeSet to a copy of the data, in place.
+    Renaming and re-ordering categories doesn't go through the values, so categories of a LazyData that haven't
+    been loaded stay that way."""
+    for operation in operations:
+        kind = operation[0]
+        if kind == "reset":
+            data.clear()
+            for category, definitions in operation[1].items():
+                data[category] = copy_definitions(definitions)
+        elif kind == "rename":
+            _, category, new_category = operation
+            if category in data:
+                data.rename(category, new_category)
+        elif kind == "drop":
+            # Deleted rather than popped, so a category that hasn't been loaded isn't decoded just to be dropped
+            if operation[1] in data:
+                del data[operation[1]]
+        elif kind == "put":
+            # Records saved before definitions had positions don't have one
+            _, category, definition, values, *position = operation
+            definitions = data.setdefault(category, OrderedMap())
+            if position:
+                definitions.place(definition, list(values), position[0])
+            else:
+                definitions[definition] = list(values)
+        elif kind == "delete":
+            data.get(operation[1], {}).pop(operation[2], None)
+        elif kind == "position":
+            _, category, definition, position = operation
+            definitions = data.get(category, {})
+            if definition in definitions:
+                definitions.set_position(definition, position)
+        elif kind == "order":
+            # Records saved before definitions had positions don't have them
+            _, category, definitions, *positions = operation
+            data.setdefault(category, OrderedMap()).set_order(definitions, *positions)
+        elif kind == "categories":
+            for category in operation[1]:
+                if category not in data:
+                    data[category] = OrderedMap()
+            data.set_order(operation[1])
+
+
+class ChangeSet:
+    """Keeps track of which categories and definitions have changed since the last time the user's data was
+    written to disk. The DataHandler marks every change it makes, and clears the set once it has been saved."""
+    __slots__ = "entries", "positions", "orders", "structure", "categories", "reset"
+
+    def __init__(self):
+        # (category, definition) pairs that were added, edited or deleted
+        self.entries = set()
+        # (category, definition) pairs that were moved
+        self.positions = set()
+        # Categories where all the definitions were re-ordered
+        self.orders = set()
+        # Renamed and deleted categories, in the order it happened
+        self.structure = []
+        # If the order/list of categories changed
+        self.categories = False
+        # If all the data was replaced (clearing, restoring)
+        self.reset = False
+
+    def mark_entry(self, category: str, definition: str) -> None:
+        self.entries.add((category, definition))
+
+    def mark_position(self, category: str, definition: str) -> None:
+        self.positions.add((category, definition))
+
+    def mark_order(self, category: str) -> None:
+        self.orders.add(category)
+
+    def mark_categories(self) -> None:
+        self.categories = True
+
+    def mark_reset(self) -> None:
+        self.clear()
+        self.reset = True
+
+    def rename_category(self, category: str, new_category: str) -> None:
+        """Moves any pending changes over to the new category name."""
+        self.entries = {(new_category if c == category else c, d) for c, d in self.entries}
+        self.positions = {(new_category if c == category else c, d) for c, d in self.positions}
+        if category in self.orders:
+            self.orders.discard(category)
+            self.orders.add(new_category)
+        self.structure.append(("rename", category, new_category))
+        self.categories = True
+
+    def drop_category(self, category: str) -> None:
+        """Forgets any pending changes of a deleted category."""
+        self.entries = {(c, d) for c, d in self.entries if c != category}
+        self.positions = {(c, d) for c, d in self.positions if c != category}
+        self.orders.discard(category)
+        self.structure.append(("drop", category))
+        self.categories = True
+
+    def dirty_categories(self) -> set:
+        """Returns the categories that have changes waiting to be written."""
+        dirty = {c for c, _ in self.entries}
+        dirty.update(c for c, _ in self.positions)
+        dirty.update(self.orders)
+        return dirty
+
+    def is_empty(self) -> bool:
+        return not (self.entries or self.positions or self.orders or self.structure or self.categories or self.reset)
+
+    def clear(self) -> None:
+        self.entries = set()
+        self.positions = set()
+        self.orders = set()
+        self.structure = []
+        self.categories = False
+        self.reset = False
+
+    def collect(self, data: dict) -> list:
+        """Turns the tracked changes into a list of operations for the storage to write, using the current data.
+        Values are copied so the operations stay valid if the data changes afterwards."""
+        if self.reset:
+            return [("reset", copy_data(data))]
+        operations = list(self.structure)
+        for category, definition in self.entries:
+            try:
+                definitions = data[category]
+                operations.append(("put", category, definition, list(definitions[definition]),
+                                   definitions.position(definition)))
+            except KeyError:
+                operations.append(("delete", category, definition))
+        for category, definition in self.positions - self.entries:
+            if category not in self.orders and definition in data.get(category, {}):
+                operations.append(("position", category, definition, data[category].position(definition)))
+        for category in self.orders:
+            if category in data:
+                definitions = data[category]
+                operations.append(("order", category, list(definitions.keys()),
+                                   [definitions.position(d) for d in definitions]))
+        if self.categories:
+            operations.append(("categories", list(data.keys())))
+        return operations
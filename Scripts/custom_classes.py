@@ -10,11 +10,8 @@ except ImportError:  # Python 3
     import tkinter.font as tkfont
 
 import json
-import threading
 from PIL import ImageTk, Image
 import random
-from enchant import Dict, tokenize
-from enchant.tokenize import en  # Need this for building with pyinstaller, otherwise it doesn't import the en.tokenizer
 import os
 
 from CustomTkWidgets.custom_calendar import Calendar
@@ -25,16 +22,29 @@ from CustomTkWidgets.custom_notebook import DefaultNotebook
 from CustomTkWidgets.custom_todo_list import CustomToDoList
 from Scripts.settings import *
 import Scripts.utils as utils
+from Scripts.search_index import match_offsets
+from Scripts.search_query import highlight_text, is_simple, parse
+from Scripts.spell_checker import get_spell_checker
+from Scripts.background_images import BackgroundImages
 
 
 class BackGround(tk.Canvas):
     _bg_image = None
     _image_locations_path = os.path.join(os.getcwd(), "Core", "Docs", "image_paths.json")
-    __slots__ = "root", "image_loc", "images_paths", "_image_path", "image_name", "background_img", "image", "drawn"
-
-    def __init__(self, root, *args, **kwargs):
+    # While the window is being dragged a quick resize is shown, the smooth one is done once it's settled
+    _preview_filter = Image.NEAREST
+    _settle_delay = 200
+    # Shown until the first image is ready
+    _placeholder_color = "#1c1c1c"
+    __slots__ = "root", "image_loc", "images_paths", "_image_path", "image_name", "background_img", "image", "drawn", \
+                "images", "_resize_after_id"
+
+    def __init__(self, root, images: BackgroundImages, *args, **kwargs):
         tk.Canvas.__init__(self, root, *args, **kwargs)
         self.root = root
+        # Made once by the app and shared by the canvas of every login, so its workers aren't started again
+        self.images = images
+        self._resize_after_id = None
         self.bind("<Configure>", self.on_resize)
         self.image_loc = None
         self.images_paths = None
@@ -47,10 +57,36 @@ class BackGround(tk.Canvas):
         self.reload_image()
 
     def on_resize(self, event):
-        resize_image = self.resize_image(self._image_path)
-        self.image = ImageTk.PhotoImage(resize_image)
-
-        self.itemconfig(self.drawn, image=self.image)
+        size = (event.width, event.height)
+        self.images.submit_resize(self._image_path, size, self._preview_filter, self._show_resized)
+        if self._resize_after_id is not None:
+            self.after_cancel(self._resize_after_id)
+        self._resize_after_id = self.after(self._settle_delay, self._resize_settled)
+
+    def _resize_settled(self) -> None:
+        """Resizes the image to the canvas on the image worker, it's shown once it's ready."""
+        self._resize_after_id = None
+        self.images.submit_resize(self._image_path, self._canvas_size(), Image.LANCZOS, self._show_resized)
+
+    def _canvas_size(self) -> tuple[int, int]:
+        """Returns the size of the canvas, or the size it was made with until it's shown, winfo_width and
+        winfo_height are 1 before then."""
+        if self.winfo_ismapped():
+            return self.winfo_width(), self.winfo_height()
+        return self.winfo_pixels(self.cget("width")), self.winfo_pixels(self.cget("height"))
+
+    def _show_resized(self, resized: tuple) -> None:
+        """Runs on the Tk thread once the image worker has resized the image. Sizes and images that aren't
+        current anymore are dropped."""
+        image_path, size, image = resized
+        try:
+            if image_path != self._image_path or size != self._canvas_size():
+                return
+            self.image = ImageTk.PhotoImage(image)
+            self.itemconfig(self.drawn, image=self.image)
+        except tk.TclError:
+            # The window was closed
+            pass
 
     def reload_image(self):
         self.image_loc = utils.read_json(self._image_locations_path, BACKGROUND_IMAGES)
@@ -60,26 +96,24 @@ class BackGround(tk.Canvas):
         self.images_paths = [v for v in self.image_loc.values()]
         self._image_path = random.choice(self.images_paths)
         self.image_name = [k for k, v in self.image_loc.items() if self._image_path == v][0]
-        resize_image = self.resize_image(self._image_path)
-        self.image = ImageTk.PhotoImage(resize_image)
-        self.pack(expand=True, fill="both")
-        self.drawn = self.create_image(0, 0, image=self.image, anchor='nw')
+        if self.drawn is None:
+            # The window shows straight away with a plain color, the image is decoded on the image worker
+            self.configure(background=self._placeholder_color)
+            self.pack(expand=True, fill="both")
+            self.drawn = self.create_image(0, 0, anchor='nw')
+        self._resize_settled()
+        # The other images get their cached copies made, so changing to them is quick, and the copies of images
+        # that were deleted are removed
+        self.images.prefetch([path for path in self.images_paths if path != self._image_path])
+        self.images.prune_cache(self.images_paths)
 
     def change_background(self, image_path: str) -> None:
         # Reset the image path
         self._image_path = image_path
         # Reset the image name
         self.image_name = [k for k, v in self.image_loc.items() if self._image_path == v][0]
-        # Resize to the screen
-        resize_image = self.resize_image(image_path)
-        # Convert to photo image
-        self.image = ImageTk.PhotoImage(resize_image)
-        # Set the canvas to the new image
-        self.itemconfig(self.drawn, image=self.image)
-
-    def resize_image(self, image_path: str) -> Image.Image:
-        image = Image.open(image_path)
-        return image.resize((self.winfo_width(), self.winfo_height()), Image.LANCZOS)
+        # Resize to the screen, the old image stays until it's ready
+        self._resize_settled()
 
     def save_image_paths(self):
         """Used to dump any added images into the database to the json file before closing the program,
@@ -89,25 +123,29 @@ class BackGround(tk.Canvas):
 
 class TextArea(tk.Text):
     locale = 'en'
-    __slots__ = "data_handler", "alert_system", "corpus", "tokenize", "_proxy", "selected_word", "suggested_words", \
-                "after_id", "new_thread", "flag"
+    # How long typing has to stop for before spell checking, in ms
+    _spell_delay = 700
+    __slots__ = "data_handler", "alert_system", "spell", "_proxy", "selected_word", \
+                "after_id", "flag", "_spell_checks", "_spell_marks"
 
     def __init__(self, text_frame, data_handler, category, definition, alert_system, *args, **kwargs):
         tk.Text.__init__(self, text_frame, *args, **kwargs)
         self.data_handler = data_handler
         self.alert_system = alert_system
-        self.corpus = Dict(self.locale)
-        self.tokenize = tokenize.get_tokenizer(self.locale)
+        # Shared by all the tabs, so the dictionary is only loaded once
+        self.spell = get_spell_checker(self.locale)
         self._proxy = self._w + "_proxy"
         self.tk.call("rename", self._w, self._proxy)
         self.tk.createcommand(self._w, self._proxy_cmd)
         self.tag_configure('hl', foreground='red')
+        self.tag_configure('found', background='yellow', foreground='black')
 
         self.selected_word = ""
-        self.suggested_words = {}
         self.after_id = None
-        self.new_thread = None
         self.flag = False
+        # Number of the last spell check, and the marks at the start of the ranges it's checking
+        self._spell_checks = 0
+        self._spell_marks = []
 
         self.insert(tk.END, self.data_handler.get_text_by_definition(category, definition))
 
@@ -118,8 +156,19 @@ class TextArea(tk.Text):
         scroll_bar.pack(in_=text_frame, side='right', fill='y', expand=False)
 
         self.bind('<<TextModified>>', self.on_modify)
+        self.bind('<Destroy>', self._on_destroy, add=True)
         self.bind("<ButtonPress-3>", lambda event: self.pop_up_menu(event))
 
+    def highlight(self, query: str) -> None:
+        """Highlights the words matching the search and scrolls to the first one."""
+        self.tag_remove('found', '1.0', tk.END)
+        offsets = match_offsets(self.get('1.0', 'end-1c'), query)
+        for start, end in offsets:
+            self.tag_add('found', f"1.0+{start}c", f"1.0+{end}c")
+        if offsets:
+            self.mark_set(tk.INSERT, f"1.0+{offsets[0][0]}c")
+            self.see(tk.INSERT)
+
     def pop_up_menu(self, event):
         try:
             self.selected_word = self.get(tk.SEL_FIRST, tk.SEL_LAST)
@@ -150,10 +199,10 @@ class TextArea(tk.Text):
 
                 return new_command
 
-            for key, value in self.suggested_words.items():
-                for item in value:
-                    if key == self.selected_word:
-                        menu.add_command(label=item, command=suggest_command(item))
+            # The spell worker already got the dictionary's suggestions for misspelled words, the added words
+            # are looked up straight away
+            for item in self.spell.cached_suggestions(self.selected_word):
+                menu.add_command(label=item, command=suggest_command(item))
 
             view.add_command(label=self.selected_word, command=add_to_dict_command(self.selected_word))
 
@@ -175,65 +224,126 @@ class TextArea(tk.Text):
 
     def add_to_dict(self, word: str):
         self.replace(tk.SEL_FIRST, tk.SEL_LAST, word)
-        check = self.corpus.is_added(word)
-        if not check:
-            self.corpus.add(word)
+        self.spell.add(word)
 
     def _proxy_cmd(self, command, *args):
         """Intercept the Tk commands to the text widget and if any of the content
-        modifying commands are called, post a TextModified event."""
+        modifying commands are called, mark the changed text to be spell checked and post a TextModified event."""
         cmd = (self._proxy, command)
         if args:
             cmd = cmd + args
         try:
+            if command in ('insert', 'delete', 'replace'):
+                # Stays in front of inserted text, so it's where the change starts once it's done
+                self.tk.call(self._proxy, 'mark', 'set', 'spell_start', args[0])
+                self.tk.call(self._proxy, 'mark', 'gravity', 'spell_start', 'left')
             result = self.tk.call(cmd)
-            if command in ('insert', 'delete'):
+            if command in ('insert', 'delete', 'replace'):
+                self._mark_dirty(command, args)
                 self.event_generate('<<TextModified>>')
             return result
         except tk.TclError as e:
             return
 
+    def _mark_dirty(self, command: str, args: tuple) -> None:
+        """Tags the text changed by a command as spell_dirty. The tag moves with later edits, so the ranges
+        are still right when the check runs."""
+        if command == 'delete':
+            # Only the words either side of the deleted text need checking again
+            self.tk.call(self._proxy, 'tag', 'add', 'spell_dirty', 'spell_start-1c', 'spell_start+1c')
+            return
+        # insert index chars ?tags chars tags...? and replace index1 index2 chars ?tags chars tags...?
+        strings = args[1::2] if command == 'insert' else args[2::2]
+        length = sum(len(string) for string in strings)
+        self.tk.call(self._proxy, 'tag', 'add', 'spell_dirty', 'spell_start-1c', f'spell_start+{length + 1}c')
+
     def on_modify(self, event):
-        """Rate limit the spell-checking with a 100ms delay. If another modification
+        """Rate limit the spell-checking with a 700ms delay. If another modification
         event comes in within this time, cancel the after call and re-schedule."""
         try:
             if self.after_id:
                 self.after_cancel(self.after_id)
-            self.after_id = self.after(700, lambda: self.make_thread(self.on_modified))
+            self.after_id = self.after(self._spell_delay, self.on_modified)
         except IndexError:
             pass
 
-    def is_double_space(self, input_string):
-        new_string = input_string.replace("  ", " ")
-        self.replace("1.0 linestart", "1.0 lineend", new_string)
+    def is_double_space(self):
+        """Takes out double spaces, in place so the tags and undo history are kept."""
+        index = self.search("  ", "1.0", stopindex=tk.END)
+        while index:
+            self.delete(index)
+            index = self.search("  ", index, stopindex=tk.END)
 
     def spell_check(self):
-        data = self.get(f"1.0 linestart", "1.0 lineend")
-        self.is_double_space(data)
-        for word, pos in self.tokenize(data):
-            check = self.corpus.check(word)
-            if not check:
-                start = f"1.{pos}"
-                end = f"1.{pos + len(word)}"
-                self.tag_add("hl", start, end)
-                self.suggested_words.update({word: self.corpus.suggest(word)})
-
-    def make_thread(self, func):
-        self.new_thread = threading.Thread(target=func, daemon=True)
-        self.new_thread.start()
+        self.is_double_space()
+        self.tag_add('spell_dirty', '1.0', tk.END)
+        self.on_modified()
+
+    def _word_bounds(self, start: str, end: str) -> tuple[str, str]:
+        """Widens a range out to the whitespace around it, so it doesn't cut through a word."""
+        before = self.search(r"\s", start, stopindex=f"{start} linestart", backwards=True, regexp=True)
+        after = self.search(r"\s", end, stopindex=f"{end} lineend", regexp=True)
+        return self.index(f"{before}+1c" if before else f"{start} linestart"), \
+            self.index(after if after else f"{end} lineend")
 
     def on_modified(self):
+        """Checks the words in the changed ranges on the spell worker, they get tagged once it's done.
+        The worker only gets copies of the text, it never touches the widget."""
         self.after_id = None
 
-        data = self.get(f"1.0 linestart", "1.0 lineend")
-        for word, pos in self.tokenize(data):
-            check = self.corpus.check(word)
-            if not check:
-                start = f"1.{pos}"
-                end = f"1.{pos + len(word)}"
-                self.tag_add("hl", start, end)
+        # A check of this tab that hasn't started yet is replaced by this one, so its ranges go in with it
+        if self.spell.worker.cancel(str(self)):
+            ranges = self.tag_ranges('spell_pending')
+            for i in range(0, len(ranges), 2):
+                self.tag_add('spell_dirty', ranges[i], ranges[i + 1])
+            if self._spell_marks:
+                self.mark_unset(*self._spell_marks)
+        ranges = self.tag_ranges('spell_dirty')
+        for i in range(0, len(ranges), 2):
+            self.tag_add('spell_dirty', *self._word_bounds(str(ranges[i]), str(ranges[i + 1])))
+        # Taken again as the widened ranges can overlap, the tag merges them
+        ranges = self.tag_ranges('spell_dirty')
+        if not ranges:
+            return
+        # Each range is found again by a mark at its start, which moves with the edits made before the check is done
+        self._spell_checks += 1
+        self._spell_marks = [f"spell_{self._spell_checks}_{i}" for i in range(0, len(ranges), 2)]
+        chunks = []
+        for mark, i in zip(self._spell_marks, range(0, len(ranges), 2)):
+            self.mark_set(mark, ranges[i])
+            self.mark_gravity(mark, tk.LEFT)
+            chunks.append((mark, self.get(ranges[i], ranges[i + 1])))
+        self.tag_remove('spell_pending', '1.0', tk.END)
+        for i in range(0, len(ranges), 2):
+            self.tag_add('spell_pending', ranges[i], ranges[i + 1])
+        self.tag_remove('spell_dirty', '1.0', tk.END)
+        self.spell.worker.submit(str(self), self.spell.check_chunks, chunks, callback=self.show_misspelled)
+
+    def _on_destroy(self, event) -> None:
+        if event.widget is self:
+            self.spell.worker.cancel(str(self))
+            if self.after_id:
+                self.after_cancel(self.after_id)
+                self.after_id = None
 
-                self.suggested_words.update({word: self.corpus.suggest(word)})
+    def show_misspelled(self, checked: list) -> None:
+        """Runs on the Tk thread with the (mark, text, misspelled words) of each range the spell worker checked,
+        the mark being where the range starts now. The highlighting of each range is replaced, unless it's been
+        edited since, then it gets checked again."""
+        try:
+            for mark, text, misspelled in checked:
+                end = f"{mark}+{len(text)}c"
+                if self.get(mark, end) != text:
+                    self.tag_add('spell_dirty', mark, end)
+                    self.on_modify(None)
+                else:
+                    self.tag_remove("hl", mark, end)
+                    for word, pos, suggestions in misspelled:
+                        self.tag_add("hl", f"{mark}+{pos}c", f"{mark}+{pos + len(word)}c")
+                self.mark_unset(mark)
+        except tk.TclError:
+            # The tab was closed before the check finished
+            pass
 
 
 class TabArea(tk.Frame):
@@ -315,7 +425,7 @@ class TabArea(tk.Frame):
         self.set_combobox()
 
     def spell_check(self):
-        self.text_area.make_thread(self.text_area.spell_check)
+        self.text_area.spell_check()
 
     def save_text(self, text: str) -> None:
         self.data_handler.add_text(self.category, self.definition, text)
@@ -484,7 +594,13 @@ class TDLTabArea(tk.Frame):
 
 
 class SearchEngine:
-    __slots__ = "main_layout", "data_handler", "packed", "search_frame", "search_entry"
+    """Searches as you type. The search waits for typing to stop, then runs on the search worker so the window
+    doesn't freeze, and a newer search throws away the results of the older ones. The results are put in the
+    listbox a page at a time."""
+    _delay = 250
+    _page_size = 100
+    __slots__ = "main_layout", "data_handler", "packed", "search_frame", "search_entry", "search_var", "after_id", \
+                "_query_id", "_results"
 
     def __init__(self, main_layout, data_handler):
         self.main_layout = main_layout
@@ -492,19 +608,26 @@ class SearchEngine:
         self.packed = False
         self.search_frame = None
         self.search_entry = None
+        self.search_var = None
+        self.after_id = None
+        # Goes up with every search, results from an older search are ignored
+        self._query_id = 0
+        self._results = []
 
     def create_view(self):
         if not self.packed:
             self.search_frame = ttk.Frame(self.main_layout.category_frame)
             self.search_frame.place(relx=0.45)
+            self.search_var = tk.StringVar()
             self.search_entry = ttk.Entry(self.search_frame, width=21, font=DEFAULT_FONT, validate="key",
-                                          style="R.TEntry",
+                                          style="R.TEntry", textvariable=self.search_var,
                                           validatecommand=(self.main_layout.register(
                                               lambda event: utils.validate_entry(
                                                   event, self.data_handler.entry_limit)), "%P"))
 
             self.search_entry.pack(side='left', padx=4)
             self.search_entry.bind("<Return>", lambda event=None: self.search_set_listbox(self.search_entry.get()))
+            self.search_var.trace_add("write", lambda *args: self.on_modify())
             ttk.Button(self.search_frame, style="Accent.TButton", text="Search", width=8,
                        command=lambda: self.search_set_listbox(self.search_entry.get())).pack(side='left',
                                                                                               padx=2,
@@ -514,6 +637,9 @@ class SearchEngine:
             ttk.Button(self.search_frame, style="Accent.TButton", text="X", width=2, command=self.unpack_search).pack(
                 side='right', padx=2, pady=4)
             self.packed = True
+            self.search_entry.focus_set()
+            # Gets the index ready while the search is being typed
+            self.data_handler.prepare_search()
         else:
             self.unpack_search()
 
@@ -523,38 +649,103 @@ class SearchEngine:
             self.packed = False
             self.search_reset()
 
-    @staticmethod
-    def string_search(word: str, data: list) -> list:
-        """Searches a list of strings for the given word. Will search for all cases of the word in the given list.
-        IE: Capitalize, lowercase, and original."""
-        if word == '':
-            return []
-
+    def on_modify(self):
+        """Waits for the typing to stop before searching. Cancels the search that's waiting to run, and the
+        results of the one running are ignored."""
+        self._cancel()
+        self.after_id = self.main_layout.after(self._delay,
+                                               lambda: self.search_set_listbox(self.search_entry.get(), quiet=True))
+
+    def _cancel(self) -> None:
+        if self.after_id:
+            self.main_layout.after_cancel(self.after_id)
+            self.after_id = None
+        self.data_handler.search_worker.cancel("search")
+        self._query_id += 1
+
+    def search_set_listbox(self, word: str, quiet: bool = False) -> None:
+        """Searches the whole journal on the search worker. Searches that can't be read show an alert, unless quiet
+        for while the search is still being typed."""
+        self._cancel()
         word = word.strip()
-
-        word_case_fold = word.casefold()
-        word_capital = word.capitalize()
-
-        wo = filter(lambda a: word in a, data)
-        w_case = filter(lambda a: word_case_fold in a, data)
-        wc = filter(lambda a: word_capital in a, data)
-
-        words = list(wo) + list(w_case) + list(wc)
-        return list(set(words))
-
-    def search_set_listbox(self, word: str) -> None:
+        if word == '':
+            self.show_category()
+            return
+        try:
+            node = parse(word)
+        except ValueError as e:
+            if not quiet:
+                self.main_layout.alert_system.show_alert((str(e), "red"))
+            return
+        self.data_handler.prepare_search()
+        query_id = self._query_id
+        self.data_handler.search_worker.submit("search", self._search, word, is_simple(node),
+                                               callback=lambda result: self.show_results(query_id,
+                                                                                         highlight_text(node),
+                                                                                         result, quiet))
+
+    def _search(self, word: str, simple: bool) -> tuple[list, list]:
+        """Runs on the search worker. Returns the definitions found, and the categories found if there's none."""
+        results = self.data_handler.search(word)
+        return results, [] if results or not simple else self.data_handler.search_categories(word)
+
+    def show_results(self, query_id: int, query: str, result: tuple[list, list], quiet: bool = False) -> None:
+        """Shows the definitions found in the current category, best first, or switches to the category with the
+        best found if there's none in it. Switches to the category matching the search when no definitions are
+        found. Results of a quiet search, made while typing, never switch the category, that's only done for
+        Return and the Search button, an alert says which categories have them instead. Tabs opened from the
+        results highlight the words searched."""
+        if query_id != self._query_id:
+            return
+        # Categories that hadn't been loaded were decoded for the search
+        self.data_handler.report_problems()
+        results, categories = result
+        if not results:
+            if categories and quiet:
+                self._show_found_elsewhere(categories)
+            elif categories:
+                self.main_layout.set_category_list(categories[0])
+            return
+        found = {}
+        for category, definition in results:
+            found.setdefault(category, []).append(definition)
+        category = self.main_layout.category_box.get()
+        if category not in found and quiet:
+            self._show_found_elsewhere(list(found))
+        elif category not in found:
+            # The results are ranked, so the first category has the best one
+            category = next(iter(found))
+            self.main_layout.set_category_list(category)
         self.main_layout.list_box.lock_selection()
-        new_list = self.string_search(word,
-                                      self.data_handler.get_definitions_by_list(self.main_layout.category_box.get()))
-        if len(new_list) > 0:
-            self.main_layout.update_list(new_list, search=True)
+        self.main_layout.notebook.highlight_query = query or None
+        self._results = found.get(category, [])
+        self._show_page(query_id, 0)
+
+    def _show_found_elsewhere(self, categories: list) -> None:
+        """Says which categories the results are in when the current one has none, best first."""
+        names = ", ".join(categories[:3]) + ("..." if len(categories) > 3 else "")
+        self.main_layout.alert_system.show_alert((f"Found in {names}, press Enter to go there.", "white"))
+
+    def _show_page(self, query_id: int, start: int) -> None:
+        """Puts a page of the results in the listbox, then lets Tk catch up before the next one."""
+        if query_id != self._query_id:
+            return
+        self.main_layout.update_list(self._results[start:start + self._page_size], search=True, append=start > 0)
+        if start + self._page_size < len(self._results):
+            self.main_layout.after(1, lambda: self._show_page(query_id, start + self._page_size))
+
+    def show_category(self) -> None:
+        """Shows all the definitions of the current category again."""
+        self.main_layout.notebook.highlight_query = None
+        self.main_layout.update_list()
+        self.main_layout.list_box.unlock_selection()
 
     def search_reset(self) -> None:
         word = self.search_entry.get()
         if len(word) > 0:
             self.search_entry.delete(0, len(word))
-        self.main_layout.update_list()
-        self.main_layout.list_box.unlock_selection()
+        self._cancel()
+        self.show_category()
 
 
 class ImportView(tk.Toplevel):
@@ -1263,17 +1454,20 @@ class Layout(tk.Frame):
         else:
             return self.list_box.get(index)
 
-    def update_list(self, word_list: list = None, search: bool = False) -> None:
-        """Updates the definition list from selected category or from the searched item."""
+    def update_list(self, word_list: list = None, search: bool = False, append: bool = False) -> None:
+        """Updates the definition list from selected category or from the searched item. With append, the searched
+        items are added after the ones already in the list."""
         if search:
-            self.list_box.delete(0, self.list_box.size())
+            if not append:
+                self.list_box.delete(0, self.list_box.size())
             for definition in word_list:
-                self.list_box.insert(0, definition)
+                self.list_box.insert(tk.END, definition)
         else:
             category = self.category_box.get()
             if self.list_box.size() != 0:
                 self.list_box.delete(0, tk.END)
             temp_list = self.data_handler.get_definitions_by_list(category)
+            self.data_handler.report_problems()
             pinned = self.data_handler.pinned
             if category in pinned.keys():
                 self.list_box.insert(0, pinned[category])
@@ -1301,7 +1495,7 @@ class Layout(tk.Frame):
 
 
 class CustomListBox(DefaultListbox):
-    __slots__ = "root", "data_handler", "category", "pin"
+    __slots__ = "root", "data_handler", "category", "pin", "moved"
 
     def __init__(self, root, data_handler, category, **kwargs):
         DefaultListbox.__init__(self, root, **kwargs)
@@ -1309,6 +1503,9 @@ class CustomListBox(DefaultListbox):
         self.data_handler = data_handler
         self.category = category
         self.pin = False
+        # If items were dragged since the mouse was pressed, the new order is saved once it's released
+        self.moved = False
+        self.bind('<ButtonRelease-1>', self.on_release, add="+")
 
     def save_new_order(self):
         if self.data_handler is None:
@@ -1316,6 +1513,11 @@ class CustomListBox(DefaultListbox):
         new_list_order = list(self.get(0, tk.END))
         self.data_handler.update_listbox(new_list_order, self.category)
 
+    def on_release(self, event=None):
+        if self.moved:
+            self.moved = False
+            self.save_new_order()
+
     def move_item(self, source, target):
         if not self.ctrl_clicked:
             item = self.get(source)
@@ -1367,7 +1569,7 @@ class CustomListBox(DefaultListbox):
                         not_in_index += 1
                 current_index = min(selection) - 1
                 self.move_item(current_index, current_index + len(selection))
-                self.save_new_order()
+                self.moved = True
             elif current_index > max(selection):
                 self.lock_shifting()
                 not_in_index = 0
@@ -1377,13 +1579,14 @@ class CustomListBox(DefaultListbox):
                         not_in_index += 1
                 current_index = max(selection) + 1
                 self.move_item(current_index, current_index - len(selection))
-                self.save_new_order()
+                self.moved = True
             self.unlock_shifting()
             return "break"
 
 
 class CustomNotebook(DefaultNotebook):
-    __slots__ = "root", "data_handler", "alert_system", "_active", "packed", "frames", "main_layout"
+    __slots__ = "root", "data_handler", "alert_system", "_active", "packed", "frames", "main_layout", \
+                "highlight_query"
 
     def __init__(self, root, nb_frame, alert_system, data_handler, main_layout, *args, **kwargs):
         kwargs["style"] = "TNotebook"
@@ -1397,6 +1600,8 @@ class CustomNotebook(DefaultNotebook):
         self._active = None
         self.packed = False
         self.frames = {}
+        # The search to highlight in the tabs opened from the search results
+        self.highlight_query = None
 
         self.bind("<ButtonRelease-1>", self.on_close_release)
         self.bind("<<NotebookTabClosed>>", lambda e=None: self.check_for_unpack())
@@ -1420,10 +1625,14 @@ class CustomNotebook(DefaultNotebook):
                 self.add(frame, text=definition)
                 self.select(frame)
                 self.validate_tab_length(frame)
+                self.highlight_search(frame)
             # Other-wise sets the focused on the specified definition user is trying to open again
             else:
                 self.set_tab(definition)
-                self.alert_system.show_alert(("Can't open multiple tabs with the same name.", "red"))
+                if self.highlight_query:
+                    self.highlight_search(self.frames[definition])
+                else:
+                    self.alert_system.show_alert(("Can't open multiple tabs with the same name.", "red"))
         else:
             # If tab limit is executed, focus will be set to specified tab.
             if definition in self.frames:
@@ -1431,6 +1640,10 @@ class CustomNotebook(DefaultNotebook):
             else:
                 self.alert_system.show_alert(("Tab limit has been met.", "red"))
 
+    def highlight_search(self, frame) -> None:
+        if self.highlight_query and isinstance(frame, TabArea):
+            frame.text_area.highlight(self.highlight_query)
+
     def close_tabs(self, close_list: list = None, save: bool = False, log_out: bool = False,
                    clearing: bool = False) -> None:
         """Closes tabs via keyboard shortcut, exit button, renaming definitions, deleting definitions,
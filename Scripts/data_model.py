@@ -1,20 +1,29 @@
 # Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
 
+import copy
 import json
 import os
 import shutil
+import threading
 import time
 import random
 import Scripts.utils as utils
 from Scripts.settings import *
 from Scripts.backup_system import BackUpSystem
+from Scripts.change_set import ChangeSet, copy_data
+from Scripts.ordered_map import OrderedMap
+from Scripts.search_index import SearchIndex
+from Scripts.search_query import is_simple, parse
+from Scripts.storage import STORAGE_TYPES, LazyData, Shard
+from Scripts.workers import Worker
 
 USER_DATA = {"entry_limit": 20,
              "tdl_limit": 80,
              "tab_limit": 4,
              "last_category": "",
              "default_font": ["Arial", 12],
-             "pinned": {}
+             "pinned": {},
+             "storage": JSON_STORAGE
              }
 
 
@@ -219,7 +228,6 @@ class LoginHandler:
 
 
 class DataHandler:
-    _filename = "database.json"
     _current_directory = os.getcwd()
     _export_directory = "Export"
     _export_folder_path = os.path.join(_current_directory, _export_directory)
@@ -227,6 +235,8 @@ class DataHandler:
     _users_directory = "Users"
     _users_folder_path = os.path.join(_current_directory, _directory, _users_directory)
     _users_config = "config_pref.json"
+    _search_index_filename = "search_index.json"
+    _spelling_filename = "spelling.json"
     _theme_config = "theme.json"
     _path_to_config_directory = os.path.join(_current_directory, _directory, "Config")
     _path_to_theme_config = os.path.join(_current_directory, _directory, "Config", _theme_config)
@@ -235,14 +245,18 @@ class DataHandler:
                    "120": 120000}
     _default_theme_data = {"theme_path": AZURE_THEME_PATH,
                            "theme": AZURE_THEME}
+    # Seconds to wait for more saves before writing
+    _save_delay = 0.3
     __slots__ = "backup_sys", "data", "config_data", "current_user", "signed_in", "entry_limit", "tab_limit", \
-                "last_category", "default_font", "pinned", "theme", "_data_passes", "_data_save_path", \
-                "_config_save_path", "tdl_limit"
+                "last_category", "default_font", "pinned", "theme", "_data_passes", "storage", "storage_engine", \
+                "_config_save_path", "tdl_limit", "_changes", "_config_snapshot", "_theme_snapshot", "save_worker", \
+                "_pending_operations", "_pending_lock", "_retired_storages", "generation", "_backup_operations", \
+                "search_index", "search_worker", "spell_checker", "alert_system"
 
     def __init__(self):
         self.backup_sys = None
 
-        self.data = {}
+        self.data = LazyData()
         self.config_data = {}
 
         self.current_user = None
@@ -256,22 +270,50 @@ class DataHandler:
         self.theme = None
         self._data_passes = None
 
-        self._data_save_path = None
+        self.storage = None
+        self.storage_engine = None
         self._config_save_path = None
 
+        # What has changed since the last time each file was written
+        self._changes = ChangeSet()
+        self._config_snapshot = None
+        self._theme_snapshot = None
+
+        # Writes files off the Tk thread, generates a DataSaved event when a write finishes
+        self.save_worker = Worker("SaveWorker", delay=self._save_delay, event="<<DataSaved>>")
+        self._pending_operations = []
+        self._pending_lock = threading.Lock()
+        # engine: storage the data was moved out of, its files are deleted once the data is written to the new one
+        self._retired_storages = {}
+        # Goes up every time the data changes, the auto backup skips when it hasn't changed
+        self.generation = 0
+        # The operations since the last auto backup, None while auto backup isn't running
+        self._backup_operations = None
+        # Full text index of all the definitions, built on the first search. Searches run on the search worker
+        self.search_index = SearchIndex(self._search_texts)
+        self.search_worker = Worker("SearchWorker")
+        # The spell checker the user's added words and suggestions are loaded into, saved when logging out
+        self.spell_checker = None
+        self.alert_system = None
+
         self._setup_theme()
 
     # Json data functions
     def clear_data(self) -> None:
         """Clears the current user's data."""
-        self.data = {}
+        self.data = LazyData()
+        self._changes.mark_reset()
+        self.search_index.clear()
 
     def _setup_theme(self):
         utils.check_folder_and_create(self._path_to_config_directory)
         self.theme = utils.read_json(self._path_to_theme_config, self._default_theme_data)
+        self._theme_snapshot = copy.deepcopy(self.theme)
 
     def setup_database(self, user: str, signed_in: str, data_passes: int) -> tuple[bool, str]:
         """Grabs the saved data from the json file and set's attributes from it."""
+        # Finish writing the previous user's data first
+        self.save_worker.flush()
         # CWD/Data/Users/Username/config_pref.json
         self._config_save_path = os.path.join(self._users_folder_path, user, self._users_config)
         config_data = utils.read_json(self._config_save_path, USER_DATA)
@@ -284,37 +326,119 @@ class DataHandler:
         self.last_category = config_data['last_category']
         self.default_font = config_data['default_font']
         self.pinned = config_data['pinned']
+        self.config_data = config_data
+        self._config_snapshot = copy.deepcopy(config_data)
 
-        # CWD/Data/Users/Username/database.json
-        self._data_save_path = os.path.join(self._users_folder_path, user, self._filename)
         self._data_passes = data_passes
-
-        data = utils.read_json(self._data_save_path, data={})
-        # First time creating
-        if data == {}:
-            self.data = {}
-            return True, ""
-        self.data, check = utils.decode_string(data, self._data_passes, json_object=True)
+        self._changes.clear()
+        self._backup_operations = None
+        self._retired_storages = {}
+        self.search_index.clear()
+
+        if self.storage is not None:
+            self.storage.close()
+        self.storage_engine = config_data.get('storage', JSON_STORAGE)
+        self.storage = self._create_storage(self.storage_engine)
+        source = self.storage
+        if not self.storage.exists():
+            # Move the data over from the other storage the first time a storage is used
+            for engine in STORAGE_ENGINES:
+                other = self._create_storage(engine)
+                if other.exists():
+                    source = other
+                    self._retired_storages = {engine: other}
+                    break
+
+        self.data, check = source.load()
+        if source is not self.storage:
+            if check:
+                self.data.load_all()
+            source.close()
+            self._changes.mark_reset()
         if not check:
-            self.data = {}
+            # Nothing was moved, so the files are kept
+            self._retired_storages = {}
+            self.data = LazyData()
             return True, "Database has been corrupted."
         else:
+            if source is self.storage:
+                self._load_search_index()
             return True, ""
 
+    def _create_storage(self, engine: str):
+        # CWD/Data/Users/Username
+        user_folder = os.path.join(self._users_folder_path, self.current_user)
+        return STORAGE_TYPES[engine](user_folder, self._data_passes)
+
+    def set_storage_engine(self, engine: str) -> None:
+        """Changes how the current user's data is stored. All the data gets written to the new storage on the
+        next save."""
+        if engine == self.storage_engine:
+            return
+        self.save_worker.flush()
+        # Everything has to be read from the old storage before it's closed
+        self.data.load_all()
+        self.storage.close()
+        # Switching back before anything was saved keeps the files of the storage switched back to
+        self._retired_storages.pop(engine, None)
+        self._retired_storages[self.storage_engine] = self.storage
+        self.storage_engine = engine
+        self.storage = self._create_storage(engine)
+        self._changes.mark_reset()
+
     def update_json(self) -> None:
-        """Updates the data in the raw_data for the current user."""
+        """Updates the data in the raw_data for the current user. Only writes the files that have changed since the
+        last time they were written. The writing is done on the save worker, saves made close together are written
+        at once. Use save_worker.flush() to wait for them to finish."""
         self.config_data['entry_limit'] = self.entry_limit
         self.config_data['tdl_limit'] = self.tdl_limit
         self.config_data['tab_limit'] = self.tab_limit
         self.config_data['last_category'] = self.last_category
         self.config_data['default_font'] = self.default_font
         self.config_data['pinned'] = self.pinned
-        utils.dump_json(self._config_save_path, self.config_data)
-
-        utils.dump_json(self._path_to_theme_config, self.theme)
-
-        data = utils.encode_string(self.data, self._data_passes)
-        utils.dump_json(self._data_save_path, data)
+        self.config_data['storage'] = self.storage_engine
+        if self.config_data != self._config_snapshot:
+            self._config_snapshot = copy.deepcopy(self.config_data)
+            self.save_worker.submit("config", utils.dump_json, self._config_save_path, self._config_snapshot)
+
+        if self.theme != self._theme_snapshot:
+            self._theme_snapshot = copy.deepcopy(self.theme)
+            self.save_worker.submit("theme", utils.dump_json, self._path_to_theme_config, self._theme_snapshot)
+
+        if not self._changes.is_empty():
+            operations = self._changes.collect(self.data)
+            with self._pending_lock:
+                self._pending_operations.extend(operations)
+            if self._backup_operations is not None:
+                self._backup_operations.extend(operations)
+            self.generation += 1
+            self._changes.clear()
+            self.save_worker.submit("database", self._write_operations, self.storage)
+
+    def _write_operations(self, storage) -> None:
+        """Runs on the save worker, writes all the operations collected since the last write."""
+        with self._pending_lock:
+            operations = self._pending_operations
+            self._pending_operations = []
+        storage.save(operations)
+        with self._pending_lock:
+            retired = list(self._retired_storages.values())
+            self._retired_storages = {}
+        for old_storage in retired:
+            # All the data is in the new storage now, left behind it would be loaded instead if the user
+            # switches back
+            old_storage.remove()
+
+    def close_storage(self) -> None:
+        """Waits for any saves to finish, saves the search index and closes the current user's storage when
+        logging out."""
+        self.save_worker.flush()
+        self._save_spelling()
+        if self.storage is not None:
+            self._save_search_index()
+        self.search_worker.flush()
+        if self.storage is not None:
+            self.storage.close()
 
     def reset_default_config(self):
         config_data = USER_DATA
@@ -323,7 +447,10 @@ class DataHandler:
         self.tab_limit = config_data['tab_limit']
         self.last_category = config_data['last_category']
         self.default_font = config_data['default_font']
-        utils.dump_json(self._config_save_path, USER_DATA)
+        self._config_snapshot = copy.deepcopy(USER_DATA)
+        # Resetting the settings doesn't move the data, the storage is changed on its own in the general settings
+        self._config_snapshot['storage'] = self.storage_engine
+        self.save_worker.submit("config", utils.dump_json, self._config_save_path, self._config_snapshot)
 
     # Import/Export Functions
     def import_data(self, data: dict, orig_data: dict, backup: bool):
@@ -339,8 +466,11 @@ class DataHandler:
                             if key in new_data:
                                 new_data[key].update({definition: details})
                             else:
-                                new_data.update({key: {definition: details}})
+                                new_data.update({key: OrderedMap({definition: details})})
+                                self._changes.mark_categories()
+                            self._changes.mark_entry(key, definition)
             self.data = new_data
+            self.search_index.clear()
             return True
         except KeyError:
             return False
@@ -372,8 +502,17 @@ class DataHandler:
     # Back up Functions
     def create_backup_system(self, root, alert_system) -> None:
         """Creates the backup system for the current user."""
+        self.alert_system = alert_system
         self.backup_sys = BackUpSystem(root, self, alert_system)
 
+    def report_problems(self) -> None:
+        """Shows an alert for the categories and definitions the storage couldn't read since the last time.
+        Categories are loaded when they're first used, so this is called after using them on the Tk thread."""
+        if self.storage is None or self.alert_system is None:
+            return
+        for message in self.storage.take_problems():
+            self.alert_system.show_alert((message, "red"))
+
     def backup_data(self) -> None:
         """Calls the backup user method from the BackupSystem with the current user and data."""
         self.backup_sys.backup_user(self.current_user, self.data, self._data_passes)
@@ -383,8 +522,21 @@ class DataHandler:
         Sets the grabbed data and returns boolean."""
         self.backup_sys.create_restore_view(self._data_passes, top_level)
 
+    def take_backup_operations(self) -> list:
+        """Saves any changes and returns the operations made since the last time this was called. The operations are
+        kept track of from the first call until stop_backup_operations is called."""
+        self.update_json()
+        operations = self._backup_operations or []
+        self._backup_operations = []
+        return operations
+
+    def stop_backup_operations(self) -> None:
+        self._backup_operations = None
+
     def restore_data(self, data):
-        self.data = data
+        self.data = LazyData(None, copy_data(data))
+        self._changes.mark_reset()
+        self.search_index.clear()
 
     def cancel_backup(self) -> None:
         """Calls the cancel backup function."""
@@ -412,15 +564,15 @@ class DataHandler:
         try:
             if category in self.data.keys():
                 # If renaming a category
-                index = list(self.data.keys()).index(category)
-                items = list(self.data.items())
-                items.insert(index, (entry, self.data[category]))
-                self.data = dict(items)
-                self.data.pop(category)
+                self.data.rename(category, entry)
+                self._changes.rename_category(category, entry)
+                self.search_index.rename_category(category, entry)
                 return True
             else:
                 # Adding a new category
-                self.data.update({entry: {}})
+                self.data.update({entry: OrderedMap()})
+                self._changes.mark_categories()
+                self.search_index.add_category(entry)
                 return True
         except KeyError:
             return False
@@ -440,26 +592,24 @@ class DataHandler:
         try:
             if definition in self.data[category]:
                 # If renaming an existing definition
-                index = list(self.data[category].keys()).index(definition)
-                items = list(self.data[category].items())
-                items.insert(index, (entry, self.data[category][definition]))
-                self.data[category] = dict(items)
-                self.data[category].pop(definition)
+                self.data[category].rename(definition, entry)
+                self._changes.mark_entry(category, definition)
+                self._changes.mark_entry(category, entry)
+                self.search_index.remove(category, definition)
+                self._index_definition(category, entry)
                 return True
             else:
                 # Add new definition
-                items = list(self.data[category].items())
                 # Text, timestamp, font, tab_type
-                items.insert(0, (entry, ["", get_timestamp(), self.get_default_font(), tab_type]))
-                self.data[category] = dict(items)
+                self.data[category].insert_first(entry, ["", get_timestamp(), self.get_default_font(), tab_type])
+                self._changes.mark_entry(category, entry)
+                self._index_definition(category, entry)
                 return True
         except KeyError:
             return False
 
     def pin_definition(self, category, definition):
-        items = list(self.data[category].items())
-        items.insert(0, (definition, self.data[category][definition]))
-        self.data[category] = dict(items)
+        self.move_definition(category, definition, 0)
         if category in self.pinned.keys():
             self.pinned[category] = definition
         else:
@@ -483,6 +633,8 @@ class DataHandler:
                     font = values[2]
                     tab_type = values[3]
                     self.data[category].update({definition: [text, time_stamp, font, tab_type]})
+                    self._changes.mark_entry(category, definition)
+                    self._index_definition(category, definition)
                 else:
                     hits += 1
         if hits == len(definition_list):
@@ -491,24 +643,37 @@ class DataHandler:
             return True
 
     def add_text(self, category: str, definition: str, text: str) -> None:
-        self.data[category][definition][0] = text
+        if self.data[category][definition][0] != text:
+            self.data[category][definition][0] = text
+            self._changes.mark_entry(category, definition)
+            self._index_definition(category, definition)
 
     def set_tab_font(self, category, definition, font: tuple) -> None:
         self.data[category][definition][2] = font
+        self._changes.mark_entry(category, definition)
+
+    def move_definition(self, category: str, definition: str, index: int) -> None:
+        """Moves a definition to the index, only its position needs to be saved."""
+        if self.data[category].move(definition, index):
+            self._changes.mark_position(category, definition)
+        else:
+            self._changes.mark_order(category)
 
     def update_listbox(self, new_order: list, category: str) -> None:
-        """Creates a new dictionary with the dataset with the new order of elements.
-        Used for when the indexes in the listbox changes."""
-        new_list = list()
-        index = 0
-        for text in new_order:
-            new_list.insert(index, (text, self.data[category][text]))
-            index += 1
-        self.data[category] = dict(new_list)
+        """Puts the definitions in the new order of the listbox, only the definitions that moved are given new
+        positions. Used for when the indexes in the listbox changes."""
+        moved = self.data[category].reorder(new_order)
+        if moved is None:
+            self._changes.mark_order(category)
+        else:
+            for definition in moved:
+                self._changes.mark_position(category, definition)
 
     def delete_category(self, category: str) -> bool:
         try:
             del self.data[category]
+            self._changes.drop_category(category)
+            self.search_index.remove_category(category)
             return True
         except KeyError:
             return False
@@ -517,10 +682,131 @@ class DataHandler:
         try:
             for i in definition:
                 del self.data[category][i]
+                self._changes.mark_entry(category, i)
+                self.search_index.remove(category, i)
             return True
         except KeyError:
             return False
 
+    def _search_index_path(self) -> str:
+        # CWD/Data/Users/Username/search_index.json
+        return os.path.join(self._users_folder_path, self.current_user, self._search_index_filename)
+
+    def _load_search_index(self) -> None:
+        """Loads the search index saved at the last log out on the search worker, so searching is ready without
+        going through all the data. It's only used if it was saved with the data as it is now, it gets built
+        again on the worker otherwise."""
+        path = self._search_index_path()
+        if not os.path.isfile(path):
+            return
+        stamp = self.storage.stamp()
+        counts = {category: self.data.count(category) for category in self.data.keys()}
+        build_id = self.search_index.start_build()
+        self.search_worker.submit("build", self._read_search_index, path, stamp, counts, self.data.detached_copy(),
+                                  build_id)
+
+    def _read_search_index(self, path: str, stamp: str, counts: dict, data: LazyData, build_id: int) -> None:
+        """Runs on the search worker. Builds the index from the data instead if the saved index is out of date or
+        can't be read."""
+        try:
+            saved, header = utils.read_encoded(path, self._data_passes)
+            if header.get("stamp") == stamp and header.get("counts") == counts:
+                self.search_index.load(saved, build_id)
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self._build_search_index(data, build_id)
+
+    def _save_search_index(self) -> None:
+        """Saves the search index on the search worker with the stamp of the data, if all the changes to the data
+        have been saved."""
+        if not self._changes.is_empty():
+            return
+        header = {"stamp": self.storage.stamp(),
+                  "counts": {category: self.data.count(category) for category in self.data.keys()}}
+        self.search_worker.submit("save", self._write_search_index, self._search_index_path(), self._data_passes,
+                                  header)
+
+    def _write_search_index(self, path: str, data_passes: int, header: dict) -> None:
+        """Runs on the search worker, after the build if one is running."""
+        if not self.search_index.built or not self.search_index.changed:
+            return
+        utils.dump_encoded(path, self.search_index.export(), data_passes, header=header)
+        self.search_index.changed = False
+
+    def _search_texts(self, category: str) -> dict:
+        """Runs on the search worker, for the search index to scan definitions it was loaded without the text of.
+        A category that hasn't been loaded is decoded from the storage here and not kept in the data. A loaded one
+        is returned as it is, the index only looks up single definitions in it since the Tk thread can change it."""
+        definitions = dict.get(self.data, category)
+        if isinstance(definitions, Shard):
+            return self.data.loader(definitions.key)
+        return definitions if definitions is not None else {}
+
+    def _spelling_path(self) -> str:
+        # CWD/Data/Users/Username/spelling.json
+        return os.path.join(self._users_folder_path, self.current_user, self._spelling_filename)
+
+    def load_spelling(self, spell_checker) -> None:
+        """Loads the current user's added words and the suggestions saved at the last log out into the spell
+        checker, on its worker."""
+        self.spell_checker = spell_checker
+        spell_checker.worker.submit("load", self._read_spelling, spell_checker, self._spelling_path())
+
+    def _read_spelling(self, spell_checker, path: str) -> None:
+        """Runs on the spell worker. A user without saved spelling starts out empty."""
+        try:
+            saved = utils.read_encoded(path, self._data_passes)[0]
+        except (OSError, ValueError):
+            saved = {}
+        try:
+            spell_checker.load(saved)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            spell_checker.load({})
+
+    def _save_spelling(self) -> None:
+        if self.spell_checker is None or self.current_user is None:
+            return
+        self.spell_checker.worker.flush()
+        if self.spell_checker.changed:
+            utils.dump_encoded(self._spelling_path(), self.spell_checker.export(), self._data_passes)
+            self.spell_checker.changed = False
+        self.spell_checker = None
+
+    def prepare_search(self) -> None:
+        """Starts building the search index on the search worker, if it hasn't been built. Searches submitted to
+        the search worker after this run once it's built."""
+        if self.search_index.built or self.search_index.building:
+            return
+        build_id = self.search_index.start_build()
+        # The worker gets its own copy of the data, the categories that haven't been loaded are decoded there
+        self.search_worker.submit("build", self._build_search_index, self.data.detached_copy(), build_id)
+
+    def _build_search_index(self, data: LazyData, build_id: int) -> None:
+        """Runs on the search worker."""
+        categories = ((category, [(definition, values[0], values[1], values[3] if len(values) > 3 else TEXT)
+                                  for definition, values in definitions.items()])
+                      for category, definitions in data.items())
+        self.search_index.build(categories, build_id)
+
+    def search(self, query: str) -> list[tuple[str, str]]:
+        """Searches the names and text of the definitions in all the categories. Returns (category, definition)
+        of the definitions found, best matches first. Runs on the search worker, call prepare_search first.
+        Searches with fields, AND/OR/NOT or regexes are parsed by search_query, raises ValueError if they can't
+        be."""
+        node = parse(query)
+        if is_simple(node):
+            return self.search_index.search(query)
+        return self.search_index.query(node)
+
+    def _index_definition(self, category: str, definition: str) -> None:
+        values = self.data[category][definition]
+        self.search_index.update(category, definition, values[0], values[1], self.get_tab_type(category, definition))
+
+    def search_categories(self, query: str) -> list[str]:
+        """Returns the categories with the query in their name, or a name close to it."""
+        return self.search_index.search_categories(query)
+
     def get_categories_by_list(self) -> list:
         try:
             if self.data != {}:
@@ -0,0 +1,367 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import bisect
+from collections.abc import ItemsView, KeysView, ValuesView
+from itertools import chain
+from operator import itemgetter
+
+
+class _PositionList:
+    """The (position, order, key) entries of an OrderedMap, sorted. They're split into buckets of a few hundred, so
+    adding or removing one only shifts the entries of its bucket, and the bucket sizes are kept in a Fenwick tree
+    to find the index of an entry, or the entry at an index, in O(log n). order is a number given to each entry as
+    it's added, it keeps keys that share a position in the order they were added and means keys are never compared."""
+    _load = 256
+    __slots__ = "_buckets", "_maxes", "_tree", "_length"
+
+    def __init__(self, entries=()):
+        entries = list(entries)
+        self._buckets = [entries[index:index + self._load] for index in range(0, len(entries), self._load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._length = len(entries)
+        self._build_tree()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        return chain.from_iterable(self._buckets)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(bucket) for bucket in reversed(self._buckets))
+
+    def _build_tree(self) -> None:
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _grow(self, bucket: int, amount: int) -> None:
+        bucket += 1
+        while bucket < len(self._tree):
+            self._tree[bucket] += amount
+            bucket += bucket & -bucket
+
+    def _before(self, bucket: int) -> int:
+        """Number of entries in the buckets before the bucket."""
+        total = 0
+        while bucket:
+            total += self._tree[bucket]
+            bucket -= bucket & -bucket
+        return total
+
+    def _locate(self, entry) -> tuple[int, int]:
+        bucket = bisect.bisect_left(self._maxes, entry)
+        return bucket, bisect.bisect_left(self._buckets[bucket], entry)
+
+    def add(self, entry) -> None:
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            self._length = 1
+            self._build_tree()
+            return
+        bucket = min(bisect.bisect_left(self._maxes, entry), len(self._buckets) - 1)
+        entries = self._buckets[bucket]
+        bisect.insort(entries, entry)
+        self._maxes[bucket] = entries[-1]
+        self._length += 1
+        if len(entries) > self._load * 2:
+            self._buckets[bucket:bucket + 1] = [entries[:self._load], entries[self._load:]]
+            self._maxes[bucket:bucket + 1] = [entries[self._load - 1], entries[-1]]
+            self._build_tree()
+        else:
+            self._grow(bucket, 1)
+
+    def remove(self, entry) -> None:
+        bucket, index = self._locate(entry)
+        entries = self._buckets[bucket]
+        del entries[index]
+        self._length -= 1
+        if entries:
+            self._maxes[bucket] = entries[-1]
+            self._grow(bucket, -1)
+        else:
+            del self._buckets[bucket]
+            del self._maxes[bucket]
+            self._build_tree()
+
+    def replace(self, entry, new_entry) -> None:
+        """Swaps an entry for one that sorts in the same place."""
+        bucket, index = self._locate(entry)
+        self._buckets[bucket][index] = new_entry
+        if index == len(self._buckets[bucket]) - 1:
+            self._maxes[bucket] = new_entry
+
+    def index(self, entry) -> int:
+        bucket, index = self._locate(entry)
+        return self._before(bucket) + index
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("index out of range")
+        # Walks down the tree to the bucket the index is in
+        bucket = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            child = bucket + step
+            if child < len(self._tree) and self._tree[child] <= index:
+                bucket = child
+                index -= self._tree[child]
+            step >>= 1
+        return self._buckets[bucket][index]
+
+
+_key = itemgetter(2)
+
+
+class OrderedMap(dict):
+    """A dict that keeps its keys ordered by a position given to each key, instead of the order they were added.
+    Positions are floats, so a key can be put in front of the others, moved between two keys or renamed without
+    touching the rest. Only the moved key's new position has to be saved. The keys are kept sorted in a
+    _PositionList, so adding, removing and moving a key is O(log n) plus shifting one bucket, not the whole map."""
+    __slots__ = "_entries", "_entry_of", "_added"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        # (position, order, key) sorted, and key: its entry
+        self._entries = _PositionList()
+        self._entry_of = {}
+        # The order given to the next entry
+        self._added = 0
+        self.update(*args, **kwargs)
+
+    @classmethod
+    def from_positions(cls, items, positions):
+        """Creates the map from (key, value) pairs and the position of each."""
+        ordered = cls()
+        for (key, value), position in zip(items, positions):
+            ordered.place(key, value, position)
+        return ordered
+
+    def _insert(self, key, position: float) -> None:
+        entry = (position, self._added, key)
+        self._added += 1
+        self._entries.add(entry)
+        self._entry_of[key] = entry
+
+    def _index(self, key) -> int:
+        return self._entries.index(self._entry_of[key])
+
+    def _remove(self, key) -> None:
+        self._entries.remove(self._entry_of.pop(key))
+
+    def _set_entries(self, keys, positions) -> None:
+        """Replaces the order with the keys at the positions, which have to be sorted."""
+        entries = [(position, order, key) for order, (key, position) in enumerate(zip(keys, positions))]
+        self._entries = _PositionList(entries)
+        self._entry_of = {entry[2]: entry for entry in entries}
+        self._added = len(entries)
+
+    def _renumber(self, keys: list) -> None:
+        self._set_entries(keys, [float(index) for index in range(len(keys))])
+
+    def __setitem__(self, key, value) -> None:
+        if key not in self:
+            self._insert(key, self._entries[-1][0] + 1 if self._entries else 0.0)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._remove(key)
+
+    def __iter__(self):
+        return map(_key, self._entries)
+
+    def __reversed__(self):
+        return map(_key, reversed(self._entries))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def keys(self):
+        return KeysView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        self._remove(key)
+        return value
+
+    def popitem(self):
+        if not self._entries:
+            raise KeyError("popitem(): map is empty")
+        key = self._entries[-1][2]
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs) -> None:
+        for other in args + (kwargs,):
+            if hasattr(other, "keys"):
+                for key in other.keys():
+                    self[key] = other[key]
+            else:
+                for key, value in other:
+                    self[key] = value
+
+    def clear(self) -> None:
+        super().clear()
+        self._entries = _PositionList()
+        self._entry_of = {}
+        self._added = 0
+
+    def copy(self, convert=None):
+        """Returns a copy keeping the positions, convert is called on each value if given."""
+        return self._copy_to(OrderedMap(), convert)
+
+    def _copy_to(self, other, convert=None):
+        for position, _, key in self._entries:
+            value = dict.__getitem__(self, key)
+            other.place(key, convert(value) if convert else value, position)
+        return other
+
+    def position(self, key) -> float:
+        return self._entry_of[key][0]
+
+    def place(self, key, value, position: float) -> None:
+        """Sets the value of a key at the given position."""
+        if key in self:
+            self._remove(key)
+        self._insert(key, position)
+        dict.__setitem__(self, key, value)
+
+    def set_position(self, key, position: float) -> None:
+        self._remove(key)
+        self._insert(key, position)
+
+    def insert_first(self, key, value) -> None:
+        """Puts the key in front of all the others."""
+        self.place(key, value, self._entries[0][0] - 1 if self._entries else 0.0)
+
+    def move(self, key, index: int) -> bool:
+        """Moves the key to the index. Returns False if there wasn't room between its new neighbours, and all the
+        keys had to be given new positions."""
+        self._remove(key)
+        entries = self._entries
+        index = min(index, len(entries))
+        if not entries:
+            position = 0.0
+        elif index == 0:
+            position = entries[0][0] - 1
+        elif index == len(entries):
+            position = entries[-1][0] + 1
+        else:
+            low, high = entries[index - 1][0], entries[index][0]
+            position = (low + high) / 2
+            if not low < position < high:
+                keys = list(self)
+                keys.insert(index, key)
+                self._renumber(keys)
+                return False
+        self._insert(key, position)
+        return True
+
+    def rename(self, key, new_key) -> None:
+        """Renames a key, keeping its position."""
+        entry = self._entry_of.pop(key)
+        new_entry = (entry[0], entry[1], new_key)
+        self._entries.replace(entry, new_entry)
+        self._entry_of[new_key] = new_entry
+        dict.__setitem__(self, new_key, dict.pop(self, key))
+
+    def set_order(self, keys: list, positions: list = None) -> None:
+        """Puts the keys in the given order, with the given positions or numbered from 0. Keys that aren't in the
+        list are put after."""
+        if positions is None:
+            positions = range(len(keys))
+        ordered = {}
+        for key, position in zip(keys, positions):
+            if key in self and key not in ordered:
+                ordered[key] = float(position)
+        last = max(ordered.values(), default=-1.0)
+        for key in self:
+            if key not in ordered:
+                last += 1
+                ordered[key] = last
+        self._set_entries(ordered, ordered.values())
+
+    def reorder(self, keys: list) -> list | None:
+        """Puts the keys in the given order by only moving the keys that are out of place. Returns the keys that
+        were given a new position, or None if all the keys had to be renumbered."""
+        keys = [key for key in dict.fromkeys(keys) if key in self]
+        if len(keys) != len(self._entries):
+            self.set_order(keys)
+            return None
+        # The longest run of keys that are already in order stay where they are
+        indexes = {key: index for index, key in enumerate(self)}
+        stay = self._longest_increasing([indexes[key] for key in keys])
+        moved = []
+        new_positions = []
+        run = []
+        low = None
+        for index, key in enumerate(keys):
+            if index in stay:
+                high = self._entry_of[key][0]
+                new_positions.extend(self._spread(low, high, len(run)))
+                new_positions.append(high)
+                low = high
+                moved.extend(run)
+                run = []
+            else:
+                run.append(key)
+        new_positions.extend(self._spread(low, None, len(run)))
+        moved.extend(run)
+        if any(a >= b for a, b in zip(new_positions, new_positions[1:])):
+            self.set_order(keys)
+            return None
+        self._set_entries(keys, new_positions)
+        return moved
+
+    @staticmethod
+    def _spread(low: float | None, high: float | None, amount: int) -> list:
+        """Returns evenly spaced positions between low and high."""
+        if low is None and high is None:
+            return [float(index) for index in range(amount)]
+        if low is None:
+            low = high - amount - 1
+        elif high is None:
+            high = low + amount + 1
+        step = (high - low) / (amount + 1)
+        return [low + step * (index + 1) for index in range(amount)]
+
+    @staticmethod
+    def _longest_increasing(values: list) -> set:
+        """Returns the indexes of the longest increasing subsequence of values."""
+        tails = []
+        tail_indexes = []
+        previous = [-1] * len(values)
+        for index, value in enumerate(values):
+            position = bisect.bisect_left(tails, value)
+            if position == len(tails):
+                tails.append(value)
+                tail_indexes.append(index)
+            else:
+                tails[position] = value
+                tail_indexes[position] = index
+            previous[index] = tail_indexes[position - 1] if position else -1
+        result = set()
+        index = tail_indexes[-1] if tail_indexes else -1
+        while index != -1:
+            result.add(index)
+            index = previous[index]
+        return result
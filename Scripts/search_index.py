@@ -0,0 +1,576 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import bisect
+import datetime
+import math
+import re
+import threading
+from collections import Counter
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercase words."""
+    return _WORD.findall(text.casefold())
+
+
+def match_offsets(text: str, query: str) -> list[tuple[int, int]]:
+    """Returns the (start, end) of the words in the text that start with a word of the query."""
+    terms = tuple(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    return [match.span() for match in _WORD.finditer(text) if match.group().casefold().startswith(terms)]
+
+
+def _day(timestamp) -> int | None:
+    """Returns the day number of a 'YYYY-MM-DD' timestamp, None if it isn't one."""
+    try:
+        return datetime.date.fromisoformat(timestamp).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def trigrams(text: str) -> set[str]:
+    """Returns the sets of three letters in the text, padded so the start and end of the text count more."""
+    text = f"  {text} "
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Indexes short texts, like definition names, by every three letters in them. Finding the texts that contain
+    a piece of text only has to check the texts that have all its three letters, and texts with a typo still share
+    most of them, which ranks how close they are."""
+    _similarity = 0.3
+    __slots__ = "_grams", "_texts", "_sizes"
+
+    def __init__(self):
+        # three letters: set of keys
+        self._grams = {}
+        # key: lowercase text
+        self._texts = {}
+        # key: amount of three letters in the text
+        self._sizes = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, key, text: str) -> None:
+        if key in self._texts:
+            self.remove(key)
+        text = text.casefold()
+        grams = trigrams(text)
+        self._texts[key] = text
+        self._sizes[key] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(key)
+
+    def remove(self, key) -> None:
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        del self._sizes[key]
+        for gram in trigrams(text):
+            keys = self._grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._grams[gram]
+
+    def substring(self, query: str) -> list:
+        """Returns the keys of the texts containing the query, texts starting with it first, then the shortest."""
+        query = query.casefold()
+        if not query:
+            return []
+        if len(query) < 3:
+            # Too short to have three letters, any three letters containing it will do
+            found = set()
+            for gram, keys in self._grams.items():
+                if query in gram:
+                    found.update(keys)
+        else:
+            postings = sorted((self._grams.get(query[index:index + 3], set())
+                               for index in range(len(query) - 2)), key=len)
+            found = set(postings[0])
+            for keys in postings[1:]:
+                found &= keys
+                if not found:
+                    return []
+        matches = [key for key in found if query in self._texts[key]]
+        matches.sort(key=lambda key: (not self._texts[key].startswith(query), len(self._texts[key])))
+        return matches
+
+    def similar(self, query: str, limit: int = 50) -> list:
+        """Returns (key, similarity) of the texts closest to the query, even with typos, closest first."""
+        grams = trigrams(query.casefold())
+        shared = {}
+        for gram in grams:
+            for key in self._grams.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        scored = []
+        for key, count in shared.items():
+            score = count / (len(grams) + self._sizes[key] - count)
+            if score >= self._similarity:
+                scored.append((key, score))
+        scored.sort(key=lambda item: -item[1])
+        return scored[:limit]
+
+
+class SearchIndex:
+    """An inverted index of the words in every definition's name and text, across all the categories.
+    Each word points to the definitions it's in and how many times, so a search only looks at the definitions
+    that have the words instead of going through all the text. It's built the first time a search is made and
+    kept up to date as definitions are added, changed and deleted.
+    Searches written with search_query, like title:, cat:, type:, date:, AND/OR/NOT and /regex/, are answered
+    from the index where they can be, and the text is only scanned for regexes and "phrases", and only for the
+    definitions the rest of the search left. An index loaded from a file doesn't have the text, it's looked up
+    with text_source when a scan first needs it.
+    Results are ranked with BM25 over the words, with boosts for the query being in the name or at the start of
+    it, and for definitions made recently. Names close to the query are found too, ranked below.
+    Searches run on the search worker, so everything is done under a lock. While the index is being built on the
+    worker, the changes made to the data are kept and applied once it's done."""
+    # BM25 settings
+    _k1 = 1.2
+    _b = 0.75
+    # Added to the score when the query is in the name, and when the name starts with it
+    _title_boost = 3.0
+    _prefix_boost = 2.0
+    # Score of a name that's only close to the query, times its similarity
+    _fuzzy_weight = 1.0
+    # How much newer definitions are favoured, halving every _recency_days
+    _recency_boost = 0.25
+    _recency_days = 30
+    _state = "_postings", "_documents", "_ids", "_categories", "_vocabulary", "_next_id", "titles", \
+             "category_names", "_total_length", "_types", "_days", "_day_list"
+    __slots__ = ("built", "changed", "text_source", "_lock", "_pending", "_build_id") + _state
+
+    def __init__(self, text_source=None):
+        self.built = False
+        # Whether the index has changed since it was built from the data or loaded from a file
+        self.changed = False
+        self._lock = threading.RLock()
+        # The changes made while building, None when not building
+        self._pending = None
+        self._build_id = 0
+        # text_source(category) returns the category's definition: values, to scan definitions loaded without text
+        self.text_source = text_source
+        self._reset()
+
+    def _reset(self) -> None:
+        # word: {document id: times the word is in it}
+        self._postings = {}
+        # document id: [category, definition, Counter of its words, amount of words, day it was made, text,
+        # tab type]. The text is None for documents loaded from a file until a scan needs it
+        self._documents = {}
+        # (category, definition): document id
+        self._ids = {}
+        # category: set of document ids
+        self._categories = {}
+        # Every word in the index sorted, for searching words that start with what was typed
+        self._vocabulary = []
+        self._next_id = 0
+        # Amount of words in all the documents, for the average length
+        self._total_length = 0
+        # tab type: set of document ids
+        self._types = {}
+        # day: set of document ids, and the days sorted
+        self._days = {}
+        self._day_list = []
+        # The definition names by document id, and the category names, by three letters
+        self.titles = TrigramIndex()
+        self.category_names = TrigramIndex()
+
+    @property
+    def building(self) -> bool:
+        return self._pending is not None
+
+    @property
+    def build_id(self) -> int:
+        return self._build_id
+
+    def clear(self) -> None:
+        """Empties the index, it gets built again on the next search. A build that's running gets thrown away."""
+        with self._lock:
+            self.built = False
+            self.changed = False
+            self._pending = None
+            self._build_id += 1
+            self._reset()
+
+    def start_build(self) -> int:
+        """Starts keeping the changes made until build is done. Returns the id to pass to build."""
+        with self._lock:
+            self._build_id += 1
+            self._pending = []
+            return self._build_id
+
+    def build(self, categories, build_id: int = None) -> None:
+        """Indexes all the definitions, categories being an iterable of
+        (category, [(definition, text, timestamp, tab type), ...]). Can run on the search worker, the index is
+        filled separately and swapped in at the end."""
+        fresh = SearchIndex()
+        for category, definitions in categories:
+            fresh._add_category(category)
+            for definition, text, timestamp, tab_type in definitions:
+                fresh._add(category, definition, text, _day(timestamp), tab_type, sort=False)
+        self._adopt(fresh, build_id, True)
+
+    def load(self, saved: dict, build_id: int = None) -> None:
+        """Fills the index from what export returned, without going through the text again."""
+        fresh = SearchIndex()
+        for category in saved["categories"]:
+            fresh._add_category(category)
+        fresh._next_id = saved["next_id"]
+        for document, category, definition, length, day, tab_type in saved["documents"]:
+            fresh._documents[document] = [category, definition, Counter(), length, day, None, tab_type]
+            fresh._ids[(category, definition)] = document
+            fresh._total_length += length
+            fresh._add_category(category)
+            fresh._categories[category].add(document)
+            fresh._types.setdefault(tab_type, set()).add(document)
+            if day is not None:
+                fresh._days.setdefault(day, set()).add(document)
+            fresh.titles.add(document, definition)
+        for word, (documents, counts) in saved["postings"].items():
+            fresh._postings[word] = dict(zip(documents, counts))
+            # Each document's words are put back together from the postings, to take it out of them later
+            for document, count in zip(documents, counts):
+                fresh._documents[document][2][word] = count
+        self._adopt(fresh, build_id, False)
+
+    def export(self) -> dict:
+        """Returns the index as something json can save, for load. Only the words are saved, not the text."""
+        with self._lock:
+            return {"categories": list(self._categories),
+                    "next_id": self._next_id,
+                    "documents": [[document, category, definition, length, day, tab_type]
+                                  for document, (category, definition, _, length, day, _, tab_type)
+                                  in self._documents.items()],
+                    "postings": {word: [list(postings), list(postings.values())]
+                                 for word, postings in self._postings.items()}}
+
+    def _adopt(self, fresh, build_id: int | None, changed: bool) -> None:
+        """Swaps in the state of an index filled off to the side, then makes the changes kept while filling it."""
+        fresh._vocabulary = sorted(fresh._postings)
+        fresh._day_list = sorted(fresh._days)
+        with self._lock:
+            if build_id is not None and build_id != self._build_id:
+                # Cleared or started over while building
+                return
+            for name in self._state:
+                setattr(self, name, getattr(fresh, name))
+            self.built = True
+            self.changed = changed
+            pending = self._pending or []
+            self._pending = None
+            for name, args in pending:
+                getattr(self, name)(*args)
+                self.changed = True
+
+    def _record(self, name: str, *args) -> bool:
+        """Keeps the change if building. Returns True if the change should be made to the index now."""
+        if self._pending is not None:
+            self._pending.append((name, args))
+        if self.built:
+            self.changed = True
+        return self.built
+
+    def _add(self, category: str, definition: str, text: str, day: int | None, tab_type: str, sort: bool = True,
+             words: Counter = None) -> None:
+        if words is None:
+            words = Counter(tokenize(definition))
+            words.update(tokenize(text))
+        length = sum(words.values())
+        document = self._next_id
+        self._next_id += 1
+        # The text is the same string as in the data, it isn't copied
+        self._documents[document] = [category, definition, words, length, day, text, tab_type]
+        self._total_length += length
+        self._types.setdefault(tab_type, set()).add(document)
+        if day is not None:
+            if day not in self._days:
+                self._days[day] = set()
+                if sort:
+                    bisect.insort(self._day_list, day)
+            self._days[day].add(document)
+        self._ids[(category, definition)] = document
+        self._add_category(category)
+        self._categories[category].add(document)
+        self.titles.add(document, definition)
+        for word, count in words.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                if sort:
+                    bisect.insort(self._vocabulary, word)
+            postings[document] = count
+
+    def _remove(self, document: int) -> None:
+        category, definition, words, length, day, text, tab_type = self._documents.pop(document)
+        self._total_length -= length
+        self._types[tab_type].discard(document)
+        if day is not None:
+            self._days[day].discard(document)
+            if not self._days[day]:
+                del self._days[day]
+                del self._day_list[bisect.bisect_left(self._day_list, day)]
+        del self._ids[(category, definition)]
+        self._categories[category].discard(document)
+        self.titles.remove(document)
+        for word in words:
+            postings = self._postings[word]
+            del postings[document]
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+
+    def _add_category(self, category: str) -> None:
+        if category not in self._categories:
+            self._categories[category] = set()
+            self.category_names.add(category, category)
+
+    def _update(self, category: str, definition: str, text: str, timestamp: str, tab_type: str) -> None:
+        self._remove_definition(category, definition)
+        self._add(category, definition, text, _day(timestamp), tab_type)
+
+    def _remove_definition(self, category: str, definition: str) -> None:
+        document = self._ids.get((category, definition))
+        if document is not None:
+            self._remove(document)
+
+    def _remove_category(self, category: str) -> None:
+        for document in list(self._categories.get(category, ())):
+            self._remove(document)
+        self._categories.pop(category, None)
+        self.category_names.remove(category)
+
+    def _rename_category(self, category: str, new_category: str) -> None:
+        documents = self._categories.pop(category, set())
+        self._categories[new_category] = documents
+        self.category_names.remove(category)
+        self.category_names.add(new_category, new_category)
+        for document in documents:
+            entry = self._documents[document]
+            del self._ids[(category, entry[1])]
+            entry[0] = new_category
+            self._ids[(new_category, entry[1])] = document
+
+    def add_category(self, category: str) -> None:
+        with self._lock:
+            if self._record("_add_category", category):
+                self._add_category(category)
+
+    def update(self, category: str, definition: str, text: str, timestamp: str, tab_type: str) -> None:
+        """Indexes a definition, replacing what was indexed for it before."""
+        with self._lock:
+            if self._record("_update", category, definition, text, timestamp, tab_type):
+                self._update(category, definition, text, timestamp, tab_type)
+
+    def remove(self, category: str, definition: str) -> None:
+        with self._lock:
+            if self._record("_remove_definition", category, definition):
+                self._remove_definition(category, definition)
+
+    def remove_category(self, category: str) -> None:
+        with self._lock:
+            if self._record("_remove_category", category):
+                self._remove_category(category)
+
+    def rename_category(self, category: str, new_category: str) -> None:
+        """Moves the category's definitions over to the new name, the words in them stay the same."""
+        with self._lock:
+            if self._record("_rename_category", category, new_category):
+                self._rename_category(category, new_category)
+
+    def _bm25(self, term: str) -> dict:
+        """Returns document id: BM25 score, for the words starting with term."""
+        found = {}
+        amount = len(self._documents)
+        average = self._total_length / amount if amount else 1
+        index = bisect.bisect_left(self._vocabulary, term)
+        while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+            postings = self._postings[self._vocabulary[index]]
+            idf = math.log(1 + (amount - len(postings) + 0.5) / (len(postings) + 0.5))
+            for document, count in postings.items():
+                length = self._documents[document][3]
+                score = idf * count * (self._k1 + 1) / (count + self._k1 * (1 - self._b + self._b * length / average))
+                found[document] = found.get(document, 0) + score
+            index += 1
+        return found
+
+    def search(self, query: str) -> list[tuple[str, str]]:
+        """Returns the (category, definition) of the definitions found, best first. Definitions are found by
+        having all the words in the query, which can be the start of a longer word, by having the query in their
+        name, or by having a name close to it."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            # Starts with the rarest word so there's less to check against
+            matches = sorted((self._bm25(term) for term in terms), key=len)
+            scores = dict(matches[0])
+            for found in matches[1:]:
+                scores = {document: score + found[document] for document, score in scores.items()
+                          if document in found}
+            lowered = query.strip().casefold()
+            for document in self.titles.substring(lowered):
+                title = self._documents[document][1].casefold()
+                boost = self._title_boost + (self._prefix_boost if title.startswith(lowered) else 0)
+                scores[document] = scores.get(document, 0) + boost
+            for document, similarity in self.titles.similar(lowered):
+                if document not in scores:
+                    scores[document] = similarity * self._fuzzy_weight
+            return self._ranked(scores)
+
+    def _ranked(self, scores: dict) -> list[tuple[str, str]]:
+        """Boosts the recent definitions and returns the (category, definition) of them all, best first."""
+        today = datetime.date.today().toordinal()
+        for document, score in scores.items():
+            day = self._documents[document][4]
+            if day is not None:
+                age = max(today - day, 0)
+                scores[document] = score * (1 + self._recency_boost * 0.5 ** (age / self._recency_days))
+        ranked = sorted(scores, key=lambda document: (-scores[document], document))
+        return [self._key(document) for document in ranked]
+
+    def query(self, node) -> list[tuple[str, str]]:
+        """Returns the (category, definition) of the definitions matching a search parsed by search_query, best
+        first. They're ranked by the words searched for in the text and the name."""
+        with self._lock:
+            documents = self._evaluate(node, None)
+            scores = dict.fromkeys(documents, 0.0)
+            for field, term in self._positive_terms(node):
+                if field in (None, "body"):
+                    for document, score in self._bm25(term).items():
+                        if document in scores:
+                            scores[document] += score
+                if field in (None, "title"):
+                    lowered = term.casefold()
+                    for document in self.titles.substring(lowered):
+                        if document in scores:
+                            title = self._documents[document][1].casefold()
+                            boost = self._title_boost + (self._prefix_boost if title.startswith(lowered) else 0)
+                            scores[document] += boost
+            return self._ranked(scores)
+
+    @classmethod
+    def _positive_terms(cls, node) -> list[tuple[str | None, str]]:
+        """Returns (field, word) of the words searched for that aren't under a NOT."""
+        if node[0] in ("and", "or"):
+            return [term for child in node[1] for term in cls._positive_terms(child)]
+        if node[0] == "word":
+            return [(node[1], word) for word in tokenize(node[2])]
+        return []
+
+    def _words(self, text: str, field: str | None) -> set:
+        """Returns the documents with all the words in the text, as the start of a word. With the body field,
+        only the words in the text count, not the ones in the name."""
+        found = None
+        for term in tokenize(text):
+            documents = set()
+            index = bisect.bisect_left(self._vocabulary, term)
+            while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+                word = self._vocabulary[index]
+                if field == "body":
+                    for document, count in self._postings[word].items():
+                        if count > tokenize(self._documents[document][1]).count(word):
+                            documents.add(document)
+                else:
+                    documents.update(self._postings[word])
+                index += 1
+            found = documents if found is None else found & documents
+            if not found:
+                return set()
+        return found if found is not None else set(self._documents)
+
+    def _evaluate(self, node, candidates: set | None) -> set:
+        """Returns the documents matching the node. Index lookups are used where they can be. Regexes and phrases
+        have to look at the text, so only the candidates are scanned, or all the documents if there's none."""
+        kind = node[0]
+        if kind == "and":
+            # The lookups go first so the scans have less to go through
+            children = sorted(node[1], key=lambda child: child[0] in ("regex", "phrase", "not", "or"))
+            for child in children:
+                candidates = self._evaluate(child, candidates)
+                if not candidates:
+                    return set()
+            return candidates
+        if kind == "or":
+            found = set()
+            for child in node[1]:
+                found |= self._evaluate(child, candidates)
+            return found
+        if kind == "not":
+            everything = candidates if candidates is not None else set(self._documents)
+            return everything - self._evaluate(node[1], everything)
+        if kind in ("regex", "phrase"):
+            return self._scan(node, candidates)
+        if kind == "word":
+            if not tokenize(node[2]):
+                # No letters to look up, like "c++"
+                return self._scan(("phrase", node[1], node[2]), candidates)
+            found = set()
+            if node[1] in (None, "body"):
+                found = self._words(node[2], node[1])
+            if node[1] in (None, "title"):
+                found |= set(self.titles.substring(node[2]))
+        elif kind == "cat":
+            found = set()
+            for category in self.category_names.substring(node[1]):
+                found |= self._categories.get(category, set())
+        elif kind == "type":
+            found = set(self._types.get(node[1], ()))
+        elif kind == "date":
+            found = set()
+            start = bisect.bisect_left(self._day_list, node[1])
+            end = bisect.bisect_right(self._day_list, node[2])
+            for day in self._day_list[start:end]:
+                found |= self._days[day]
+        else:
+            raise ValueError(f"Unknown search node {kind}.")
+        return found if candidates is None else found & candidates
+
+    def _scan(self, node, candidates: set | None) -> set:
+        """Goes through the name and text of the candidates for a regex or a phrase."""
+        kind, field, value = node
+        if kind == "phrase":
+            # Only the definitions with all the words of the phrase can have it
+            candidates = self._words(value, None) if candidates is None else candidates & self._words(value, None)
+            value = value.casefold()
+        documents = candidates if candidates is not None else self._documents.keys()
+        found = set()
+        sources = {}
+        for document in documents:
+            entry = self._documents[document]
+            if field == "title":
+                texts = [entry[1]]
+            else:
+                text = self._text(entry, sources)
+                texts = [text] if field == "body" else [entry[1], text]
+            for text in texts:
+                if kind == "regex" and value.search(text) or kind == "phrase" and value in text.casefold():
+                    found.add(document)
+                    break
+        return found
+
+    def _text(self, entry: list, sources: dict) -> str:
+        """Returns the text of a document, looking it up with text_source the first time for documents loaded from
+        a file. sources keeps what text_source returned for each category during a scan."""
+        if entry[5] is None:
+            category = entry[0]
+            if category not in sources:
+                sources[category] = self.text_source(category) if self.text_source is not None else {}
+            values = sources[category].get(entry[1])
+            if not values:
+                return ""
+            entry[5] = values[0]
+        return entry[5]
+
+    def _key(self, document: int) -> tuple[str, str]:
+        return self._documents[document][0], self._documents[document][1]
+
+    def search_categories(self, query: str) -> list[str]:
+        """Returns the categories with the query in their name, then the ones with a name close to it."""
+        with self._lock:
+            found = self.category_names.substring(query)
+            found.extend(category for category, _ in self.category_names.similar(query) if category not in found)
+            return found
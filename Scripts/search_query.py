@@ -0,0 +1,172 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import calendar
+import datetime
+import re
+
+# Parts of a query: brackets, an optional - (not) and field:, then a /regex/, a "phrase" or a word
+_PART = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<not>-)?(?:(?P<field>[A-Za-z]+):)?'
+                   r'(?:/(?P<regex>(?:\\.|[^/\\])*)/|"(?P<phrase>[^"]*)"|(?P<word>[^\s()"]+)))')
+FIELDS = {"title": "title", "name": "title", "body": "body", "text": "body", "cat": "cat", "category": "cat",
+          "type": "type", "date": "date"}
+TYPES = {"text": "text", "list": "list"}
+
+
+def parse(text: str):
+    """Parses a search into a tree of tuples:
+        ("and", [nodes]), ("or", [nodes]), ("not", node),
+        ("word", field, word), ("phrase", field, text), ("regex", field, compiled pattern),
+        ("cat", name), ("type", tab type), ("date", first day, last day).
+    Words next to each other are joined with AND, OR and NOT (or a leading -) can be used with brackets.
+    Fields are title:, body:, cat:, type:text/list and date:, dates being 2022, 2022-05, 2022-05-03, a range
+    2022-01..2022-03 with either side left out, or >2022-05 and <=2022-05-03. Raises ValueError if the search
+    can't be parsed."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _PART.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Can't read the search from '{text[position:].strip()}'.")
+        position = match.end()
+        tokens.append(match)
+    parser = _Parser(tokens)
+    node = parser.parse_or()
+    if parser.index != len(tokens):
+        raise ValueError("Unmatched ')' in the search.")
+    return node
+
+
+def is_simple(node) -> bool:
+    """Returns True if the search is only words, which get the usual ranked search."""
+    if node[0] == "and":
+        return all(is_simple(child) for child in node[1])
+    return node[0] == "word" and node[1] is None
+
+
+def highlight_text(node) -> str:
+    """Returns the words searched for in the text of a definition, to be highlighted."""
+    if node[0] in ("and", "or"):
+        return " ".join(filter(None, (highlight_text(child) for child in node[1])))
+    if node[0] in ("word", "phrase") and node[1] in (None, "body"):
+        return node[2]
+    return ""
+
+
+class _Parser:
+    __slots__ = "tokens", "index"
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.index = 0
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    @staticmethod
+    def _keyword(token) -> str | None:
+        if token is not None and token["word"] in ("OR", "AND", "NOT") and not token["field"] \
+                and not token["not"]:
+            return token["word"]
+        return None
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self._keyword(self._peek()) == "OR":
+            self.index += 1
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = []
+        while True:
+            token = self._peek()
+            if token is None or token["close"] or self._keyword(token) == "OR":
+                break
+            if self._keyword(token) == "AND":
+                self.index += 1
+                continue
+            nodes.append(self.parse_not())
+        if not nodes:
+            raise ValueError("Nothing to search for.")
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self):
+        token = self._peek()
+        if self._keyword(token) == "NOT":
+            self.index += 1
+            return "not", self.parse_not()
+        return self.parse_part()
+
+    def parse_part(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        if token["open"]:
+            node = self.parse_or()
+            if self._peek() is None or not self._peek()["close"]:
+                raise ValueError("Missing ')' in the search.")
+            self.index += 1
+            return node
+        if token["close"]:
+            raise ValueError("Unmatched ')' in the search.")
+        node = self._term(token)
+        return ("not", node) if token["not"] else node
+
+    @staticmethod
+    def _term(token):
+        field = token["field"]
+        name = FIELDS.get(field.lower()) if field else None
+        if field and name is None:
+            # Not a field, so it's searched like any other word
+            value = next(value for value in (token["word"], token["phrase"], token["regex"]) if value is not None)
+            return "phrase", None, f"{field}:{value}"
+        if token["regex"] is not None:
+            try:
+                return "regex", name, re.compile(token["regex"], re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"Bad regex /{token['regex']}/: {e}.")
+        value = token["word"] if token["word"] is not None else token["phrase"]
+        if name == "cat":
+            return "cat", value
+        if name == "type":
+            if value.lower() not in TYPES:
+                raise ValueError("type: has to be text or list.")
+            return "type", TYPES[value.lower()]
+        if name == "date":
+            return ("date",) + day_range(value)
+        if token["phrase"] is not None:
+            return "phrase", name, value
+        return "word", name, value
+
+
+def _period(text: str) -> tuple[int, int]:
+    """Returns the first and last day number of a year, month or day like 2022, 2022-05 or 2022-05-03."""
+    parts = text.split("-")
+    try:
+        numbers = [int(part) for part in parts]
+        if len(numbers) == 1:
+            first, last = datetime.date(numbers[0], 1, 1), datetime.date(numbers[0], 12, 31)
+        elif len(numbers) == 2:
+            days = calendar.monthrange(numbers[0], numbers[1])[1]
+            first, last = datetime.date(numbers[0], numbers[1], 1), datetime.date(numbers[0], numbers[1], days)
+        elif len(numbers) == 3:
+            first = last = datetime.date(*numbers)
+        else:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Can't read the date '{text}', use 2022, 2022-05 or 2022-05-03.")
+    return first.toordinal(), last.toordinal()
+
+
+def day_range(text: str) -> tuple[int, int]:
+    """Returns the first and last day number of a date: search."""
+    lowest, highest = datetime.date.min.toordinal(), datetime.date.max.toordinal()
+    if ".." in text:
+        start, end = text.split("..", 1)
+        return _period(start)[0] if start else lowest, _period(end)[1] if end else highest
+    for operator in (">=", "<=", ">", "<"):
+        if text.startswith(operator):
+            first, last = _period(text[len(operator):])
+            return {">=": (first, highest), "<=": (lowest, last),
+                    ">": (last + 1, highest), "<": (lowest, first - 1)}[operator]
+    return _period(text)
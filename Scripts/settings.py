@@ -50,3 +50,6 @@ DEFAULT_FONT_UNDERLINE_BOLD = ("Arial", 14, "underline", "bold")  # Title font
 COLORS = ['custom', 'red', 'blue', 'green', 'orange', 'white', 'grey', 'black', 'purple', 'brown', 'yellow', 'violet']
 TEXT = "text"
 TDL = "list"
+JSON_STORAGE = "json"
+SQLITE_STORAGE = "sqlite"
+STORAGE_ENGINES = [JSON_STORAGE, SQLITE_STORAGE]
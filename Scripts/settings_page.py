@@ -11,7 +11,8 @@ except ImportError:  # Python 3
     from tkinter.colorchooser import askcolor
 
 import os
-from PIL import Image
+import queue
+from PIL import ImageTk
 
 from CustomTkWidgets.custom_frames import SelectableFrames
 from CustomTkWidgets.custom_combobox import AutocompleteCombobox, CustomComboWithClassName
@@ -126,11 +127,12 @@ class GeneralSection:
     _defaults = {"limit_entry": 20,
                  "tdl_entry": 80,
                  "tab_entry": 4,
-                 "font_size_choices": 12}
-    _labels = ["Entry Limit", "ToDoList Limit", "Tab Limit", "Font Size", "Font"]
+                 "font_size_choices": 12,
+                 "storage_choices": JSON_STORAGE}
+    _labels = ["Entry Limit", "ToDoList Limit", "Tab Limit", "Font Size", "Storage", "Font"]
     __slots__ = "parent", "class_name", "data_handler", "limit_entry", "tab_entry", \
                 "font_choices", "font_size_choices", "save_btn", \
-                "_supported_fonts", "main_frame", "tdl_entry"
+                "_supported_fonts", "main_frame", "tdl_entry", "storage_choices"
 
     def __init__(self, parent_frame, data_handler, **kwargs):
         self.class_name = kwargs['class_']
@@ -141,6 +143,7 @@ class GeneralSection:
         self.tab_entry = None
         self.font_choices = None
         self.font_size_choices = None
+        self.storage_choices = None
         self.save_btn = None
 
         self._supported_fonts = []
@@ -163,7 +166,8 @@ class GeneralSection:
         combo_box_styles = {"limit_entry": self._entry_limit,
                             "tdl_entry": self._tdl_limit,
                             "tab_entry": self._tab_limit,
-                            "font_size_choices": self._font_sizes
+                            "font_size_choices": self._font_sizes,
+                            "storage_choices": STORAGE_ENGINES
                             }
 
         vs_frame = VerticalScrolledFrame(self.main_frame, scroll_lock=True)
@@ -183,11 +187,14 @@ class GeneralSection:
                 self.tab_entry = combo
             elif key == "font_size_choices":
                 self.font_size_choices = combo
+            elif key == "storage_choices":
+                self.storage_choices = combo
 
         self.limit_entry.bind("<<ComboboxSelected>>", lambda event=None: self.update_database())
         self.tdl_entry.bind("<<ComboboxSelected>>", lambda event=None: self.update_database())
         self.tab_entry.bind("<<ComboboxSelected>>", lambda event=None: self.update_database())
         self.font_size_choices.bind("<<ComboboxSelected>>", lambda event=None: self.update_database())
+        self.storage_choices.bind("<<ComboboxSelected>>", lambda event=None: self.update_database())
 
         self.font_choices = AutocompleteCombobox(vs_frame.interior, self._supported_fonts, style="R.TCombobox",
                                                  font=DEFAULT_FONT)
@@ -208,6 +215,9 @@ class GeneralSection:
         self.font_choices.selection_clear()
         self.font_size_choices.selection_clear()
 
+        self.data_handler.set_storage_engine(self.storage_choices.get())
+        self.storage_choices.selection_clear()
+
     def set_limit_entry_combo(self):
         selection = str(self.data_handler.entry_limit)
         temp_list = self.limit_entry['values']
@@ -257,12 +267,20 @@ class GeneralSection:
                 if i_d == selection:
                     self.font_size_choices.current(index)
 
+    def set_storage_combo(self):
+        selection = self.data_handler.storage_engine
+        temp_list = self.storage_choices['values']
+        for index, i_d in enumerate(temp_list):
+            if i_d == selection:
+                self.storage_choices.current(index)
+
     def set_all_combos(self):
         self.set_limit_entry_combo()
         self.set_tab_entry_combo()
         self.set_tdl_combo()
         self.set_font_combo()
         self.set_font_size_combo()
+        self.set_storage_combo()
 
     def reset_config(self):
         self.data_handler.reset_default_config()
@@ -497,8 +515,9 @@ class BackgroundSection:
     _font = ("Arial", 14)
     _pady = 15
     _padx = 7
+    _progress_interval = 50
     __slots__ = "class_name", "parent", "data_handler", "canvas", "top_level", "background_images", "background", \
-                "main_frame"
+                "main_frame", "thumbnail", "thumbnail_image", "progress", "progress_label", "_progress", "_importing"
 
     def __init__(self, parent_frame, data_handler, canvas, top_level, **kwargs):
         self.class_name = kwargs['class_']
@@ -508,6 +527,13 @@ class BackgroundSection:
         self.top_level = top_level
         self.background_images = [k for k in self.canvas.image_loc.keys()]
         self.background = None
+        self.thumbnail = None
+        self.thumbnail_image = None
+        self.progress = None
+        self.progress_label = None
+        # (fraction, text) put there by the prefetch worker while images are being added
+        self._progress = queue.SimpleQueue()
+        self._importing = 0
 
         self.main_frame = ttk.Frame(self.parent)
         self.main_frame.pack(side='top', expand=True, fill='both')
@@ -530,12 +556,23 @@ class BackgroundSection:
 
         self.background.bind("<<ComboboxSelected>>", lambda event=None: self.change_background())
         self.background.bind("<ButtonPress-3>", lambda event=None: self.pop_up_menu(event))
+
+        self.thumbnail = ttk.Label(vs_frame.interior)
+        self.thumbnail.grid(column=2, row=self.background.grid_info()['row'], padx=self._padx)
         self.set_background_combobox()
 
         ttk.Button(vs_frame.interior, text="Add Image", style="Accent.TButton", width=27,
                    command=lambda: self.add_background_view()).grid(column=1, row=last_index, pady=self._pady,
                                                                     padx=self._padx)
 
+        # Only shown while an image is being added
+        self.progress_label = ttk.Label(vs_frame.interior, font=DEFAULT_FONT, style="R.TLabel")
+        self.progress_label.grid(column=0, row=last_index + 1, pady=self._pady, padx=self._padx + 20)
+        self.progress = ttk.Progressbar(vs_frame.interior, maximum=1.0, length=200)
+        self.progress.grid(column=1, row=last_index + 1, pady=self._pady, padx=self._padx)
+        self.progress_label.grid_remove()
+        self.progress.grid_remove()
+
     def update_background_combobox(self):
         self.background['values'] = [k for k in self.canvas.image_loc.keys()]
 
@@ -554,11 +591,30 @@ class BackgroundSection:
         for index, i_d in enumerate(self.background['values']):
             if i_d == self.canvas.image_name:
                 self.background.current(index)
+        self.show_thumbnail(self.canvas.image_loc.get(self.background.get()))
 
     def change_background(self):
         new_image = self.canvas.image_loc[self.background.get()]
         self.canvas.change_background(new_image)
         self.background.selection_clear()
+        self.show_thumbnail(new_image)
+
+    def show_thumbnail(self, image_path: str | None) -> None:
+        """Shows a small copy of the image next to the combobox, it's made on the image worker."""
+        if image_path is None:
+            return
+        self.canvas.images.submit_thumbnail(image_path, self._thumbnail_made)
+
+    def _thumbnail_made(self, made: tuple) -> None:
+        image_path, image = made
+        try:
+            if image_path != self.canvas.image_loc.get(self.background.get()):
+                return
+            self.thumbnail_image = ImageTk.PhotoImage(image) if image is not None else None
+            self.thumbnail.configure(image=self.thumbnail_image if image is not None else '')
+        except tk.TclError:
+            # The settings page was closed
+            pass
 
     def add_background_view(self):
         try:
@@ -593,17 +649,61 @@ class BackgroundSection:
 
         self.save_image(filepath, image_name)
 
-        self.update_background_combobox()
         top_window.destroy()
         self.top_level.lift()
 
     def save_image(self, filepath: str, image_name: str) -> None:
+        """Scales the image down and saves it on the prefetch worker, showing the progress below the Add Image
+        button."""
         utils.check_folder_and_create(self._image_path)
-        image = Image.open(filepath)
-        file_extension = os.path.splitext(filepath)
-        new_image_path = os.path.join(self._image_path, (image_name + file_extension[1]))
-        image.save(new_image_path)
-        self.canvas.image_loc.update({image_name: new_image_path})
+        new_image_path = os.path.join(self._image_path, image_name + ".jpg")
+        screen = (self.top_level.winfo_screenwidth(), self.top_level.winfo_screenheight())
+        images = self.canvas.images
+        # Adding the same name again before the first has started replaces it
+        if images.prefetch_worker.cancel(("import", new_image_path)):
+            self._importing -= 1
+        images.prefetch_worker.submit(("import", new_image_path), images.import_image, filepath, new_image_path,
+                                      screen, lambda fraction, text: self._progress.put((fraction, text)),
+                                      callback=lambda error: self._image_saved(image_name, new_image_path, error))
+        self._importing += 1
+        if self._importing == 1:
+            self.progress_label.grid()
+            self.progress.grid()
+            self._show_progress()
+
+    def _show_progress(self) -> None:
+        """Shows the progress the prefetch worker has made, and keeps checking while images are being added."""
+        try:
+            self._drain_progress()
+            if self._importing:
+                self.progress.after(self._progress_interval, self._show_progress)
+        except tk.TclError:
+            # The settings page was closed
+            pass
+
+    def _drain_progress(self) -> None:
+        while not self._progress.empty():
+            fraction, text = self._progress.get_nowait()
+            self.progress['value'] = fraction
+            self.progress_label.configure(text=text)
+
+    def _image_saved(self, image_name: str, image_path: str, error: str) -> None:
+        self._importing -= 1
+        if not error:
+            self.canvas.image_loc.update({image_name: image_path})
+        try:
+            if error:
+                tk.messagebox.showinfo("Image Not Added", error, parent=self.top_level)
+            else:
+                self.update_background_combobox()
+            if not self._importing:
+                # The last messages would otherwise show up when the next image is added
+                self._drain_progress()
+                self.progress_label.grid_remove()
+                self.progress.grid_remove()
+        except tk.TclError:
+            # The settings page was closed, the image is still added
+            pass
 
     def pop_up_menu(self, event):
         if self.background.get() not in BACKGROUND_IMAGES.keys():
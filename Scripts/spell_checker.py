@@ -0,0 +1,118 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import threading
+from enchant import Dict, tokenize
+from enchant.tokenize import en  # Need this for building with pyinstaller, otherwise it doesn't import the en.tokenizer
+from Scripts.symspell import LRUCache, SymSpellIndex
+from Scripts.workers import Worker
+
+
+class SpellChecker:
+    """One spell checker shared by all the text areas, so the dictionary is only loaded once and words added to it
+    are known to every tab. The results of checking words and their suggestions are cached, and the checking is
+    done on the spell worker instead of a new thread every time. The words the user added and the suggestions are
+    kept for each user with load and export, the words are checked against the user's own list so they're never
+    known to another user. Get it with get_spell_checker."""
+    _checked_size = 50000
+    _suggested_size = 2000
+    __slots__ = "locale", "corpus", "_tokenizer", "_lock", "_checked", "_suggested", "worker", "added", "changed"
+
+    def __init__(self, locale: str):
+        self.locale = locale
+        self.corpus = Dict(locale)
+        self._tokenizer = tokenize.get_tokenizer(locale)
+        # The dictionary is used from the Tk thread and the worker
+        self._lock = threading.Lock()
+        # word: whether it's spelled right, and word: suggestions
+        self._checked = LRUCache(self._checked_size)
+        self._suggested = LRUCache(self._suggested_size)
+        self.worker = Worker("SpellWorker")
+        # The words the user added, to suggest them without going through the dictionary
+        self.added = SymSpellIndex()
+        # Whether there's anything to save since it was loaded
+        self.changed = False
+
+    def tokenize(self, text: str) -> list[tuple[str, int]]:
+        """Returns (word, position) of the words in the text."""
+        return list(self._tokenizer(text))
+
+    def check(self, word: str) -> bool:
+        """Whether the word is one the user added or is in the dictionary. The user's words are looked at first, so
+        a word that was cached as misspelled before it was added isn't anymore."""
+        with self._lock:
+            if word in self.added:
+                return True
+            check = self._checked.get(word)
+            if check is None:
+                check = self.corpus.check(word)
+                self._checked.put(word, check)
+            return check
+
+    def suggest(self, word: str) -> list[str]:
+        """Returns the added words close to the word, then the dictionary's suggestions."""
+        with self._lock:
+            suggestions = self._suggested.get(word)
+            if suggestions is None:
+                suggestions = self.corpus.suggest(word)
+                self._suggested.put(word, suggestions)
+                self.changed = True
+            return self._with_added(word, suggestions)
+
+    def cached_suggestions(self, word: str) -> list[str]:
+        """Same as suggest but never asks the dictionary, so it's quick enough for the Tk thread. Only has the
+        added words if the word hasn't been suggested for before."""
+        with self._lock:
+            return self._with_added(word, self._suggested.get(word, ()))
+
+    def _with_added(self, word: str, suggestions) -> list[str]:
+        return list(dict.fromkeys(self.added.lookup(word) + list(suggestions)))
+
+    def is_added(self, word: str) -> bool:
+        with self._lock:
+            return word in self.added
+
+    def add(self, word: str) -> None:
+        """Adds the word to the current user's words, for every tab. It's never written to the dictionary's own
+        word list, which every user shares."""
+        with self._lock:
+            self._suggested.pop(word)
+            if word not in self.added:
+                self.added.add(word)
+                self.changed = True
+
+    def load(self, saved: dict) -> None:
+        """Swaps in a user's added words and suggestions, saved with export."""
+        with self._lock:
+            self._checked.clear()
+            self._suggested.clear()
+            self.added.clear()
+            for word in saved.get("added", ()):
+                self.added.add(word)
+            for word, suggestions in saved.get("suggestions", ()):
+                self._suggested.put(word, suggestions)
+            self.changed = False
+
+    def export(self) -> dict:
+        """Returns the added words and the cached suggestions, least recently used first, for load."""
+        with self._lock:
+            return {"added": list(self.added.words.values()), "suggestions": list(self._suggested.items())}
+
+    def misspelled(self, text: str) -> list[tuple[str, int, list[str]]]:
+        """Returns (word, position, suggestions) of the misspelled words in the text. Runs on the spell worker."""
+        return [(word, position, self.suggest(word)) for word, position in self.tokenize(text)
+                if not self.check(word)]
+
+    def check_chunks(self, chunks: list[tuple[str, str]]) -> list[tuple[str, str, list]]:
+        """Takes (mark, text) pieces of a text area, the mark being where the piece starts, and returns
+        (mark, text, misspelled words)."""
+        return [(mark, text, self.misspelled(text)) for mark, text in chunks]
+
+
+_spell_checkers = {}
+
+
+def get_spell_checker(locale: str = 'en') -> SpellChecker:
+    """Returns the spell checker for the locale, it's only created the first time."""
+    if locale not in _spell_checkers:
+        _spell_checkers[locale] = SpellChecker(locale)
+    return _spell_checkers[locale]
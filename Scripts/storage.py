@@ -0,0 +1,517 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import base64
+import binascii
+import json
+import os
+import shutil
+import sqlite3
+from collections import deque
+import Scripts.utils as utils
+from Scripts.settings import *
+from Scripts.change_set import apply_operations, copy_data, copy_definitions
+from Scripts.ordered_map import OrderedMap
+
+
+class Shard:
+    """Stands in for a category that hasn't been loaded yet. Holds what the storage needs to load it."""
+    __slots__ = "key", "count"
+
+    def __init__(self, key, count: int):
+        self.key = key
+        self.count = count
+
+
+class LazyData(OrderedMap):
+    """A user's data, where categories are only loaded from the storage the first time they're used.
+    Categories that haven't been loaded are held as a Shard. Going through all the values loads everything."""
+    __slots__ = "loader",
+
+    def __init__(self, loader=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loader = loader
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, Shard):
+            value = self.loader(value.key)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            super().pop(key)
+            return value
+        return super().pop(key, *default)
+
+    def __eq__(self, other):
+        if not isinstance(other, dict) or len(self) != len(other):
+            return False
+        self.load_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def copy(self, convert=None):
+        return self._copy_to(LazyData(self.loader), convert)
+
+    def is_loaded(self, key) -> bool:
+        return not isinstance(super().__getitem__(key), Shard)
+
+    def count(self, key) -> int:
+        """Returns the amount of definitions in a category without loading it."""
+        value = super().__getitem__(key)
+        return value.count if isinstance(value, Shard) else len(value)
+
+    def load_all(self) -> None:
+        for key in self.keys():
+            self[key]
+
+    def rename(self, key, new_key) -> None:
+        """Renames a category, keeping its position. The category is loaded first so the storage never has to
+        find it under its old name."""
+        self[key]
+        super().rename(key, new_key)
+
+    def detached_copy(self):
+        """Returns a copy that can be handed to another thread. Categories that haven't been loaded are left for
+        the copy to load itself."""
+        return self.copy(lambda value: value if isinstance(value, Shard) else copy_definitions(value))
+
+
+class JsonStorage:
+    """Stores a user's data as one encoded json file per category (database/<shard>.json), along with a manifest
+    of the categories in order, which file each is in, and how many definitions they have. A category's file is
+    only decoded the first time the category is used. The storage keeps its own copy of the data to write the
+    files from, but only decodes a category there when a checkpoint writes it, and lets go of it after, so a
+    category is only held once, by the data that was handed out.
+    Saves are appended to a write-ahead log (database.log) and only written into the files of the categories that
+    changed once the log gets big, that's called a checkpoint. Loading replays the log on top of the files, so a
+    crash mid-save only loses the save that was being written."""
+    _folder = "database"
+    _manifest_filename = "manifest.json"
+    _legacy_filename = "database.json"
+    _log_filename = "database.log"
+    _checkpoint_records = 200
+    _checkpoint_size = 1024 * 1024
+    __slots__ = "folder", "manifest_path", "legacy_path", "log_path", "data_passes", "data", "sequence", "shards", \
+                "next_shard", "_dirty", "_removed", "_pending", "_log_records", "_log_size", "_corrupt", "problems"
+
+    def __init__(self, user_folder: str, data_passes: int):
+        # CWD/Data/Users/Username/database
+        self.folder = os.path.join(user_folder, self._folder)
+        # CWD/Data/Users/Username/database/manifest.json
+        self.manifest_path = os.path.join(self.folder, self._manifest_filename)
+        # CWD/Data/Users/Username/database.json, where all the data was saved before it was split up
+        self.legacy_path = os.path.join(user_folder, self._legacy_filename)
+        # CWD/Data/Users/Username/database.log
+        self.log_path = os.path.join(user_folder, self._log_filename)
+        self.data_passes = data_passes
+        self.data = LazyData(self._load_category)
+        # Number of the last save, the manifest stores the number it was checkpointed at
+        self.sequence = 0
+        # Category name: number of the file it's saved in
+        self.shards = {}
+        self.next_shard = 0
+        # Files that need to be written, and files of deleted categories, at the next checkpoint
+        self._dirty = set()
+        self._removed = set()
+        # File number: operations on its category that's still in the file, applied when it's decoded
+        self._pending = {}
+        self._log_records = 0
+        self._log_size = 0
+        # Files that couldn't be decoded, they're set aside before anything is written over them
+        self._corrupt = set()
+        # What couldn't be read, categories can be loaded on any thread so DataHandler shows these on the Tk thread
+        self.problems = deque()
+
+    def exists(self) -> bool:
+        return any(os.path.isfile(path) for path in (self.manifest_path, self.legacy_path, self.log_path))
+
+    def take_problems(self) -> list[str]:
+        """Returns what couldn't be read since the last time this was called."""
+        problems = []
+        while self.problems:
+            problems.append(self.problems.popleft())
+        return problems
+
+    def load(self) -> tuple[dict, bool]:
+        """Returns the saved data and False if the manifest couldn't be decoded. Data saved in a single
+        database.json file, including the old multi-pass encoding, gets split up into the category files."""
+        migrating = False
+        try:
+            if os.path.isfile(self.manifest_path):
+                manifest, header = utils.read_encoded(self.manifest_path, self.data_passes)
+                for category, shard, count in manifest["categories"]:
+                    self.data[category] = Shard(shard, count)
+                    self.shards[category] = shard
+                self.next_shard = header.get("next_shard", 0)
+            elif os.path.isfile(self.legacy_path):
+                data, header = utils.read_encoded(self.legacy_path, self.data_passes)
+                if isinstance(data, str):
+                    data, check = utils.decode_string(data, self.data_passes, json_object=True)
+                    if not check:
+                        return data, check
+                self.data.update(copy_data(data))
+                self._assign_shards()
+                migrating = True
+            else:
+                header = {}
+        except (ValueError, KeyError, TypeError):
+            return {}, False
+        self.sequence = header.get("sequence", 0)
+        self._replay_log()
+        if migrating or os.path.isfile(self.log_path):
+            # Start over with an empty log, this also drops a record that was only partly written
+            utils.check_folder_and_create(self.folder)
+            self._removed.update(self._orphaned_shards())
+            self._checkpoint()
+        if migrating:
+            os.remove(self.legacy_path)
+        data = self.data.detached_copy()
+        # The categories are loaded from the files as they are, the operations waiting are only for this copy
+        data.loader = self._load_shard
+        return data, True
+
+    def save(self, operations: list) -> None:
+        """Appends the operations to the log. Clearing or restoring all the data, or a log that has gotten too
+        big, does a checkpoint instead."""
+        self._apply(operations)
+        self.sequence += 1
+        if (any(operation[0] == "reset" for operation in operations)
+                or self._log_records >= self._checkpoint_records or self._log_size >= self._checkpoint_size):
+            self._checkpoint()
+        else:
+            self._append_log(operations)
+
+    def close(self) -> None:
+        if self._log_records:
+            self._checkpoint()
+
+    def remove(self) -> None:
+        """Deletes all the files, once the data has been moved to another storage."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+        for path in (self.legacy_path, self.log_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stamp(self) -> str:
+        """Returns a stamp that changes every time the data is saved, for files made from the data to tell if
+        they're out of date."""
+        return f"json:{self.sequence}"
+
+    def _shard_path(self, shard: int) -> str:
+        # CWD/Data/Users/Username/database/shard.json
+        return os.path.join(self.folder, f"{shard}.json")
+
+    def _load_shard(self, shard: int) -> dict:
+        """Decodes a category's file. A file that can't be decoded is loaded as an empty category and reported in
+        problems, it's set aside at the next checkpoint so it doesn't get written over."""
+        path = self._shard_path(shard)
+        try:
+            data, header = utils.read_encoded(path, self.data_passes)
+        except FileNotFoundError:
+            return OrderedMap()
+        except ValueError:
+            self._corrupt.add(shard)
+            category = next((c for c, s in list(self.shards.items()) if s == shard), shard)
+            self.problems.append(f"Category {category} has been corrupted.")
+            return OrderedMap()
+        positions = header.get("positions", [])
+        if len(positions) != len(data):
+            return OrderedMap(data)
+        return OrderedMap.from_positions(data.items(), positions)
+
+    def _load_category(self, shard: int) -> dict:
+        """Decodes a category's file for the storage's own copy, with the operations saved since the last
+        checkpoint."""
+        definitions = self._load_shard(shard)
+        for operation in self._pending.pop(shard, ()):
+            # Under the name it had then, the category might have been renamed since
+            apply_operations({operation[1]: definitions}, [operation])
+        return definitions
+
+    def _release(self) -> None:
+        """Puts the categories back to the Shards they were loaded from, once they've been written."""
+        for category in self.data.keys():
+            if self.data.is_loaded(category):
+                self.data[category] = Shard(self.shards[category], self.data.count(category))
+
+    def _assign_shards(self) -> None:
+        """Gives new categories a file of their own."""
+        for category in self.data.keys():
+            if category not in self.shards:
+                self.shards[category] = self.next_shard
+                self._dirty.add(self.next_shard)
+                self.next_shard += 1
+
+    def _apply(self, operations: list) -> None:
+        """Applies the operations to the data, keeping track of which files need to be written."""
+        for operation in operations:
+            kind = operation[0]
+            if kind in ("put", "delete", "order", "position") and operation[1] in self.shards \
+                    and not self.data.is_loaded(operation[1]):
+                # Waits for the category to be decoded at the checkpoint instead of decoding it for every save
+                shard = self.shards[operation[1]]
+                self._pending.setdefault(shard, []).append(operation)
+                self._dirty.add(shard)
+                continue
+            if kind == "reset":
+                self._removed.update(self.shards.values())
+                self._pending = {}
+                self.shards = {}
+            elif kind == "rename":
+                _, category, new_category = operation
+                if category in self.shards:
+                    self.shards[new_category] = self.shards.pop(category)
+            elif kind == "drop":
+                if operation[1] in self.shards:
+                    shard = self.shards.pop(operation[1])
+                    self._removed.add(shard)
+                    self._pending.pop(shard, None)
+            apply_operations(self.data, [operation])
+            if kind in ("reset", "put", "categories"):
+                self._assign_shards()
+            if kind in ("put", "delete", "order", "position") and operation[1] in self.shards:
+                self._dirty.add(self.shards[operation[1]])
+
+    def _orphaned_shards(self) -> set:
+        """Returns the files left over from categories that were deleted right before a crash."""
+        used = set(self.shards.values())
+        orphaned = set()
+        for filename in os.listdir(self.folder):
+            shard, extension = os.path.splitext(filename)
+            if extension == ".json" and shard.isdigit() and int(shard) not in used:
+                orphaned.add(int(shard))
+        return orphaned
+
+    def _checkpoint(self) -> None:
+        """Writes the changed categories to their files, then the manifest, then empties the log. If it crashes in
+        between, the log records are replayed on top of the manifest's sequence when loading, and since the
+        operations only set values, applying them again to a file that was already written doesn't change it."""
+        utils.check_folder_and_create(self.folder)
+        categories = {shard: category for category, shard in self.shards.items()}
+        # Decoded first, so a file found to be corrupt is set aside before it's written over
+        written = {shard: self.data[categories[shard]] for shard in self._dirty if shard in categories}
+        for shard in self._corrupt & (self._dirty | self._removed):
+            # Kept as <shard>.json.corrupt, in case it can be recovered by hand
+            path = self._shard_path(shard)
+            if os.path.isfile(path):
+                os.replace(path, path + ".corrupt")
+            self._corrupt.discard(shard)
+        for shard, definitions in written.items():
+            # The positions are saved so the positions in the log records still line up after loading
+            utils.dump_encoded(self._shard_path(shard), definitions, self.data_passes,
+                               header={"positions": [definitions.position(d) for d in definitions]})
+        manifest = {"categories": [[c, self.shards[c], self.data.count(c)] for c in self.data.keys()]}
+        utils.dump_encoded(self.manifest_path, manifest, self.data_passes,
+                           header={"sequence": self.sequence, "next_shard": self.next_shard})
+        for shard in self._removed - set(categories):
+            try:
+                os.remove(self._shard_path(shard))
+            except FileNotFoundError:
+                pass
+        utils.truncate_file(self.log_path)
+        self._release()
+        self._dirty = set()
+        self._removed = set()
+        self._log_records = 0
+        self._log_size = 0
+
+    def _append_log(self, operations: list) -> None:
+        self._log_size += utils.append_record(self.log_path, [self.sequence, operations], self.data_passes)
+        self._log_records += 1
+
+    def _replay_log(self) -> int:
+        """Applies the log records newer than the manifest to the data. Returns the amount of records applied."""
+        replayed = 0
+        for sequence, operations in utils.read_records(self.log_path, self.data_passes):
+            if sequence <= self.sequence:
+                continue
+            self._apply(operations)
+            self.sequence = sequence
+            replayed += 1
+        return replayed
+
+
+class SQLiteStorage:
+    """Stores a user's data in a sqlite database (database.sqlite3), with one row per definition. Changes are
+    written as single row operations instead of re-writing all the data."""
+    _filename = "database.sqlite3"
+    _schema = """
+        CREATE TABLE IF NOT EXISTS categories (
+            name TEXT PRIMARY KEY,
+            position REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS definitions (
+            category TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position REAL NOT NULL,
+            text BLOB NOT NULL,
+            timestamp TEXT NOT NULL,
+            font TEXT NOT NULL,
+            tab_type TEXT NOT NULL,
+            PRIMARY KEY (category, name)
+        );
+        CREATE INDEX IF NOT EXISTS definitions_order ON definitions (category, position);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+    __slots__ = "save_path", "connection", "_reader", "problems"
+
+    def __init__(self, user_folder: str, data_passes: int = None):
+        # CWD/Data/Users/Username/database.sqlite3
+        self.save_path = os.path.join(user_folder, self._filename)
+        self.connection = None
+        # Categories are loaded on the Tk thread with their own connection, while saving is done on the worker
+        self._reader = None
+        # What couldn't be read, categories can be loaded on any thread so DataHandler shows these on the Tk thread
+        self.problems = deque()
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.save_path)
+
+    def take_problems(self) -> list[str]:
+        """Returns what couldn't be read since the last time this was called."""
+        problems = []
+        while self.problems:
+            problems.append(self.problems.popleft())
+        return problems
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            # Saving is done on the save worker's thread
+            self.connection = sqlite3.connect(self.save_path, check_same_thread=False)
+            self.connection.executescript(self._schema)
+        return self.connection
+
+    @staticmethod
+    def _encode_text(text: str) -> bytes:
+        return base64.urlsafe_b64encode(text.encode())
+
+    @staticmethod
+    def _decode_text(text: bytes) -> str:
+        return base64.urlsafe_b64decode(text).decode()
+
+    def _row(self, category: str, definition: str, position: float, values: list) -> tuple:
+        tab_type = values[3] if len(values) > 3 else TEXT
+        return (category, definition, position, self._encode_text(values[0]), values[1], json.dumps(values[2]),
+                tab_type)
+
+    def load(self) -> tuple[dict, bool]:
+        """Returns the saved categories and False if the database couldn't be read. The definitions of a category
+        are only read the first time it's used."""
+        try:
+            connection = self._connect()
+            counts = dict(connection.execute("SELECT category, COUNT(*) FROM definitions GROUP BY category"))
+            data = LazyData(self._load_category)
+            for name, in connection.execute("SELECT name FROM categories ORDER BY position"):
+                data[name] = Shard(name, counts.pop(name, 0))
+            for name, count in counts.items():
+                data[name] = Shard(name, count)
+            return data, True
+        except sqlite3.DatabaseError:
+            return {}, False
+
+    def _load_category(self, category: str) -> dict:
+        """Reads the definitions of a category. Rows that can't be decoded are skipped and reported in problems,
+        they're left in the database as they are."""
+        if self._reader is None:
+            self._reader = sqlite3.connect(self.save_path, check_same_thread=False)
+        definitions = OrderedMap()
+        rows = self._reader.execute("SELECT name, position, text, timestamp, font, tab_type FROM definitions "
+                                    "WHERE category = ? ORDER BY position", (category,))
+        for name, position, text, timestamp, font, tab_type in rows:
+            try:
+                definitions.place(name, [self._decode_text(text), timestamp, json.loads(font), tab_type], position)
+            except (binascii.Error, UnicodeDecodeError, ValueError):
+                self.problems.append(f"Definition {name} in {category} has been corrupted.")
+        return definitions
+
+    def save(self, operations: list) -> None:
+        """Applies the operations collected from the ChangeSet in one transaction."""
+        connection = self._connect()
+        with connection:
+            connection.execute("INSERT INTO meta VALUES ('sequence', 1) "
+                               "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+            for operation in operations:
+                kind = operation[0]
+                if kind == "reset":
+                    self._write_all(connection, operation[1])
+                elif kind == "rename":
+                    _, category, new_category = operation
+                    connection.execute("UPDATE categories SET name = ? WHERE name = ?", (new_category, category))
+                    connection.execute("UPDATE definitions SET category = ? WHERE category = ?",
+                                       (new_category, category))
+                elif kind == "drop":
+                    connection.execute("DELETE FROM categories WHERE name = ?", (operation[1],))
+                    connection.execute("DELETE FROM definitions WHERE category = ?", (operation[1],))
+                elif kind == "put":
+                    _, category, definition, values, position = operation
+                    connection.execute("INSERT INTO definitions VALUES (?, ?, ?, ?, ?, ?, ?) "
+                                       "ON CONFLICT (category, name) DO UPDATE SET position = excluded.position, "
+                                       "text = excluded.text, timestamp = excluded.timestamp, "
+                                       "font = excluded.font, tab_type = excluded.tab_type",
+                                       self._row(category, definition, position, values))
+                elif kind == "delete":
+                    connection.execute("DELETE FROM definitions WHERE category = ? AND name = ?", operation[1:])
+                elif kind == "position":
+                    _, category, definition, position = operation
+                    connection.execute("UPDATE definitions SET position = ? WHERE category = ? AND name = ?",
+                                       (position, category, definition))
+                elif kind == "order":
+                    _, category, definitions, positions = operation
+                    connection.executemany("UPDATE definitions SET position = ? WHERE category = ? AND name = ?",
+                                           [(position, category, d) for d, position in zip(definitions, positions)])
+                elif kind == "categories":
+                    connection.executemany("INSERT INTO categories VALUES (?, ?) "
+                                           "ON CONFLICT (name) DO UPDATE SET position = excluded.position",
+                                           [(c, index) for index, c in enumerate(operation[1])])
+
+    def stamp(self) -> str:
+        """Returns a stamp that changes every time the data is saved, for files made from the data to tell if
+        they're out of date."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'sequence'").fetchone()
+        return f"sqlite:{row[0] if row else 0}"
+
+    def _write_all(self, connection: sqlite3.Connection, data: dict) -> None:
+        connection.execute("DELETE FROM categories")
+        connection.execute("DELETE FROM definitions")
+        connection.executemany("INSERT INTO categories VALUES (?, ?)",
+                               [(c, index) for index, c in enumerate(data.keys())])
+        connection.executemany("INSERT INTO definitions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               [self._row(category, definition, definitions.position(definition), values)
+                                for category, definitions in data.items()
+                                for definition, values in definitions.items()])
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def remove(self) -> None:
+        """Deletes the database, once the data has been moved to another storage."""
+        self.close()
+        for path in (self.save_path, self.save_path + "-journal"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+STORAGE_TYPES = {JSON_STORAGE: JsonStorage,
+                 SQLITE_STORAGE: SQLiteStorage}
@@ -8,6 +8,7 @@ except ImportError:  # Python 3
     from tkinter import ttk
     from tkinter import messagebox, filedialog
 
+import copy
 import os
 import Scripts.utils as utils
 
@@ -35,13 +36,15 @@ class StyleManager:
         "Pin_Color": {"foreground": "yellow"},
         "TCheckbutton": {"font": "8", "foreground": "white"}
     }
-    __slots__ = "root", "journal", "user", "theme", "style", "_path_to_directory", "_path_to_config", "data"
+    __slots__ = "root", "journal", "user", "theme", "style", "_path_to_directory", "_path_to_config", "data", \
+                "save_worker"
 
     def __init__(self, journal, root, user, theme):
         self.root = root
         self.journal = journal
         self.user = user
         self.theme = theme
+        self.save_worker = journal.data_handler.save_worker
 
         self.style = ttk.Style(self.root)
         self.style.theme_use(self.theme)
@@ -50,7 +53,7 @@ class StyleManager:
         self._path_to_config = os.path.join(self._path_to_directory, "style_config.json")
         utils.check_folder_and_create(self._path_to_directory)
 
-        self.data = utils.read_json(self._path_to_config, self._default_style)
+        self.data = copy.deepcopy(utils.read_json(self._path_to_config, self._default_style))
 
         self.root.bind("<<MainWindowCreated>>", lambda event=None: self.apply_style())
         self.root.bind("<<HelpSectionCreated>>", lambda event=None: self.apply_to_help_section())
@@ -123,17 +126,16 @@ class StyleManager:
         return self.data[key][option]
 
     def dump_style(self, data=None):
-        """Dumps the json data of the styles into a file."""
+        """Sets the styles and dumps a copy of the json data into a file on the save worker."""
         if data:
-            utils.dump_json(self._path_to_config, data)
-        else:
-            utils.dump_json(self._path_to_config, self.data)
+            self.data = data
+        self.save_worker.submit(self._path_to_config, utils.dump_json, self._path_to_config,
+                                copy.deepcopy(self.data))
 
     def update_style(self):
-        self.data = utils.read_json(self._path_to_config, self._default_style)
         self.apply_style()
 
     def reset_to_defaults(self):
         """Resets all styling back to their defaults."""
-        self.dump_style(self._default_style)
+        self.dump_style(copy.deepcopy(self._default_style))
         self.update_style()
@@ -0,0 +1,105 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A dict that only keeps the most recently used items, up to its size."""
+    __slots__ = "size", "_items"
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key, default=None):
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            return default
+        return self._items[key]
+
+    def put(self, key, value) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._items.pop(key, default)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def items(self) -> list:
+        """Returns the items, least recently used first."""
+        return list(self._items.items())
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Number of letters added, removed, changed or swapped with the next one to turn a into b."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word: str, distance: int) -> set[str]:
+    """Returns the word with up to distance letters taken out of it, including the word itself."""
+    found = {word}
+    edges = {word}
+    for _ in range(distance):
+        edges = {edge[:i] + edge[i + 1:] for edge in edges for i in range(len(edge))} - found
+        found |= edges
+    return found
+
+
+class SymSpellIndex:
+    """Finds words within a couple of typos by looking up the words with letters taken out of them, symmetric delete
+    spelling correction. Used for the words the user added, so suggesting them doesn't go through the dictionary."""
+    __slots__ = "distance", "words", "_deletes"
+
+    def __init__(self, distance: int = 2):
+        self.distance = distance
+        # casefolded word: word, and a word with letters taken out: the casefolded words it came from
+        self.words = {}
+        self._deletes = {}
+
+    def __contains__(self, word: str) -> bool:
+        return word.casefold() in self.words
+
+    def add(self, word: str) -> None:
+        key = word.casefold()
+        if key in self.words:
+            return
+        self.words[key] = word
+        for delete in deletes(key, self.distance):
+            self._deletes.setdefault(delete, set()).add(key)
+
+    def clear(self) -> None:
+        self.words.clear()
+        self._deletes.clear()
+
+    def lookup(self, word: str) -> list[str]:
+        """Returns the words within the distance, closest first."""
+        key = word.casefold()
+        candidates = set()
+        for delete in deletes(key, self.distance):
+            candidates.update(self._deletes.get(delete, ()))
+        found = []
+        for candidate in candidates:
+            distance = edit_distance(key, candidate)
+            if distance <= self.distance:
+                found.append((distance, candidate))
+        return [self.words[candidate] for distance, candidate in sorted(found)]
@@ -9,15 +9,28 @@ except ImportError:  # Python 3
     from tkinter import messagebox
 
 import binascii
+import contextlib
+import functools
+import random
+import stat
+import struct
 import time
 import json
 import os
 import base64
 import ast
+import zlib
 from Scripts.settings import *
 from CustomTkWidgets.custom_combobox import CustomComboWithClassName
 from CustomTkWidgets.custom_color_picker import ColorPicker
 
+# Header for files saved with the encoded file format, followed by the version byte.
+CODEC_MAGIC = b"JRNL"
+CODEC_VERSION = 3
+_CHUNK_SIZE = 64 * 1024
+# Each record appended with append_record is the length and crc32 of the payload, followed by the payload
+_RECORD_HEADER = struct.Struct(">II")
+
 
 def get_current_time():
     return time.strftime("%Y-%m-%d, %H-%M-%S")
@@ -63,18 +76,66 @@ def read_config(filepath: str):
         return json.load(file)
 
 
+@contextlib.contextmanager
+def atomic_write(filepath: str, mode: str = 'w'):
+    """Opens a temp file next to filepath to write to. Once it's written and synced to disk it replaces filepath,
+    so a crash while saving leaves the old file as it was instead of a truncated one."""
+    folder, filename = os.path.split(os.path.abspath(filepath))
+    fd, temp_path = _create_temp(folder, filename)
+    try:
+        # It keeps the permissions of the file it replaces
+        with contextlib.suppress(FileNotFoundError):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(filepath).st_mode))
+        with os.fdopen(fd, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    fsync_folder(folder)
+
+
+def _create_temp(folder: str, filename: str) -> tuple[int, str]:
+    """Creates a temp file named filename.<random>.tmp in the folder. It gets the permissions a new file would,
+    the umask is applied by the OS."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        temp_path = os.path.join(folder, f"{filename}.{os.urandom(6).hex()}.tmp")
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def fsync_folder(folder: str) -> None:
+    """Makes sure a file being created, renamed or removed in the folder is on disk. Only needed on posix."""
+    if os.name != "posix":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 def dump_json(filepath: str, data: dict | str) -> None:
-    with open(filepath, 'w') as file:
+    with atomic_write(filepath) as file:
         json.dump(data, file, indent=4)
-        file.truncate()
 
 
-def read_json(filename, data: dict) -> dict | str:
-    """Read file data from the json file. Other-wise creates a new file."""
+def read_json(filename, data: dict, key: int = 0) -> dict | str:
+    """Read file data from the json file. Other-wise creates a new file.
+    Files saved with dump_encoded are decoded with the given key, raises ValueError if they can't be decoded."""
     try:
-        with open(filename, 'r') as file:
+        with open(filename, 'rb') as file:
             if os.path.getsize(filename) == 2 or os.path.getsize(filename) == 0:
                 return create_json(filename, data)
+            if file.read(len(CODEC_MAGIC)) == CODEC_MAGIC:
+                return _read_encoded(file, key)[0]
+            file.seek(0)
             return json.load(file)
     except FileNotFoundError:
         return create_json(filename, data)
@@ -82,10 +143,173 @@ def read_json(filename, data: dict) -> dict | str:
 
 def create_json(filename, data: dict) -> dict:
     """Creates the json file if it doesn't exist."""
-    with open(filename, 'w') as file:
-        json.dump(data, file, indent=4)
-        file.truncate()
-        return data.copy()
+    dump_json(filename, data)
+    return data.copy()
+
+
+def read_encoded(filename, key: int = 0) -> tuple[dict | str, dict]:
+    """Same as read_json, but also returns the header the file was saved with by dump_encoded.
+    The header is empty for files that don't have one. Raises FileNotFoundError instead of creating the file."""
+    with open(filename, 'rb') as file:
+        if file.read(len(CODEC_MAGIC)) == CODEC_MAGIC:
+            return _read_encoded(file, key)
+    return read_json(filename, data={}, key=key), {}
+
+
+def read_header(filename, key: int = 0) -> dict:
+    """Returns only the header of a file saved with dump_encoded, decoding no further than its line. Files that
+    don't have one, or weren't saved with dump_encoded, give an empty header. Raises ValueError if it can't be
+    decoded."""
+    with open(filename, 'rb') as file:
+        if file.read(len(CODEC_MAGIC)) != CODEC_MAGIC:
+            return {}
+        if file.read(1) != bytes([CODEC_VERSION]):
+            raise ValueError("Unsupported file version.")
+        pieces = []
+        for chunk in _decompress_chunks(file, key):
+            line, newline, _ = chunk.partition(b"\n")
+            pieces.append(line)
+            if newline:
+                break
+    line = b"".join(pieces)
+    if not line.strip():
+        return {}
+    k, value = json.loads(line)
+    return value if k is None else {}
+
+
+@functools.lru_cache(maxsize=None)
+def _codec_tables(key: int) -> tuple[bytes, bytes]:
+    """Returns the byte substitution table for the key, and the table to reverse it."""
+    table = list(range(256))
+    random.Random(key).shuffle(table)
+    reverse = [0] * 256
+    for index, value in enumerate(table):
+        reverse[value] = index
+    return bytes(table), bytes(reverse)
+
+
+def dump_encoded(filepath: str, data: dict, key: int = 0, header: dict = None) -> None:
+    """Saves the data as compressed json, with the bytes scrambled by the key so the file isn't readable.
+    Each key of the data is written as its own json line, so the file can be decoded piece by piece.
+    The optional header is saved as a line with a null key in front of the data."""
+    encode_table, _ = _codec_tables(key)
+    compressor = zlib.compressobj()
+    with atomic_write(filepath, 'wb') as file:
+        file.write(CODEC_MAGIC + bytes([CODEC_VERSION]))
+        if header:
+            line = json.dumps([None, header], separators=(",", ":")).encode() + b"\n"
+            file.write(compressor.compress(line).translate(encode_table))
+        for k, value in data.items():
+            line = json.dumps([k, value], separators=(",", ":")).encode() + b"\n"
+            file.write(compressor.compress(line).translate(encode_table))
+        file.write(compressor.flush().translate(encode_table))
+
+
+def encode_bytes(data: bytes, key: int = 0) -> bytes:
+    """Compresses and scrambles a piece of data the same way dump_encoded does."""
+    encode_table, _ = _codec_tables(key)
+    return zlib.compress(data).translate(encode_table)
+
+
+def decode_bytes(data: bytes, key: int = 0) -> bytes:
+    """Reverses encode_bytes, raises ValueError if the data can't be decoded."""
+    _, decode_table = _codec_tables(key)
+    try:
+        return zlib.decompress(data.translate(decode_table))
+    except zlib.error as e:
+        raise ValueError("Data could not be decoded.") from e
+
+
+def append_record(filepath: str, record, key: int = 0) -> int:
+    """Appends a json record, encoded like dump_encoded, to the end of a file and syncs it to disk.
+    Returns the amount of bytes written. If the write fails the file is cut back to where it ended, otherwise the
+    records appended after would be behind a broken one and never read."""
+    payload = encode_bytes(json.dumps(record, separators=(",", ":")).encode(), key)
+    data = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+    # Unbuffered so nothing is left to be written after cutting the file back
+    with open(filepath, 'ab', buffering=0) as file:
+        offset = file.seek(0, os.SEEK_END)
+        try:
+            written = 0
+            while written < len(data):
+                written += file.write(data[written:])
+            os.fsync(file.fileno())
+        except BaseException:
+            with contextlib.suppress(OSError):
+                file.truncate(offset)
+            raise
+    return len(data)
+
+
+def read_records(filepath: str, key: int = 0) -> list:
+    """Returns the records saved with append_record. Stops at the first record that is cut off or doesn't match
+    its checksum, since that's where writing was interrupted."""
+    try:
+        with open(filepath, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, checksum = _RECORD_HEADER.unpack_from(data, offset)
+        offset += _RECORD_HEADER.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        try:
+            records.append(json.loads(decode_bytes(payload, key)))
+        except ValueError:
+            break
+    return records
+
+
+def truncate_file(filepath: str) -> None:
+    """Empties a file and syncs it to disk."""
+    with open(filepath, 'wb') as file:
+        os.fsync(file.fileno())
+
+
+def _decompress_chunks(file, key: int):
+    """Yields the decoded bytes of the rest of a file saved with dump_encoded, as it's read."""
+    _, decode_table = _codec_tables(key)
+    decompressor = zlib.decompressobj()
+    try:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            yield decompressor.decompress(chunk.translate(decode_table))
+        yield decompressor.flush()
+    except zlib.error as e:
+        raise ValueError("File could not be decoded.") from e
+    if not decompressor.eof:
+        raise ValueError("File is incomplete.")
+
+
+def _read_encoded(file, key: int) -> tuple[dict, dict]:
+    """Reads the rest of a file saved with dump_encoded, returns the data and the header. The json lines are parsed
+    one at a time while the file is being decompressed."""
+    if file.read(1) != bytes([CODEC_VERSION]):
+        raise ValueError("Unsupported file version.")
+    data = {}
+    header = {}
+    pieces = []
+    for chunk in _decompress_chunks(file, key):
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            pieces.append(lines[0])
+            lines[0] = b"".join(pieces)
+            pieces = []
+            for line in lines:
+                k, value = json.loads(line)
+                if k is None:
+                    header = value
+                else:
+                    data[k] = value
+        pieces.append(rest)
+    if b"".join(pieces).strip():
+        raise ValueError("File is incomplete.")
+    return data, header
 
 
 def create_pop_up(title: str, root: tk.Tk, entry_limit: int, parent=None, offset: tuple[int, int] = None) -> (
@@ -226,36 +450,36 @@ def convert_image_to_base64(image_location: str):
 
 
 def decode_string(data: str, passes: int = 1, json_object: bool = False) -> tuple[str, bool] | tuple[dict, bool]:
-    data_eval = eval(data)
-    decoded_string = None
+    # The encoded string is saved as the text of a bytes object, IE: b'...'
+    if not isinstance(data, str):
+        raise TypeError("Encoded data has to be a string.")
+    if not data.startswith("b'") or not data.endswith("'"):
+        return {}, False
+    decoded_string = data[2:-1].encode()
     try:
         for i in range(passes):
-            if decoded_string is None:
-                decoded = base64.urlsafe_b64decode(data_eval)
-                decoded_string = decoded
-            else:
-                decoded_string = base64.urlsafe_b64decode(decoded_string)
+            decoded_string = base64.urlsafe_b64decode(decoded_string)
     except binascii.Error:
         return {}, False
     if json_object:
         try:
-            decoded_string = decoded_string.decode()
-            return ast.literal_eval(str(decoded_string)), True
-        except SyntaxError:
-            return {}, False
+            return json.loads(decoded_string), True
         except ValueError:
+            pass
+        # Saved before objects were encoded as json
+        try:
+            return ast.literal_eval(decoded_string.decode()), True
+        except (SyntaxError, ValueError):
             return {}, False
     return str(decoded_string.decode()), True
 
 
 def encode_string(data: str | int | dict, passes: int = 1) -> str:
-    encoded_string = None
+    if isinstance(data, dict):
+        data = json.dumps(data, separators=(",", ":"))
+    encoded_string = str(data).encode()
     for i in range(passes):
-        if encoded_string is None:
-            encoded = base64.urlsafe_b64encode(str(data).encode())
-            encoded_string = encoded
-        else:
-            encoded_string = base64.urlsafe_b64encode(encoded_string)
+        encoded_string = base64.urlsafe_b64encode(encoded_string)
     return str(encoded_string)
 
 
@@ -0,0 +1,132 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+try:
+    import Tkinter as tk
+except ImportError:  # Python 3
+    import tkinter as tk
+
+import queue
+import threading
+import time
+import traceback
+
+
+class Worker:
+    """Runs jobs on one long-lived background thread so they don't block the Tk main loop.
+    Jobs are submitted under a key, submitting a job while one with the same key is still waiting replaces it.
+    With a delay, the worker waits that long after the first job comes in so jobs arriving close together get merged.
+    Callbacks, and the optional virtual event, are run on the Tk thread once a job finishes."""
+    _poll_interval = 50
+    __slots__ = "root", "delay", "event", "_jobs", "_condition", "_results", "_busy", "_flushing", "_stopped", \
+                "_after_id", "_thread"
+
+    def __init__(self, name: str, delay: float = 0, event: str = None, root=None):
+        self.root = root
+        self.delay = delay
+        self.event = event
+
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._results = queue.SimpleQueue()
+        self._busy = False
+        self._flushing = False
+        self._stopped = False
+        self._after_id = None
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def set_root(self, root) -> None:
+        """Sets the Tk window the callbacks are run on."""
+        self.root = root
+
+    def submit(self, key, func, *args, callback=None) -> None:
+        """Queues func(*args) to be run on the worker, callback(result) is called on the Tk thread after."""
+        with self._condition:
+            self._jobs.pop(key, None)
+            self._jobs[key] = (func, args, callback)
+            self._condition.notify_all()
+        self._schedule_poll()
+
+    def cancel(self, key) -> bool:
+        """Removes a job that hasn't started yet. Returns False if there was no job waiting."""
+        with self._condition:
+            return self._jobs.pop(key, None) is not None
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until every submitted job has finished, then runs their callbacks.
+        Returns False if the timeout ran out first."""
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+            done = self._condition.wait_for(lambda: not self._jobs and not self._busy, timeout)
+            self._flushing = False
+        self._poll()
+        return done
+
+    def stop(self) -> None:
+        """Finishes the jobs that are waiting and ends the thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._jobs or self._stopped)
+                if not self._jobs:
+                    return
+                deadline = time.monotonic() + self.delay
+                while not self._flushing and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                key = next(iter(self._jobs))
+                func, args, callback = self._jobs.pop(key)
+                self._busy = True
+            try:
+                self._results.put((callback, func(*args), None))
+            except Exception as e:
+                self._results.put((callback, None, e))
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def _schedule_poll(self) -> None:
+        if self.root is None or self._after_id is not None:
+            return
+        try:
+            self._after_id = self.root.after(self._poll_interval, self._poll)
+        except tk.TclError:
+            # The window has been destroyed
+            self._after_id = None
+
+    def _poll(self) -> None:
+        """Runs the callbacks of the finished jobs, and keeps polling while there are jobs left."""
+        if self._after_id is not None and self.root is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+        self._after_id = None
+        with self._condition:
+            working = bool(self._jobs) or self._busy
+        finished = False
+        while True:
+            try:
+                callback, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            finished = True
+            if error is not None:
+                traceback.print_exception(type(error), error, error.__traceback__)
+            elif callback is not None:
+                callback(result)
+        if finished and self.event and self.root is not None:
+            try:
+                self.root.event_generate(self.event, when="tail")
+            except tk.TclError:
+                pass
+        if working:
+            self._schedule_poll()
@@ -18,7 +18,9 @@ from Scripts.data_model import DataHandler, LoginHandler
 from Scripts.style_manager import StyleManager
 from Scripts.login_page import LoginPage
 from Scripts.alert_system import AlertSystem
+from Scripts.spell_checker import get_spell_checker
 from Scripts.settings_page import SettingsPage
+from Scripts.background_images import BackgroundImages
 
 
 class Journal:
@@ -26,7 +28,7 @@ class Journal:
     _path_to_py_exe = sys.executable
     __slots__ = "data_handler", "theme_path", "theme", "login_handler", "root", "title", "search_engine", \
                 "alert_system", "main_layout", "login_page", "canvas", "menubar", "settings_page", "style", \
-                "style_manager", "pack_settings", "export_page", "import_page"
+                "style_manager", "pack_settings", "export_page", "import_page", "background_images"
 
     def __init__(self, title: str, root):
         self.data_handler = DataHandler()
@@ -40,6 +42,8 @@ class Journal:
         self.root.wm_iconbitmap(default=ICON_IMG_ICO)
         self.root.iconify()
         self.root.deiconify()
+        # Resizes the backgrounds on its workers for every login
+        self.background_images = BackgroundImages(self.root)
 
         self.title = title
         self.search_engine = None
@@ -185,9 +189,11 @@ class Journal:
             self.main_layout.notebook.close_tabs(log_out=True)
             self.data_handler.set_last_category(self.main_layout.category_box.get())
             self.data_handler.update_json()
+            self.style_manager.dump_style()
+            # Waits for the saves to finish
+            self.data_handler.close_storage()
             self.data_handler.cancel_backup()
             self.alert_system.cancel_after()
-            self.style_manager.dump_style()
             self.canvas.pack_forget()
             menus = self.find_widgets("Menu")
             for i in menus:
@@ -208,6 +214,7 @@ class Journal:
             self.data_handler.set_last_category(self.main_layout.category_box.get())
             self.data_handler.update_json()
             self.style_manager.dump_style()
+            self.data_handler.close_storage()
             self.root.destroy()
 
     def _on_restart(self) -> None:
@@ -216,6 +223,7 @@ class Journal:
         self.data_handler.set_last_category(self.main_layout.category_box.get())
         self.data_handler.update_json()
         self.style_manager.dump_style()
+        self.data_handler.close_storage()
 
     def _on_clearing(self) -> None:
         """Clears the database for the selected user."""
@@ -256,6 +264,10 @@ class Journal:
         self.root.minsize(width=800, height=550)
         self.root.bind("<<AutoBackupRun>>", lambda event=None: self.main_layout.notebook.save_text())
         self.root.bind("<Control-f>", lambda event=None: self.search_engine.create_view())
+        self.data_handler.save_worker.set_root(self.root)
+        self.data_handler.search_worker.set_root(self.root)
+        get_spell_checker().worker.set_root(self.root)
+        self.data_handler.load_spelling(get_spell_checker())
 
         # Create the style manager class
         self.style_manager = StyleManager(self, self.root, self.data_handler.current_user, self.theme)
@@ -267,7 +279,8 @@ class Journal:
         self.data_handler.create_backup_system(self.root, self.alert_system)
 
         # Creates a background canvas for everything to be drawn to on top
-        self.canvas = BackGround(self.root, heigh=SCREEN_HEIGHT, width=SCREEN_WIDTH, highlightthickness=0, bd=0)
+        self.canvas = BackGround(self.root, self.background_images, heigh=SCREEN_HEIGHT, width=SCREEN_WIDTH,
+                                 highlightthickness=0, bd=0)
 
         # Create the file menu
         self.create_file_menu(self.root)
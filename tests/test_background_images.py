@@ -0,0 +1,30 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import os
+import pytest
+from PIL import Image
+from Scripts.background_images import BackgroundImages
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    monkeypatch.setattr(BackgroundImages, "_cache_path", str(tmp_path / "cache"))
+    return BackgroundImages()
+
+
+def test_prune_cache_removes_copies_of_deleted_images(images, tmp_path):
+    paths = []
+    for color in ("red", "blue"):
+        path = str(tmp_path / f"{color}.png")
+        Image.new("RGB", (2000, 1200), color).save(path)
+        images.resize(path, (300, 200))
+        images.thumbnail(path)
+        paths.append(path)
+    kept = images._hashes[paths[1]][1]
+    writing = os.path.join(BackgroundImages._cache_path, "ff-2.jpg.1234.tmp")
+    open(writing, "w").close()
+    os.remove(paths[0])
+    images._prune_cache(paths[1:])
+    left = os.listdir(BackgroundImages._cache_path)
+    assert sorted(left) == sorted([f"{kept}-2.jpg", f"{kept}-4.jpg", f"{kept}-thumb.jpg", os.path.basename(writing)])
+    assert paths[0] not in images._hashes and paths[0] not in images._pyramids
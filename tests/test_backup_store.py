@@ -0,0 +1,119 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import os
+import time
+import pytest
+import Scripts.utils as utils
+from Scripts.backup_store import BackupStore
+
+PASSES = 3
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(str(tmp_path), PASSES)
+
+
+def save(store: BackupStore, name: str, data: dict, age: float = 0) -> str:
+    """Saves a backup and dates it age seconds back."""
+    path = os.path.join(store.folder, name)
+    store.save(path, data)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def objects(store: BackupStore) -> set:
+    return {digest for prefix in os.listdir(store.objects_folder)
+            for digest in os.listdir(os.path.join(store.objects_folder, prefix))}
+
+
+def test_save_and_load(store):
+    data = {"Food": {"apple": ["red", 1], "pear": ["green", 2]}, "Empty": {}}
+    path = save(store, "one.json", data)
+    manifest, header = utils.read_encoded(path, PASSES)
+    assert store.is_manifest(header)
+    assert sorted(header["objects"]) == sorted(objects(store))
+    assert store.load(manifest) == (data, True)
+
+
+def test_same_definitions_are_saved_once(store):
+    save(store, "one.json", {"A": {"x": 1, "y": 2}})
+    save(store, "two.json", {"B": {"x": 1, "z": 3}})
+    assert len(objects(store)) == 3
+
+
+def test_load_with_a_missing_object(store):
+    path = save(store, "one.json", {"A": {"x": 1}})
+    manifest, _ = utils.read_encoded(path, PASSES)
+    for digest in objects(store):
+        os.remove(store._object_path(digest))
+    assert store.load(manifest) == ({}, False)
+
+
+def test_collect_garbage_keeps_objects_in_use(store):
+    first = save(store, "one.json", {"A": {"x": 1, "y": 2}})
+    save(store, "two.json", {"A": {"x": 1, "z": 3}})
+    os.remove(first)
+    assert store.collect_garbage() == 1
+    manifest, _ = utils.read_encoded(os.path.join(store.folder, "two.json"), PASSES)
+    assert store.load(manifest) == ({"A": {"x": 1, "z": 3}}, True)
+
+
+def test_collect_garbage_skips_backups_that_are_not_manifests(store):
+    save(store, "one.json", {"A": {"x": 1}})
+    # An old style backup, an auto backup and a broken file
+    utils.dump_json(os.path.join(store.folder, "legacy.json"), "not a manifest")
+    utils.dump_encoded(os.path.join(store.folder, "auto.json"), {"A": {"y": 2}}, PASSES, header={"generation": 1})
+    with open(os.path.join(store.folder, "broken.json"), "wb") as file:
+        file.write(utils.CODEC_MAGIC + bytes([utils.CODEC_VERSION]) + b"garbage")
+    os.makedirs(os.path.join(store.objects_folder, "ff"))
+    with open(os.path.join(store.objects_folder, "ff", "ff00"), "wb"):
+        pass
+    assert store.collect_garbage() == 1
+    assert len(objects(store)) == 1
+
+
+def test_prune_only_removes_manifests(store):
+    day = 24 * 60 * 60
+    # Each in its own week, so the rule keeping the most periods decides how many are kept
+    paths = [save(store, f"manual-{index}.json", {"A": {"x": index}}, age=index * 8 * day) for index in range(40)]
+    kept = max([store._keep_last] + [amount for _, amount in store._keep_periods])
+    legacy = os.path.join(store.folder, "legacy.json")
+    utils.dump_json(legacy, "old backup")
+    auto = os.path.join(store.folder, "auto.json")
+    utils.dump_encoded(auto, {"A": {}}, PASSES, header={"generation": 1})
+    with open(auto + ".delta", "wb"):
+        pass
+    for path in (legacy, auto):
+        stamp = time.time() - 400 * day
+        os.utime(path, (stamp, stamp))
+    removed = store.prune(keep={paths[-1]})
+    assert removed == paths[kept:-1]
+    assert all(os.path.isfile(path) for path in (legacy, auto, auto + ".delta", paths[-1]))
+    assert store.collect_garbage() == len(removed)
+
+
+def test_each_backup_has_its_own_index(store):
+    first = save(store, "1-manual-bob.json", {"A": {"x": 1, "y": 2}, "B": {}})
+    second = save(store, "2-auto-bob.json", {"A": {"x": 1}})
+    store.index_backup(first, {"A": 2, "B": 0})
+    before = os.path.getmtime(first + ".index")
+    store.index_backup(second, {"A": 1})
+    assert os.path.getmtime(first + ".index") == before
+    entries = store.entries()
+    assert entries["1-manual-bob.json"]["summary"] == {"A": 2, "B": 0}
+    assert entries["1-manual-bob.json"]["entries"] == 2
+    assert entries["2-auto-bob.json"]["kind"] == "auto"
+    os.remove(second + ".index")
+    assert "summary" not in store.entries()["2-auto-bob.json"]
+
+
+def test_prune_removes_the_index(store):
+    day = 24 * 60 * 60
+    paths = [save(store, f"manual-{index}.json", {"A": {"x": index}}, age=index * 8 * day) for index in range(30)]
+    for path in paths:
+        store.index_backup(path, {"A": 1})
+    for path in store.prune():
+        assert not os.path.exists(path + ".index")
+    assert len(store.entries()) == len([name for name in os.listdir(store.folder) if name.endswith(".index")])
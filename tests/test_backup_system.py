@@ -0,0 +1,78 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import json
+import os
+import pytest
+import Scripts.utils as utils
+from Scripts.backup_system import BackUpSystem
+from Scripts.data_model import DataHandler
+
+PASSES = 3
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(DataHandler, "_users_folder_path", str(tmp_path / "Users"))
+    monkeypatch.setattr(DataHandler, "_path_to_config_directory", str(tmp_path / "Config"))
+    monkeypatch.setattr(DataHandler, "_path_to_theme_config", str(tmp_path / "Config" / "theme.json"))
+    monkeypatch.setattr(BackUpSystem, "_main_directory", str(tmp_path / "Back Ups"))
+    os.makedirs(tmp_path / "Users" / "bob")
+    data_handler = DataHandler()
+    data_handler.setup_database("bob", "", PASSES)
+    data_handler.add_category("Food", "")
+    data_handler.add_definition("apple", "Food", None)
+    yield data_handler
+    data_handler.close_storage()
+
+
+@pytest.fixture
+def backups(handler, tmp_path):
+    backup_system = BackUpSystem(None, handler, None)
+    handler.backup_sys = backup_system
+    backup_system.save_path = str(tmp_path / "Back Ups" / "auto.json")
+    backup_system.data_passes = PASSES
+    backup_system.backup_user("bob", handler.data, PASSES, auto=True)
+    handler.save_worker.flush()
+    return backup_system
+
+
+def loaded(backups: BackUpSystem) -> str:
+    data, check = backups.load_backup(backups.save_path)
+    assert check
+    return json.dumps(data)
+
+
+def test_deltas_are_replayed_on_top_of_the_base(handler, backups):
+    # Big enough that the deltas don't add up to half of it
+    backups._base_size = 1024 * 1024
+    for index in range(5):
+        handler.add_text("Food", "apple", f"edit {index}")
+        handler.add_definition(f"pear {index}", "Food", None)
+        backups._backup_changes(handler.data)
+        handler.save_worker.flush()
+        assert loaded(backups) == json.dumps(handler.data)
+    assert len(utils.read_records(backups.save_path + backups._delta_extension, PASSES)) == 5
+
+
+def test_nothing_changed_skips_the_delta(handler, backups):
+    backups._backup_changes(handler.data)
+    handler.save_worker.flush()
+    assert not os.path.getsize(backups.save_path + backups._delta_extension)
+
+
+def test_rebase_drops_the_deltas_that_were_waiting(handler, backups):
+    handler.add_text("Food", "apple", "waiting")
+    backups._backup_changes(handler.data)
+    handler.add_text("Food", "apple", "in the base")
+    backups._delta_records = backups._rebase_records
+    # The delta hasn't been written yet when all the data is saved again
+    backups._backup_changes(handler.data)
+    handler.add_definition("pear", "Food", None)
+    backups._backup_changes(handler.data)
+    handler.save_worker.flush()
+    _, header = utils.read_encoded(backups.save_path, PASSES)
+    records = utils.read_records(backups.save_path + backups._delta_extension, PASSES)
+    assert [generation for generation, _ in records] == [handler.generation]
+    assert all(generation > header["generation"] for generation, _ in records)
+    assert loaded(backups) == json.dumps(handler.data)
+    assert backups._waiting_deltas == set()
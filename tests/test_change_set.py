@@ -0,0 +1,103 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+from Scripts.change_set import ChangeSet, apply_operations, copy_data
+from Scripts.ordered_map import OrderedMap
+
+
+def values(text: str) -> list:
+    return [text, "2022-05-01", ["Arial", 12], "text"]
+
+
+def sample() -> OrderedMap:
+    return OrderedMap(Food=OrderedMap((f"d{index}", values(f"food {index}")) for index in range(3)),
+                      Work=OrderedMap(notes=values("work")))
+
+
+def replayed(before: OrderedMap, changes: ChangeSet, after: OrderedMap) -> OrderedMap:
+    """Applies the operations collected from the changes to a copy of the data before them."""
+    data = OrderedMap(copy_data(before))
+    apply_operations(data, changes.collect(after))
+    return data
+
+
+def test_nothing_marked_is_empty():
+    changes = ChangeSet()
+    assert changes.is_empty()
+    assert changes.collect(sample()) == []
+
+
+def test_put_and_delete():
+    before, data = sample(), sample()
+    changes = ChangeSet()
+    data["Food"]["d1"][0] = "changed"
+    changes.mark_entry("Food", "d1")
+    del data["Food"]["d0"]
+    changes.mark_entry("Food", "d0")
+    operations = changes.collect(data)
+    assert sorted(operations) == [("delete", "Food", "d0"), ("put", "Food", "d1", values("changed"), 1.0)]
+    assert replayed(before, changes, data) == data
+
+
+def test_collected_values_are_copies():
+    data = sample()
+    changes = ChangeSet()
+    changes.mark_entry("Food", "d1")
+    operations = changes.collect(data)
+    data["Food"]["d1"][0] = "changed later"
+    assert operations[0][3][0] == "food 1"
+
+
+def test_moves_and_orders():
+    before, data = sample(), sample()
+    changes = ChangeSet()
+    data["Food"].move("d2", 0)
+    changes.mark_position("Food", "d2")
+    data["Work"]["todo"] = values("todo")
+    data["Work"].set_order(["todo", "notes"])
+    changes.mark_entry("Work", "todo")
+    changes.mark_order("Work")
+    operations = changes.collect(data)
+    assert ("position", "Food", "d2", data["Food"].position("d2")) in operations
+    assert ("order", "Work", ["todo", "notes"], [0.0, 1.0]) in operations
+    result = replayed(before, changes, data)
+    assert list(result["Food"]) == ["d2", "d0", "d1"]
+    assert list(result["Work"]) == ["todo", "notes"]
+
+
+def test_renamed_category_keeps_its_changes():
+    before, data = sample(), sample()
+    changes = ChangeSet()
+    data["Food"]["d1"][0] = "changed"
+    changes.mark_entry("Food", "d1")
+    data.rename("Food", "Meals")
+    changes.rename_category("Food", "Meals")
+    operations = changes.collect(data)
+    assert operations[0] == ("rename", "Food", "Meals")
+    assert ("put", "Meals", "d1", values("changed"), 1.0) in operations
+    assert operations[-1] == ("categories", ["Meals", "Work"])
+    assert replayed(before, changes, data) == data
+
+
+def test_dropped_category_forgets_its_changes():
+    before, data = sample(), sample()
+    changes = ChangeSet()
+    changes.mark_entry("Food", "d1")
+    changes.mark_order("Food")
+    del data["Food"]
+    changes.drop_category("Food")
+    assert changes.dirty_categories() == set()
+    assert changes.collect(data) == [("drop", "Food"), ("categories", ["Work"])]
+    assert replayed(before, changes, data) == data
+
+
+def test_reset_collects_all_the_data():
+    data = sample()
+    changes = ChangeSet()
+    changes.mark_entry("Food", "d1")
+    changes.mark_reset()
+    operations = changes.collect(data)
+    assert len(operations) == 1 and operations[0][0] == "reset"
+    assert operations[0][1] == data
+    assert operations[0][1]["Food"] is not data["Food"]
+    changes.clear()
+    assert changes.is_empty()
@@ -0,0 +1,179 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import random
+import pytest
+from Scripts.ordered_map import OrderedMap, _PositionList
+
+
+def check_positions(ordered: OrderedMap) -> None:
+    """The keys come out sorted by position and each key's index matches where it is."""
+    keys = list(ordered)
+    positions = [ordered.position(key) for key in keys]
+    assert positions == sorted(positions)
+    assert sorted(keys) == sorted(dict.keys(ordered))
+    for index, key in enumerate(keys):
+        assert ordered._index(key) == index
+    assert list(reversed(ordered)) == keys[::-1]
+
+
+def test_keeps_the_order_keys_were_added():
+    ordered = OrderedMap()
+    for key in "cab":
+        ordered[key] = key.upper()
+    assert list(ordered) == ["c", "a", "b"]
+    assert list(ordered.items()) == [("c", "C"), ("a", "A"), ("b", "B")]
+    assert [ordered.position(key) for key in ordered] == [0.0, 1.0, 2.0]
+
+
+def test_insert_first_and_place():
+    ordered = OrderedMap(a=1, b=2)
+    ordered.insert_first("z", 0)
+    assert list(ordered) == ["z", "a", "b"]
+    assert ordered.position("z") == -1.0
+    ordered.place("m", 5, 0.5)
+    assert list(ordered) == ["z", "a", "m", "b"]
+    check_positions(ordered)
+
+
+def test_keys_sharing_a_position_keep_the_order_they_were_placed():
+    ordered = OrderedMap()
+    for key in "abc":
+        ordered.place(key, None, 1.0)
+    assert list(ordered) == ["a", "b", "c"]
+    del ordered["b"]
+    assert list(ordered) == ["a", "c"]
+    check_positions(ordered)
+
+
+def test_move_only_changes_the_moved_key():
+    ordered = OrderedMap((key, None) for key in "abcde")
+    before = {key: ordered.position(key) for key in ordered}
+    assert ordered.move("e", 1)
+    assert list(ordered) == ["a", "e", "b", "c", "d"]
+    assert ordered.position("e") == 0.5
+    assert all(ordered.position(key) == position for key, position in before.items() if key != "e")
+    assert ordered.move("a", 10)
+    assert list(ordered) == ["e", "b", "c", "d", "a"]
+
+
+def test_move_renumbers_when_there_is_no_room():
+    ordered = OrderedMap()
+    ordered.place("a", None, 0.0)
+    ordered.place("b", None, 5e-324)
+    ordered.place("c", None, 1.0)
+    assert not ordered.move("c", 1)
+    assert list(ordered) == ["a", "c", "b"]
+    assert [ordered.position(key) for key in ordered] == [0.0, 1.0, 2.0]
+
+
+def test_rename_keeps_the_position():
+    ordered = OrderedMap((key, key) for key in "abc")
+    ordered.rename("b", "x")
+    assert list(ordered.items()) == [("a", "a"), ("x", "b"), ("c", "c")]
+    assert ordered.position("x") == 1.0
+    assert "b" not in ordered
+    check_positions(ordered)
+
+
+def test_pop_popitem_and_clear():
+    ordered = OrderedMap((key, key) for key in "abc")
+    assert ordered.pop("a") == "a"
+    assert ordered.pop("a", None) is None
+    assert ordered.popitem() == ("c", "c")
+    ordered.clear()
+    assert list(ordered) == []
+    with pytest.raises(KeyError):
+        ordered.popitem()
+
+
+def test_copy_keeps_positions():
+    ordered = OrderedMap()
+    ordered.place("a", 1, 3.0)
+    ordered.place("b", 2, -2.0)
+    copy = ordered.copy(lambda value: value * 10)
+    assert list(copy.items()) == [("b", 20), ("a", 10)]
+    assert copy.position("a") == 3.0
+
+
+def test_from_positions():
+    ordered = OrderedMap.from_positions([("a", 1), ("b", 2), ("c", 3)], [2.0, 0.0, 1.0])
+    assert list(ordered) == ["b", "c", "a"]
+
+
+def test_set_order_puts_missing_keys_after():
+    ordered = OrderedMap((key, None) for key in "abcd")
+    ordered.set_order(["d", "b", "x"])
+    assert list(ordered) == ["d", "b", "a", "c"]
+    assert [ordered.position(key) for key in ordered] == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_reorder_only_moves_keys_out_of_place():
+    ordered = OrderedMap((key, None) for key in "abcdef")
+    before = {key: ordered.position(key) for key in ordered}
+    moved = ordered.reorder(["b", "c", "a", "d", "f", "e"])
+    assert list(ordered) == ["b", "c", "a", "d", "f", "e"]
+    assert len(moved) == 2
+    for key in set(before) - set(moved):
+        assert ordered.position(key) == before[key]
+    check_positions(ordered)
+
+
+def test_reorder_with_different_keys_renumbers():
+    ordered = OrderedMap((key, None) for key in "abc")
+    assert ordered.reorder(["c", "a"]) is None
+    assert list(ordered) == ["c", "a", "b"]
+
+
+def test_longest_increasing():
+    assert OrderedMap._longest_increasing([3, 0, 1, 4, 2]) == {1, 2, 4}
+    assert OrderedMap._longest_increasing([]) == set()
+
+
+def test_matches_a_list_over_many_changes():
+    # Enough keys to split the position list into several buckets
+    randomizer = random.Random(8)
+    ordered = OrderedMap()
+    expected = []
+    for step in range(6000):
+        action = randomizer.random()
+        if action < 0.4 or not expected:
+            key = f"key{step}"
+            if randomizer.random() < 0.5:
+                ordered[key] = step
+                expected.append(key)
+            else:
+                ordered.insert_first(key, step)
+                expected.insert(0, key)
+        elif action < 0.6:
+            key = expected.pop(randomizer.randrange(len(expected)))
+            del ordered[key]
+        elif action < 0.9:
+            key = expected.pop(randomizer.randrange(len(expected)))
+            index = randomizer.randrange(len(expected) + 1)
+            ordered.move(key, index)
+            expected.insert(index, key)
+        else:
+            index = randomizer.randrange(len(expected))
+            new_key = f"renamed{step}"
+            ordered.rename(expected[index], new_key)
+            expected[index] = new_key
+    assert list(ordered) == expected
+    assert len(ordered) == len(expected)
+    check_positions(ordered)
+
+
+def test_position_list_indexes():
+    entries = [(float(index), index, index) for index in range(1000)]
+    positions = _PositionList(entries[::2])
+    for entry in entries[1::2]:
+        positions.add(entry)
+    assert list(positions) == entries
+    assert positions[0] == entries[0] and positions[-1] == entries[-1]
+    assert all(positions[index] == entry for index, entry in enumerate(entries))
+    assert all(positions.index(entry) == index for index, entry in enumerate(entries))
+    for entry in entries[:600]:
+        positions.remove(entry)
+    assert list(positions) == entries[600:]
+    assert positions[0] == entries[600]
+    with pytest.raises(IndexError):
+        positions[400]
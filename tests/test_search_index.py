@@ -0,0 +1,162 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import datetime
+import json
+import math
+import pytest
+from Scripts.search_index import SearchIndex, TrigramIndex, trigrams
+from Scripts.search_query import parse
+
+DATA = {"Food": {"Apple pie": ["Bake the apples with sugar.", "2022-05-01", None, "text"],
+                 "Pear jam": ["Cook pears slowly, add sugar.", "2022-05-03", None, "text"]},
+        "Work": {"Meeting notes": ["The apple account is due friday.", "2022-06-10", None, "text"],
+                 "Todo": ["Call the bakery.", "2022-06-11", None, "list"]}}
+
+
+def categories(data: dict) -> list:
+    return [(category, [(definition, values[0], values[1], values[3]) for definition, values in definitions.items()])
+            for category, definitions in data.items()]
+
+
+def built(data: dict = DATA) -> SearchIndex:
+    index = SearchIndex(lambda category: data.get(category, {}))
+    index.build(categories(data))
+    return index
+
+
+def reloaded(index: SearchIndex, data: dict = DATA) -> SearchIndex:
+    """Saves the index like the file does and loads it into a new one."""
+    saved = json.loads(json.dumps(index.export()))
+    other = SearchIndex(lambda category: data.get(category, {}))
+    other.load(saved)
+    return other
+
+
+def test_export_leaves_out_the_text():
+    saved = json.dumps(built().export())
+    assert "sugar" in saved
+    assert "Bake the apples" not in saved
+    assert "Call the bakery" not in saved
+
+
+def test_loaded_index_searches_like_the_built_one():
+    index = built()
+    other = reloaded(index)
+    for query in ("apple", "sugar", "pie", "cat:work", "type:list", "date:2022-06", "apple NOT cat:food"):
+        assert other.query(parse(query)) == index.query(parse(query)), query
+    assert other.search("sugar") == index.search("sugar")
+    assert not other.changed
+
+
+def test_scans_look_up_the_text_of_a_loaded_index():
+    asked = []
+    other = reloaded(built())
+    other.text_source = lambda category: asked.append(category) or DATA[category]
+    assert other.query(parse('"with sugar"')) == [("Food", "Apple pie")]
+    assert asked == ["Food"]
+    assert other.query(parse("/due \\w+day/")) == [("Work", "Meeting notes")]
+    # The text found by a scan is kept, so searching again doesn't look it up
+    asked.clear()
+    found = other.query(parse("/due \\w+day/ OR \"with sugar\""))
+    assert sorted(found) == [("Food", "Apple pie"), ("Work", "Meeting notes")]
+    assert asked == []
+
+
+def test_loaded_index_can_be_changed():
+    other = reloaded(built())
+    other.update("Food", "Apple pie", "Now with pears.", "2022-07-01", "text")
+    other.remove("Work", "Meeting notes")
+    assert other.query(parse("apple")) == [("Food", "Apple pie")]
+    assert sorted(other.query(parse("pear"))) == [("Food", "Apple pie"), ("Food", "Pear jam")]
+    assert other.query(parse("account")) == []
+    assert other.changed
+
+
+def test_trigrams_pad_the_text():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+    assert trigrams("") == {"   "}
+
+
+def test_trigram_substring_puts_texts_starting_with_it_first():
+    titles = TrigramIndex()
+    for key, text in enumerate(("Apple pie", "Pineapple", "Crab apple jelly", "Pear")):
+        titles.add(key, text)
+    assert titles.substring("APPLE") == [0, 1, 2]
+    # Too short for three letters
+    assert titles.substring("pi") == [1, 0]
+    assert titles.substring("e")[0] == 3
+    assert sorted(titles.substring("e")) == [0, 1, 2, 3]
+    assert titles.substring("plum") == []
+    assert titles.substring("") == []
+
+
+def test_trigram_add_again_and_remove():
+    titles = TrigramIndex()
+    titles.add("a", "Apple pie")
+    titles.add("a", "Pear jam")
+    assert titles.substring("apple") == []
+    assert titles.substring("jam") == ["a"]
+    titles.remove("a")
+    titles.remove("missing")
+    assert len(titles) == 0
+    assert titles._grams == {}
+
+
+def test_trigram_similar_finds_typos_closest_first():
+    titles = TrigramIndex()
+    for key, text in enumerate(("Meeting notes", "Meeting", "Shopping list")):
+        titles.add(key, text)
+    found = titles.similar("meting")
+    assert [key for key, _ in found] == [1, 0]
+    assert found[0][1] > found[1][1]
+    assert titles.similar("zzzz") == []
+    assert len(titles.similar("meeting", limit=1)) == 1
+
+
+def ranked(texts: dict, query: str, days: dict = None) -> list:
+    """Builds an index of one category with the definitions named a, b, c... and searches it."""
+    days = days or {}
+    data = {"Notes": {name: [text, days.get(name, "2000-01-01"), None, "text"] for name, text in texts.items()}}
+    return [definition for _, definition in built(data).search(query)]
+
+
+def test_bm25_ranks_by_how_often_the_word_is_in_the_text():
+    assert ranked({"a": "kiwi bird", "b": "kiwi kiwi kiwi bird", "c": "bird"}, "kiwi") == ["b", "a"]
+
+
+def test_bm25_ranks_shorter_texts_higher():
+    assert ranked({"a": "kiwi " + "word " * 20, "b": "kiwi word", "c": "other"}, "kiwi") == ["b", "a"]
+
+
+def test_bm25_rare_words_count_more():
+    texts = {"a": "kiwi walrus", "b": "kiwi kiwi", "c": "kiwi", "d": "kiwi"}
+    assert ranked(texts, "kiwi walrus") == ["a"]
+    index = built({"Notes": {name: [text, "2000-01-01", None, "text"] for name, text in texts.items()}})
+    kiwi, walrus = index._bm25("kiwi"), index._bm25("walrus")
+    document = index._ids[("Notes", "a")]
+    assert walrus[document] > kiwi[document]
+
+
+def test_bm25_score():
+    index = built({"Notes": {"a": ["kiwi kiwi bird", "2000-01-01", None, "text"],
+                             "b": ["bird", "2000-01-01", None, "text"]}})
+    document = index._ids[("Notes", "a")]
+    # The names are words too: a is 4 words long and b is 2, 3 on average
+    count, length, average = 2, 4, 3
+    idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * count * (SearchIndex._k1 + 1) / (
+        count + SearchIndex._k1 * (1 - SearchIndex._b + SearchIndex._b * length / average))
+    assert index._bm25("kiwi") == {document: pytest.approx(expected)}
+
+
+def test_search_needs_every_word_which_can_be_the_start_of_one():
+    texts = {"a": "kiwis walrus", "b": "kiwi", "c": "walrus"}
+    assert ranked(texts, "kiw walr") == ["a"]
+    assert sorted(ranked(texts, "kiw")) == ["a", "b"]
+
+
+def test_recent_definitions_rank_higher():
+    today = datetime.date.today().isoformat()
+    texts = {"a": "kiwi bird", "b": "kiwi bird"}
+    assert ranked(texts, "kiwi", {"b": today}) == ["b", "a"]
+    assert ranked(texts, "kiwi", {"a": today}) == ["a", "b"]
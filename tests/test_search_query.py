@@ -0,0 +1,74 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import datetime
+import pytest
+from Scripts.search_query import day_range, highlight_text, is_simple, parse
+
+
+def day(text: str) -> int:
+    return datetime.date.fromisoformat(text).toordinal()
+
+
+def test_words_are_joined_with_and():
+    assert parse("apple") == ("word", None, "apple")
+    assert parse("apple  pie") == ("and", [("word", None, "apple"), ("word", None, "pie")])
+    assert parse("apple AND pie") == parse("apple pie")
+
+
+def test_or_binds_looser_than_and():
+    assert parse("a b OR c") == ("or", [("and", [("word", None, "a"), ("word", None, "b")]), ("word", None, "c")])
+    assert parse("a (b OR c)") == ("and", [("word", None, "a"), ("or", [("word", None, "b"), ("word", None, "c")])])
+
+
+def test_not_and_minus():
+    assert parse("NOT apple") == ("not", ("word", None, "apple"))
+    assert parse("-apple") == ("not", ("word", None, "apple"))
+    assert parse("pie -title:apple") == ("and", [("word", None, "pie"), ("not", ("word", "title", "apple"))])
+    # Lowercase keywords are words
+    assert parse("or") == ("word", None, "or")
+
+
+def test_fields():
+    assert parse("name:apple") == ("word", "title", "apple")
+    assert parse('text:"apple pie"') == ("phrase", "body", "apple pie")
+    assert parse('cat:"Food Stuff"') == ("cat", "Food Stuff")
+    assert parse("type:LIST") == ("type", "list")
+    assert parse("date:2022") == ("date", day("2022-01-01"), day("2022-12-31"))
+    # Not a field, so it's searched for as written
+    assert parse("note:apple") == ("phrase", None, "note:apple")
+
+
+def test_regex():
+    node = parse(r"body:/due \w+day/")
+    assert node[:2] == ("regex", "body")
+    assert node[2].search("Due Friday")
+    assert not node[2].search("due 5")
+
+
+@pytest.mark.parametrize("text", ["", "(apple", "apple)", "type:todo", "/[a/", "date:2022-13", 'apple "pie'])
+def test_bad_searches_raise_value_error(text):
+    with pytest.raises(ValueError):
+        parse(text)
+
+
+def test_day_range():
+    assert day_range("2022-05") == (day("2022-05-01"), day("2022-05-31"))
+    assert day_range("2024-02") == (day("2024-02-01"), day("2024-02-29"))
+    assert day_range("2022-05-03") == (day("2022-05-03"), day("2022-05-03"))
+    assert day_range("2022-01..2022-03") == (day("2022-01-01"), day("2022-03-31"))
+    assert day_range("2022-01..") == (day("2022-01-01"), datetime.date.max.toordinal())
+    assert day_range("..2022") == (datetime.date.min.toordinal(), day("2022-12-31"))
+    assert day_range(">2022-05") == (day("2022-06-01"), datetime.date.max.toordinal())
+    assert day_range(">=2022-05") == (day("2022-05-01"), datetime.date.max.toordinal())
+    assert day_range("<2022-05") == (datetime.date.min.toordinal(), day("2022-04-30"))
+    assert day_range("<=2022-05-03") == (datetime.date.min.toordinal(), day("2022-05-03"))
+    for text in ("may", "2022-05-03-01", "2022-02-30"):
+        with pytest.raises(ValueError):
+            day_range(text)
+
+
+def test_is_simple_and_highlight_text():
+    assert is_simple(parse("apple pie"))
+    assert not is_simple(parse("apple OR pie"))
+    assert not is_simple(parse("title:apple"))
+    assert highlight_text(parse('apple "pie crust" title:pear -plum cat:Food')) == "apple pie crust"
@@ -0,0 +1,174 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import os
+import pytest
+import Scripts.utils as utils
+from Scripts.ordered_map import OrderedMap
+from Scripts.storage import STORAGE_TYPES, JsonStorage, SQLiteStorage
+
+PASSES = 3
+
+
+def values(text: str) -> list:
+    return [text, "2022-05-01", ["Arial", 12], "text"]
+
+
+def sample() -> dict:
+    return {"Food": OrderedMap((f"d{index}", values(f"food {index}")) for index in range(3)),
+            "Work": OrderedMap(notes=values("work")),
+            "Empty": OrderedMap()}
+
+
+def plain(data) -> dict:
+    """The data as plain dicts and lists, with the categories and definitions in order."""
+    return {category: [(definition, list(value)) for definition, value in definitions.items()]
+            for category, definitions in data.items()}
+
+
+def reopened(storage, folder):
+    storage.close()
+    other = type(storage)(str(folder), PASSES)
+    data, check = other.load()
+    assert check
+    return other, data
+
+
+@pytest.fixture(params=sorted(STORAGE_TYPES))
+def storage(request, tmp_path):
+    storage = STORAGE_TYPES[request.param](str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    yield storage
+    storage.close()
+
+
+def test_round_trip(storage, tmp_path):
+    storage.save([("put", "Food", "d1", values("changed"), 1.0),
+                  ("put", "Work", "todo", values("new"), 5.0),
+                  ("delete", "Food", "d0"),
+                  ("rename", "Work", "Job"),
+                  ("drop", "Empty"),
+                  ("position", "Food", "d2", 0.5),
+                  ("categories", ["Job", "Food"])])
+    storage, data = reopened(storage, tmp_path)
+    assert plain(data) == {"Job": [("notes", values("work")), ("todo", values("new"))],
+                           "Food": [("d2", values("food 2")), ("d1", values("changed"))]}
+    storage.close()
+
+
+def test_categories_are_loaded_when_used(storage, tmp_path):
+    storage, data = reopened(storage, tmp_path)
+    assert list(data) == ["Food", "Work", "Empty"]
+    assert not any(data.is_loaded(category) for category in data)
+    assert data.count("Food") == 3
+    assert list(data["Food"]) == ["d0", "d1", "d2"]
+    assert data.is_loaded("Food") and not data.is_loaded("Work")
+    storage.close()
+
+
+def test_order_keeps_positions(storage, tmp_path):
+    storage.save([("order", "Food", ["d2", "d0", "d1"], [-1.0, 0.0, 1.0])])
+    storage, data = reopened(storage, tmp_path)
+    assert [(d, data["Food"].position(d)) for d in data["Food"]] == [("d2", -1.0), ("d0", 0.0), ("d1", 1.0)]
+    storage.close()
+
+
+def test_remove_deletes_the_files(storage, tmp_path):
+    storage.remove()
+    assert not type(storage)(str(tmp_path), PASSES).exists()
+    assert os.listdir(tmp_path) == []
+
+
+def crash(storage: JsonStorage, folder) -> tuple[JsonStorage, dict]:
+    """Loads the files like after a crash, without the checkpoint closing would do."""
+    other = JsonStorage(str(folder), PASSES)
+    data, check = other.load()
+    assert check
+    return other, data
+
+
+def test_json_saves_go_to_the_log_and_are_replayed(tmp_path):
+    storage = JsonStorage(str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    storage.save([("put", "Food", "d1", values("one"), 1.0)])
+    storage.save([("put", "Work", "todo", values("two"), 2.0), ("rename", "Food", "Meals")])
+    assert len(utils.read_records(storage.log_path, PASSES)) == 2
+    other, data = crash(storage, tmp_path)
+    assert data["Meals"]["d1"] == values("one")
+    assert list(data["Work"]) == ["notes", "todo"]
+    # Loading the log checkpoints it
+    assert os.path.getsize(other.log_path) == 0
+    other.close()
+
+
+def test_json_drops_a_record_cut_off_by_a_crash(tmp_path):
+    storage = JsonStorage(str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    storage.save([("put", "Food", "d1", values("kept"), 1.0)])
+    storage.save([("put", "Food", "d2", values("cut off"), 2.0)])
+    with open(storage.log_path, "r+b") as file:
+        file.truncate(os.path.getsize(storage.log_path) - 3)
+    other, data = crash(storage, tmp_path)
+    assert data["Food"]["d1"] == values("kept")
+    assert data["Food"]["d2"] == values("food 2")
+    other.save([("put", "Food", "d0", values("after"), 0.0)])
+    other, data = crash(other, tmp_path)
+    assert data["Food"]["d0"] == values("after")
+    other.close()
+
+
+def test_json_only_decodes_saved_categories_at_the_checkpoint(tmp_path):
+    storage = JsonStorage(str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    storage.close()
+    storage, _ = crash(storage, tmp_path)
+    storage.save([("put", "Food", "d1", values("changed"), 1.0), ("delete", "Food", "d0")])
+    assert not storage.data.is_loaded("Food")
+    storage.save([("rename", "Food", "Meals"), ("put", "Meals", "d3", values("new"), 3.0)])
+    storage.close()
+    assert not any(storage.data.is_loaded(category) for category in storage.data)
+    storage, data = crash(storage, tmp_path)
+    assert plain(data)["Meals"] == [("d1", values("changed")), ("d2", values("food 2")), ("d3", values("new"))]
+    assert data.count("Meals") == 3
+    storage.close()
+
+
+def test_json_splits_up_a_legacy_database(tmp_path):
+    utils.dump_encoded(str(tmp_path / "database.json"), {"Food": {"apple": values("red")}}, PASSES)
+    storage = JsonStorage(str(tmp_path), PASSES)
+    data, check = storage.load()
+    assert check and plain(data) == {"Food": [("apple", values("red"))]}
+    assert not os.path.exists(tmp_path / "database.json")
+    assert os.path.isfile(storage.manifest_path)
+    storage.close()
+
+
+def test_json_reports_a_corrupt_category(tmp_path):
+    storage = JsonStorage(str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    storage.close()
+    path = storage._shard_path(storage.shards["Food"])
+    with open(path, "wb") as file:
+        file.write(utils.CODEC_MAGIC + bytes([utils.CODEC_VERSION]) + b"garbage")
+    storage, data = crash(storage, tmp_path)
+    assert len(data["Food"]) == 0
+    assert storage.take_problems() == ["Category Food has been corrupted."]
+    storage.save([("put", "Food", "new", values("new"), 0.0)])
+    storage.close()
+    assert os.path.isfile(path + ".corrupt")
+
+
+def test_sqlite_reports_a_corrupt_definition(tmp_path):
+    storage = SQLiteStorage(str(tmp_path), PASSES)
+    storage.load()
+    storage.save([("reset", sample())])
+    storage._connect().execute("UPDATE definitions SET text = 'not base64!' WHERE name = 'd1'")
+    storage._connect().commit()
+    storage, data = reopened(storage, tmp_path)
+    assert list(data["Food"]) == ["d0", "d2"]
+    assert storage.take_problems() == ["Definition d1 in Food has been corrupted."]
+    storage.close()
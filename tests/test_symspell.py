@@ -0,0 +1,78 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import random
+from Scripts.symspell import LRUCache, SymSpellIndex, deletes, edit_distance
+
+
+def test_lru_cache_drops_the_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.items() == [("a", 1), ("c", 3)]
+    cache.put("a", 4)
+    cache.put("d", 5)
+    assert cache.items() == [("a", 4), ("d", 5)]
+    assert len(cache) == 2
+
+
+def test_lru_cache_get_pop_and_clear():
+    cache = LRUCache(3)
+    assert cache.get("missing", "default") == "default"
+    cache.put("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    cache.put("b", 2)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_edit_distance():
+    assert edit_distance("", "") == 0
+    assert edit_distance("kiwi", "kiwi") == 0
+    assert edit_distance("", "abc") == 3
+    assert edit_distance("kitten", "sitting") == 3
+    # A swap of two letters next to each other is one edit
+    assert edit_distance("form", "from") == 1
+    assert edit_distance("ca", "abc") == 3
+
+
+def test_deletes():
+    assert deletes("abc", 0) == {"abc"}
+    assert deletes("abc", 1) == {"abc", "bc", "ac", "ab"}
+    assert deletes("ab", 2) == {"ab", "a", "b", ""}
+
+
+def test_lookup_finds_words_within_the_distance_closest_first():
+    index = SymSpellIndex(distance=2)
+    for word in ("FurryKiwi", "kiwi", "kiwis", "walrus"):
+        index.add(word)
+    assert index.lookup("kiwi") == ["kiwi", "kiwis"]
+    assert index.lookup("kwi") == ["kiwi", "kiwis"]
+    assert index.lookup("furykiwi") == ["FurryKiwi"]
+    assert index.lookup("zebra") == []
+
+
+def test_added_words_are_kept_once_ignoring_case():
+    index = SymSpellIndex()
+    index.add("Kiwi")
+    index.add("kiwi")
+    assert "KIWI" in index
+    assert list(index.words.values()) == ["Kiwi"]
+    index.clear()
+    assert "kiwi" not in index
+    assert index.lookup("kiwi") == []
+
+
+def test_lookup_matches_going_through_every_word():
+    randomizer = random.Random(21)
+    words = {"".join(randomizer.choices("abcde", k=randomizer.randint(1, 7))) for _ in range(300)}
+    index = SymSpellIndex(distance=2)
+    for word in words:
+        index.add(word)
+    for _ in range(100):
+        query = "".join(randomizer.choices("abcdef", k=randomizer.randint(1, 7)))
+        expected = {word for word in words if edit_distance(query, word) <= 2}
+        assert set(index.lookup(query)) == expected, query
@@ -0,0 +1,85 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import os
+import stat
+import pytest
+import Scripts.utils as utils
+
+PASSES = 3
+
+
+def test_records_are_read_back_in_order(tmp_path):
+    path = str(tmp_path / "log")
+    records = [[1, [["put", "A", "x", ["text", "2022"], 0.0]]], [2, "ünïcode"], {"three": 3}]
+    sizes = [utils.append_record(path, record, PASSES) for record in records]
+    assert utils.read_records(path, PASSES) == records
+    assert sum(sizes) == os.path.getsize(path)
+
+
+def test_read_records_of_a_missing_or_empty_file(tmp_path):
+    path = str(tmp_path / "log")
+    assert utils.read_records(path, PASSES) == []
+    utils.append_record(path, [1], PASSES)
+    utils.truncate_file(path)
+    assert utils.read_records(path, PASSES) == []
+
+
+@pytest.mark.parametrize("cut", [1, 4, 8, 9])
+def test_read_records_stops_at_a_cut_off_record(tmp_path, cut):
+    path = str(tmp_path / "log")
+    utils.append_record(path, [1, "kept"], PASSES)
+    size = utils.append_record(path, [2, "cut off"], PASSES)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - size + cut)
+    assert utils.read_records(path, PASSES) == [[1, "kept"]]
+
+
+def test_read_records_stops_at_a_bad_checksum(tmp_path):
+    path = str(tmp_path / "log")
+    first = utils.append_record(path, [1, "kept"], PASSES)
+    utils.append_record(path, [2, "broken"], PASSES)
+    utils.append_record(path, [3, "after"], PASSES)
+    with open(path, "r+b") as file:
+        file.seek(first + 10)
+        byte = file.read(1)
+        file.seek(first + 10)
+        file.write(bytes([byte[0] ^ 0xFF]))
+    assert utils.read_records(path, PASSES) == [[1, "kept"]]
+
+
+def test_records_need_the_same_key(tmp_path):
+    path = str(tmp_path / "log")
+    utils.append_record(path, {"a": 1}, PASSES)
+    assert utils.read_records(path, PASSES + 1) != [{"a": 1}]
+
+
+def test_dump_and_read_encoded(tmp_path):
+    path = str(tmp_path / "data.json")
+    utils.dump_encoded(path, {"A": {"x": ["text"]}}, PASSES, header={"sequence": 4})
+    assert utils.read_encoded(path, PASSES) == ({"A": {"x": ["text"]}}, {"sequence": 4})
+    assert utils.read_header(path, PASSES) == {"sequence": 4}
+
+
+def test_atomic_write_leaves_the_old_file_when_it_fails(tmp_path):
+    path = str(tmp_path / "data.json")
+    utils.dump_json(path, {"old": True})
+    with pytest.raises(RuntimeError):
+        with utils.atomic_write(path) as file:
+            file.write("half")
+            raise RuntimeError
+    assert utils.read_config(path) == {"old": True}
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="permissions are posix only")
+def test_atomic_write_permissions(tmp_path):
+    path = str(tmp_path / "data.json")
+    umask = os.umask(0o027)
+    try:
+        utils.dump_json(path, {})
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    os.chmod(path, 0o600)
+    utils.dump_json(path, {"new": True})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
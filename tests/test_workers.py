@@ -0,0 +1,98 @@
+# Copyright © 2022 FurryKiwi <normalusage2@gmail.com>
+
+import threading
+import time
+import pytest
+from Scripts.workers import Worker
+
+
+@pytest.fixture
+def worker():
+    worker = Worker("TestWorker")
+    yield worker
+    worker.stop()
+
+
+def test_jobs_run_in_order_and_callbacks_run_on_flush(worker):
+    ran = []
+    results = []
+    for index in range(5):
+        worker.submit(index, ran.append, index, callback=results.append)
+    assert worker.flush(5)
+    assert ran == [0, 1, 2, 3, 4]
+    assert results == [None] * 5
+
+
+def test_submitting_the_same_key_replaces_the_waiting_job(worker):
+    started = threading.Event()
+    release = threading.Event()
+    worker.submit("block", lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    ran = []
+    for index in range(3):
+        worker.submit("save", ran.append, index)
+    release.set()
+    assert worker.flush(5)
+    assert ran == [2]
+
+
+def test_cancel(worker):
+    release = threading.Event()
+    worker.submit("block", release.wait, 5)
+    ran = []
+    worker.submit("job", ran.append, 1)
+    assert worker.cancel("job")
+    assert not worker.cancel("job")
+    release.set()
+    assert worker.flush(5)
+    assert ran == []
+
+
+def test_delay_merges_jobs_close_together():
+    worker = Worker("DelayedWorker", delay=0.3)
+    ran = []
+    try:
+        worker.submit("save", ran.append, 1)
+        time.sleep(0.05)
+        worker.submit("save", ran.append, 2)
+        time.sleep(0.05)
+        assert ran == []
+        time.sleep(0.5)
+        assert ran == [2]
+    finally:
+        worker.stop()
+
+
+def test_flush_doesnt_wait_for_the_delay():
+    worker = Worker("DelayedWorker", delay=60)
+    ran = []
+    try:
+        worker.submit("save", ran.append, 1)
+        start = time.monotonic()
+        assert worker.flush(5)
+        assert ran == [1]
+        assert time.monotonic() - start < 5
+    finally:
+        worker.stop()
+
+
+def test_an_error_skips_the_callback_and_the_worker_keeps_going(worker, capsys):
+    results = []
+    worker.submit("bad", lambda: 1 / 0, callback=results.append)
+    worker.submit("good", lambda: "done", callback=results.append)
+    assert worker.flush(5)
+    assert results == ["done"]
+    assert "ZeroDivisionError" in capsys.readouterr().err
+
+
+def test_stop_finishes_the_waiting_jobs():
+    worker = Worker("StoppedWorker")
+    release = threading.Event()
+    ran = []
+    worker.submit("block", release.wait, 5)
+    worker.submit("job", ran.append, 1)
+    worker.stop()
+    release.set()
+    worker._thread.join(5)
+    assert not worker._thread.is_alive()
+    assert ran == [1]